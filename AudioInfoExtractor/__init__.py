@@ -1,17 +1,43 @@
-from .audio_info_extractor import (
-    AudeeInfoExtractor,
-    AudioInfo,
-    BitfanInfoExtractor,
-    JfnPodsInfoExtractor,
-    OmnyInfoExtractor,
+import importlib
+
+from .audio_info_extractor import AudioInfo, AudioInfoExtractorBase, ParseTargets
+from .html_scanner import HtmlScanner, ScanResult, find_page_url
+from .registry import (
+    EXTRACTOR_REGISTRY,
+    find_extractor_class,
     get_extractor,
+    register_extractor,
 )
 
+# 各サイトのExtractorは、使われたときに読み込む
+_LAZY_EXTRACTORS = {
+    "AudeeInfoExtractor": "audee_info_extractor",
+    "BitfanInfoExtractor": "bitfan_info_extractor",
+    "JfnPodsInfoExtractor": "jfn_pods_info_extractor",
+    "OmnyInfoExtractor": "omny_info_extractor",
+}
+
+
+def __getattr__(name):
+    module_name = _LAZY_EXTRACTORS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(f".{module_name}", __name__), name)
+
+
 __all__ = [
     "AudeeInfoExtractor",
     "BitfanInfoExtractor",
     "JfnPodsInfoExtractor",
     "OmnyInfoExtractor",
     "AudioInfo",
+    "AudioInfoExtractorBase",
+    "ParseTargets",
     "get_extractor",
+    "find_extractor_class",
+    "register_extractor",
+    "EXTRACTOR_REGISTRY",
+    "HtmlScanner",
+    "ScanResult",
+    "find_page_url",
 ]
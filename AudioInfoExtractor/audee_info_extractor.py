@@ -0,0 +1,154 @@
+import json
+
+from . import json_backend
+from .audio_info_extractor import (
+    AudioInfo,
+    AudioInfoExtractorBase,
+    ParseTargets,
+    _format_broadcast_date,
+)
+from .html_scanner import HtmlScanner, first_element_body, text_of
+
+
+class AudeeInfoExtractor(AudioInfoExtractorBase):
+    """audee.jpの音声情報抽出クラス"""
+
+    PARSE_TARGETS = ParseTargets(
+        ("h2", {"class": "box-program-ttl ttl-cmn-lev1"}),
+        ("meta", {"property": "og:image"}),
+        ("script", {"type": "application/ld+json"}),
+    )
+
+    # DOMを作らずに取り出す要素
+    FAST_PATH = HtmlScanner(
+        script_types=("application/ld+json",),
+        meta_properties=("og:image",),
+        fragments=(("h2", "box-program-ttl ttl-cmn-lev1"),),
+    )
+
+    def get_audio_info(self, html_content: str) -> list[AudioInfo] | None:
+        self.logger.info("audee.jpのメタデータと音声URLを解析します...")
+        try:
+            # 必要な情報がすべて揃う場合は、DOMを作らずに返す
+            if self.fast_path:
+                audio_info_list = self._get_audio_info_fast(html_content)
+                if audio_info_list:
+                    return audio_info_list
+
+            soup = self._make_soup(html_content)
+
+            # --- 基本情報を取得 ---
+            program_name_elem = soup.select_one("h2.box-program-ttl.ttl-cmn-lev1 a")
+            program_name = (
+                program_name_elem.get_text(strip=True) if program_name_elem else ""
+            )
+
+            cover_image_elem = soup.select_one("meta[property='og:image']")
+            cover_image_url = (
+                str(cover_image_elem["content"]) if cover_image_elem else ""
+            )
+
+            # --- ld+jsonから音声情報を取得 ---
+            ld_json_elements = soup.find_all("script", type="application/ld+json")
+            if not ld_json_elements:
+                self.logger.error("ld+jsonが見つかりませんでした。")
+                return None
+
+            audio_data_list = self._collect_audio_data(
+                [ld_json_elem.get_text() for ld_json_elem in ld_json_elements]
+            )
+            if not audio_data_list:
+                self.logger.warning("ld+json内に音声情報が見つかりませんでした。")
+                return None
+
+            return self._to_audio_info_list(
+                audio_data_list, program_name, cover_image_url
+            )
+
+        except Exception as e:
+            self.logger.error(f"audee.jpのHTML解析に失敗しました: {e}", exc_info=True)
+            return None
+
+    def _get_audio_info_fast(self, html_content: str) -> list[AudioInfo] | None:
+        """生のHTMLを走査して音声情報を取得する。揃わない情報がある場合はNoneを返す。"""
+        scanned = self.FAST_PATH.scan(html_content)
+
+        heading = scanned.fragments.get(("h2", "box-program-ttl ttl-cmn-lev1"))
+        link = first_element_body(heading, "a") if heading is not None else None
+        program_name = text_of(link) if link is not None else ""
+        cover_image_url = scanned.meta.get("og:image")
+        if not program_name or cover_image_url is None:
+            return None
+
+        audio_data_list = self._collect_audio_data([body for _, body in scanned.scripts])
+        if not audio_data_list or not all(
+            audio_data.get("contentUrl") for audio_data in audio_data_list
+        ):
+            return None
+
+        return self._to_audio_info_list(audio_data_list, program_name, cover_image_url)
+
+    @staticmethod
+    def _collect_audio_data(ld_json_texts: list[str]) -> list[dict]:
+        """ld+jsonの本文から音声情報の辞書を集める"""
+        # パートに分かれて音声が存在する場合に備えてリストを用意
+        audio_data_list = []
+        for ld_json_text in ld_json_texts:
+            try:
+                if not ld_json_text:
+                    continue
+
+                data = json_backend.loads(ld_json_text.strip())
+
+                # dataがリストか辞書かで分岐
+                if isinstance(data, list):
+                    # リストの最初の要素にaudioキーがあるかチェック
+                    if data and "audio" in data[0]:
+                        audio_data_list.extend(data[0]["audio"])
+                elif isinstance(data, dict):
+                    if "audio" in data:
+                        audios = data["audio"]
+                        if isinstance(audios, list):
+                            audio_data_list.extend(audios)
+                        else:
+                            audio_data_list.append(audios)
+
+            except json.JSONDecodeError:
+                # パースに失敗した場合は無視して次の要素へ
+                continue
+        return audio_data_list
+
+    def _to_audio_info_list(
+        self, audio_data_list: list[dict], program_name: str, cover_image_url: str
+    ) -> list[AudioInfo] | None:
+        """音声情報の辞書をAudioInfoのリストに変換する"""
+        artist_name = ""
+        if "の" in program_name:
+            artist_name = program_name.split("の", 1)[0].strip()
+        else:
+            artist_name = program_name
+
+        audio_info_list = []
+        for audio_data in audio_data_list:
+            episode_title = audio_data.get("name", "")
+            audio_src = audio_data.get("contentUrl", "")
+            broadcast_date = _format_broadcast_date(
+                str(audio_data.get("uploadDate") or audio_data.get("datePublished") or "")
+            )
+
+            if not audio_src:
+                self.logger.warning(f"音声URLが見つかりませんでした: {episode_title}")
+                continue
+
+            audio_info_list.append(
+                AudioInfo(
+                    program_name=program_name,
+                    episode_title=episode_title,
+                    artist_name=artist_name,
+                    cover_image_url=cover_image_url,
+                    audio_src=audio_src,
+                    broadcast_date=broadcast_date,
+                )
+            )
+
+        return audio_info_list if audio_info_list else None
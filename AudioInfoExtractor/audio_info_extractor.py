@@ -1,13 +1,12 @@
-import html
-import json
 import logging
-import re
 import sys
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from datetime import UTC, datetime, timedelta, timezone
+from typing import ClassVar
 
 from bs4 import BeautifulSoup
+from bs4.filter import ElementFilter
 
 
 JST = timezone(timedelta(hours=9))
@@ -40,10 +39,72 @@ class AudioInfo:
     broadcast_date: str = ""
 
 
+class ParseTargets(ElementFilter):
+    """
+    HTMLのパース時に生成する要素の条件（BeautifulSoupの parse_only に渡す）。
+
+    条件に一致した要素はその子孫も含めて生成し、それ以外の要素と文字列は生成しない。
+    条件は (タグ名, 属性) の組で指定する。属性の値がNoneの場合は属性があることだけを確認し、
+    class は指定したクラスをすべて含むかどうかで判定する。
+    """
+
+    def __init__(self, *rules: tuple[str, dict[str, str | None]]):
+        super().__init__()
+        self.rules = rules
+
+    @property
+    def includes_everything(self) -> bool:
+        return False
+
+    def allow_tag_creation(self, nsprefix, name, attrs) -> bool:
+        attrs = attrs or {}
+        return any(
+            name == rule_name and self._match_attrs(rule_attrs, attrs)
+            for rule_name, rule_attrs in self.rules
+        )
+
+    def allow_string_creation(self, string) -> bool:
+        return False
+
+    @staticmethod
+    def _match_attrs(rule_attrs: dict[str, str | None], attrs) -> bool:
+        for key, expected in rule_attrs.items():
+            value = attrs.get(key)
+            if value is None:
+                return False
+            if isinstance(value, list):
+                value = " ".join(value)
+            if key == "class" and expected is not None:
+                if not set(expected.split()) <= set(value.split()):
+                    return False
+            elif expected is not None and value != expected:
+                return False
+        return True
+
+
 class AudioInfoExtractorBase(ABC):
     """音声情報抽出の基底クラス"""
 
-    def __init__(self, logger=None):
+    # 解析に使う要素。Noneの場合はHTML全体をパースする
+    PARSE_TARGETS: ClassVar[ParseTargets | None] = None
+
+    def __init__(
+        self,
+        logger=None,
+        parser: str = "lxml",
+        only_targets: bool = True,
+        fast_path: bool = True,
+    ):
+        """
+        引数:
+            logger: ロガー。Noneの場合は標準出力に出力するロガーを使う。
+            parser (str): BeautifulSoupのパーサー（"lxml" または "html.parser"）。
+            only_targets (bool): Trueの場合は PARSE_TARGETS の要素だけをパースする。
+            fast_path (bool): Trueの場合は、DOMを作らずに生のHTMLから取得できる情報を先に使う。
+        """
+        self.parser = parser
+        self.only_targets = only_targets
+        self.fast_path = fast_path
         if logger:
             self.logger = logger
         else:
@@ -60,362 +121,12 @@ class AudioInfoExtractorBase(ABC):
                 log.propagate = False
             self.logger = log
 
+    def _make_soup(self, html_content: str) -> BeautifulSoup:
+        """設定したパーサーでHTMLをパースする"""
+        parse_only = self.PARSE_TARGETS if self.only_targets else None
+        return BeautifulSoup(html_content, self.parser, parse_only=parse_only)
+
     @abstractmethod
     def get_audio_info(self, html_content: str) -> list[AudioInfo] | None:
         """HTML文字列から音声情報を取得する"""
         pass
-
-
-class AudeeInfoExtractor(AudioInfoExtractorBase):
-    """audee.jpの音声情報抽出クラス"""
-
-    def get_audio_info(self, html_content: str) -> list[AudioInfo] | None:
-        self.logger.info("audee.jpのメタデータと音声URLを解析します...")
-        try:
-            soup = BeautifulSoup(html_content, "html.parser")
-
-            # --- 基本情報を取得 ---
-            program_name_elem = soup.select_one("h2.box-program-ttl.ttl-cmn-lev1 a")
-            program_name = (
-                program_name_elem.get_text(strip=True) if program_name_elem else ""
-            )
-
-            artist_name = ""
-            if "の" in program_name:
-                artist_name = program_name.split("の", 1)[0].strip()
-            else:
-                artist_name = program_name
-
-            cover_image_elem = soup.select_one("meta[property='og:image']")
-            cover_image_url = (
-                str(cover_image_elem["content"]) if cover_image_elem else ""
-            )
-
-            # --- ld+jsonから音声情報を取得 ---
-            ld_json_elements = soup.find_all("script", type="application/ld+json")
-            if not ld_json_elements:
-                self.logger.error("ld+jsonが見つかりませんでした。")
-                return None
-
-            # パートに分かれて音声が存在する場合に備えてリストを用意
-            audio_data_list = []
-            for ld_json_elem in ld_json_elements:
-                try:
-                    ld_json_text = ld_json_elem.get_text()
-                    if not ld_json_text:
-                        continue
-
-                    data = json.loads(ld_json_text.strip())
-
-                    # dataがリストか辞書かで分岐
-                    if isinstance(data, list):
-                        # リストの最初の要素にaudioキーがあるかチェック
-                        if data and "audio" in data[0]:
-                            audio_data_list.extend(data[0]["audio"])
-                    elif isinstance(data, dict):
-                        if "audio" in data:
-                            audios = data["audio"]
-                            if isinstance(audios, list):
-                                audio_data_list.extend(audios)
-                            else:
-                                audio_data_list.append(audios)
-
-                except json.JSONDecodeError:
-                    # パースに失敗した場合は無視して次の要素へ
-                    continue
-
-            if not audio_data_list:
-                self.logger.warning("ld+json内に音声情報が見つかりませんでした。")
-                return None
-
-            # audio_dataが辞書の場合はリストに変換
-            if isinstance(audio_data_list, dict):
-                audio_data_list = [audio_data_list]
-
-            audio_info_list = []
-            for audio_data in audio_data_list:
-                episode_title = audio_data.get("name", "")
-                audio_src = audio_data.get("contentUrl", "")
-                broadcast_date = _format_broadcast_date(
-                    str(audio_data.get("uploadDate") or audio_data.get("datePublished") or "")
-                )
-
-                if not audio_src:
-                    self.logger.warning(
-                        f"音声URLが見つかりませんでした: {episode_title}"
-                    )
-                    continue
-
-                audio_info_list.append(
-                    AudioInfo(
-                        program_name=program_name,
-                        episode_title=episode_title,
-                        artist_name=artist_name,
-                        cover_image_url=cover_image_url,
-                        audio_src=audio_src,
-                        broadcast_date=broadcast_date,
-                    )
-                )
-
-            return audio_info_list if audio_info_list else None
-
-        except Exception as e:
-            self.logger.error(f"audee.jpのHTML解析に失敗しました: {e}", exc_info=True)
-            return None
-
-
-class BitfanInfoExtractor(AudioInfoExtractorBase):
-    """bitfan.netの音声情報抽出クラス"""
-
-    def get_audio_info(self, html_content: str) -> list[AudioInfo] | None:
-        self.logger.info("bitfan.netのメタデータと音声URLを解析します...")
-        try:
-            program_name = ""
-            episode_title = ""
-            artist_name = ""
-            cover_image_url = ""
-            audio_src = ""
-
-            soup = BeautifulSoup(html_content, "html.parser")
-
-            # 音声URLを取得 (bs4では無理だったので正規表現で取得)
-            match = re.search(
-                r'<audio.*?<source src="([^"]+)"', html_content, re.DOTALL
-            )
-            if match:
-                audio_src = html.unescape(match.group(1))
-
-            # 番組名を取得
-            program_elem = soup.select_one("meta[property='og:site_name']")
-            if program_elem and program_elem.has_attr("content"):
-                program_name = str(program_elem["content"])
-
-            # エピソードタイトルを取得
-            episode_elem = soup.select_one("h1.p-clubArticle__name")
-            if episode_elem:
-                episode_title = episode_elem.get_text(strip=True)
-
-            # パーソナリティ名を取得
-            # デフォルト値として番組名を設定 (番組名が取得できている場合)
-            if program_name:
-                artist_name = program_name
-
-            artist_name_elements = soup.select(
-                "div.p-clubArticle__content div.c-clubWysiwyg p"
-            )
-            for element in artist_name_elements:
-                artist_text = element.get_text(strip=True)
-                if "パーソナリティ：" in artist_text:
-                    # 「パーソナリティ：」以降のテキストを取得
-                    artist_name_raw = artist_text.split("パーソナリティ：", 1)[
-                        1
-                    ].strip()
-                    # 「（」以降に補足情報が含まれる場合があるため、分割して前半部分のみ使用
-                    artist_name_raw = artist_name_raw.split("（", 1)[0].strip()
-                    # 全角スペースや読点などで分割し、各要素を整形
-                    artists = [
-                        name.strip()
-                        for name in re.split(
-                            r"[\s、,/・]|パートナー：", artist_name_raw
-                        )
-                        if name.strip()
-                    ]
-                    if artists:
-                        artist_name = ", ".join(artists)
-                    break  # マッチしたらループを抜ける
-
-            # カバー画像URLを取得
-            cover_image_elem = soup.select_one("div.p-clubArticle__thumb img")
-            if cover_image_elem and cover_image_elem.has_attr("src"):
-                cover_image_url = str(cover_image_elem["src"])
-
-            if not audio_src:
-                self.logger.warning("音声URLが見つかりませんでした。")
-                return None
-
-            return [
-                AudioInfo(
-                    program_name=program_name,
-                    episode_title=episode_title,
-                    artist_name=artist_name,
-                    cover_image_url=cover_image_url,
-                    audio_src=audio_src,
-                )
-            ]
-        except Exception as e:
-            self.logger.error(f"bitfan.netのHTML解析に失敗しました: {e}", exc_info=True)
-            return None
-
-
-class OmnyInfoExtractor(AudioInfoExtractorBase):
-    """omny.fmの音声情報抽出クラス"""
-
-    def get_audio_info(self, html_content: str) -> list[AudioInfo] | None:
-        self.logger.info("omny.fmのメタデータと音声URLを解析します...")
-        try:
-            soup = BeautifulSoup(html_content, "html.parser")
-
-            # 保存されたHTMLには通常ページと埋め込みページのNext.jsデータが同居する場合があるため、
-            # HTMLパーサーに頼り切らず、生HTMLからclipを含むデータを明示的に選ぶ。
-            next_data_texts = re.findall(
-                r"""<script\b(?=[^>]*\bid=["']__NEXT_DATA__["'])[^>]*>(.*?)</script>""",
-                html_content,
-                re.DOTALL,
-            )
-            if not next_data_texts:
-                self.logger.warning("__NEXT_DATA__が見つかりませんでした。")
-                return None
-
-            clip = None
-            for next_data_text in next_data_texts:
-                if not next_data_text:
-                    continue
-
-                try:
-                    next_data = json.loads(next_data_text)
-                except json.JSONDecodeError as e:
-                    self.logger.warning(
-                        f"__NEXT_DATA__の厳密JSON解析に失敗したため、緩和モードで再試行します: {e}"
-                    )
-                    next_data = json.loads(next_data_text, strict=False)
-
-                page_props = next_data.get("props", {}).get("pageProps", {})
-
-                # 通常ページは pageProps.clip に対象エピソードが入る
-                candidate_clip = page_props.get("clip")
-                if isinstance(candidate_clip, dict):
-                    clip = candidate_clip
-                    break
-
-            if not isinstance(clip, dict):
-                self.logger.warning("clip情報が見つかりませんでした。")
-                return None
-
-            program = clip.get("Program", {}) if isinstance(clip.get("Program"), dict) else {}
-
-            program_name = str(program.get("Name") or "")
-            episode_title = str(clip.get("Title") or "")
-            artist_name = str(program.get("Author") or program_name)
-            cover_image_url = str(clip.get("ImageUrl") or "")
-            audio_src = str(clip.get("AudioUrl") or "")
-            broadcast_date = _format_broadcast_date(
-                str(clip.get("PublishedUtc") or "")
-            )
-
-            # フォールバック: og:image からカバー画像を補完
-            if not cover_image_url:
-                cover_image_elem = soup.select_one("meta[property='og:image']")
-                if cover_image_elem and cover_image_elem.has_attr("content"):
-                    cover_image_url = str(cover_image_elem["content"])
-
-            if not audio_src:
-                self.logger.warning("音声URLが見つかりませんでした。")
-                return None
-
-            return [
-                AudioInfo(
-                    program_name=program_name,
-                    episode_title=episode_title,
-                    artist_name=artist_name,
-                    cover_image_url=cover_image_url,
-                    audio_src=audio_src,
-                    broadcast_date=broadcast_date,
-                )
-            ]
-        except json.JSONDecodeError as e:
-            self.logger.error(f"omny.fmのJSON解析に失敗しました: {e}", exc_info=True)
-            return None
-        except Exception as e:
-            self.logger.error(f"omny.fmのHTML解析に失敗しました: {e}", exc_info=True)
-            return None
-
-
-class JfnPodsInfoExtractor(AudioInfoExtractorBase):
-    """jfn-pods.comの音声情報抽出クラス"""
-
-    def get_audio_info(self, html_content: str) -> list[AudioInfo] | None:
-        self.logger.info("jfn-pods.comのメタデータと音声URLを解析します...")
-        try:
-            soup = BeautifulSoup(html_content, "html.parser")
-
-            # プレイヤーの埋め込み属性から音声情報を取得する
-            voice_player = soup.select_one("div.voice-player")
-            audio_src = ""
-            episode_title = ""
-            if voice_player:
-                audio_src = str(voice_player.get("data-audio-url") or "")
-                episode_title = str(voice_player.get("data-episode-name") or "")
-
-            # フォールバックとしてaudio要素のsourceも確認する
-            if not audio_src:
-                source_elem = soup.select_one("audio source")
-                if source_elem and source_elem.has_attr("src"):
-                    audio_src = str(source_elem["src"])
-
-            # メタタグと見出しから番組情報を取得する
-            program_name = ""
-            program_name_elem = soup.select_one("div.mt-24.font-semibold")
-            if program_name_elem:
-                program_name = program_name_elem.get_text(strip=True)
-
-            if not program_name:
-                og_title_elem = soup.select_one("meta[property='og:title']")
-                if og_title_elem and og_title_elem.has_attr("content"):
-                    og_title = str(og_title_elem["content"])
-                    title_parts = [part.strip() for part in og_title.split("｜") if part.strip()]
-                    if len(title_parts) >= 2:
-                        program_name = title_parts[1]
-
-            if not episode_title:
-                heading_elem = soup.select_one("h1")
-                if heading_elem:
-                    episode_title = heading_elem.get_text(strip=True)
-
-            artist_name = program_name
-
-            cover_image_url = ""
-            cover_image_elem = soup.select_one("meta[property='og:image']")
-            if cover_image_elem and cover_image_elem.has_attr("content"):
-                cover_image_url = str(cover_image_elem["content"])
-
-            datetime_elem = soup.select_one("time[datetime]")
-            broadcast_date = _format_broadcast_date(
-                str(datetime_elem.get("datetime") or "") if datetime_elem else ""
-            )
-
-            if not audio_src:
-                self.logger.warning("音声URLが見つかりませんでした。")
-                return None
-
-            return [
-                AudioInfo(
-                    program_name=program_name,
-                    episode_title=episode_title,
-                    artist_name=artist_name,
-                    cover_image_url=cover_image_url,
-                    audio_src=audio_src,
-                    broadcast_date=broadcast_date,
-                )
-            ]
-        except Exception as e:
-            self.logger.error(
-                f"jfn-pods.comのHTML解析に失敗しました: {e}", exc_info=True
-            )
-            return None
-
-
-# --- ドメインとExtractorのマッピング ---
-EXTRACTOR_MAP = {
-    "audee.jp": AudeeInfoExtractor,
-    "ij-matome.bitfan.id": BitfanInfoExtractor,
-    "omny.fm": OmnyInfoExtractor,
-    "jfn-pods.com": JfnPodsInfoExtractor,
-}
-
-
-def get_extractor(domain, logger=None):
-    """ドメイン名に一致するExtractorのインスタンスを返す"""
-    for key, extractor_class in EXTRACTOR_MAP.items():
-        if key in domain:
-            return extractor_class(logger)
-    return None
@@ -0,0 +1,94 @@
+import html
+import re
+
+from .audio_info_extractor import AudioInfo, AudioInfoExtractorBase, ParseTargets
+
+
+class BitfanInfoExtractor(AudioInfoExtractorBase):
+    """bitfan.netの音声情報抽出クラス"""
+
+    PARSE_TARGETS = ParseTargets(
+        ("meta", {"property": "og:site_name"}),
+        ("h1", {"class": "p-clubArticle__name"}),
+        ("div", {"class": "p-clubArticle__content"}),
+        ("div", {"class": "p-clubArticle__thumb"}),
+    )
+
+    def get_audio_info(self, html_content: str) -> list[AudioInfo] | None:
+        self.logger.info("bitfan.netのメタデータと音声URLを解析します...")
+        try:
+            program_name = ""
+            episode_title = ""
+            artist_name = ""
+            cover_image_url = ""
+            audio_src = ""
+
+            soup = self._make_soup(html_content)
+
+            # 音声URLを取得 (bs4では無理だったので正規表現で取得)
+            match = re.search(
+                r'<audio.*?<source src="([^"]+)"', html_content, re.DOTALL
+            )
+            if match:
+                audio_src = html.unescape(match.group(1))
+
+            # 番組名を取得
+            program_elem = soup.select_one("meta[property='og:site_name']")
+            if program_elem and program_elem.has_attr("content"):
+                program_name = str(program_elem["content"])
+
+            # エピソードタイトルを取得
+            episode_elem = soup.select_one("h1.p-clubArticle__name")
+            if episode_elem:
+                episode_title = episode_elem.get_text(strip=True)
+
+            # パーソナリティ名を取得
+            # デフォルト値として番組名を設定 (番組名が取得できている場合)
+            if program_name:
+                artist_name = program_name
+
+            artist_name_elements = soup.select(
+                "div.p-clubArticle__content div.c-clubWysiwyg p"
+            )
+            for element in artist_name_elements:
+                artist_text = element.get_text(strip=True)
+                if "パーソナリティ：" in artist_text:
+                    # 「パーソナリティ：」以降のテキストを取得
+                    artist_name_raw = artist_text.split("パーソナリティ：", 1)[
+                        1
+                    ].strip()
+                    # 「（」以降に補足情報が含まれる場合があるため、分割して前半部分のみ使用
+                    artist_name_raw = artist_name_raw.split("（", 1)[0].strip()
+                    # 全角スペースや読点などで分割し、各要素を整形
+                    artists = [
+                        name.strip()
+                        for name in re.split(
+                            r"[\s、,/・]|パートナー：", artist_name_raw
+                        )
+                        if name.strip()
+                    ]
+                    if artists:
+                        artist_name = ", ".join(artists)
+                    break  # マッチしたらループを抜ける
+
+            # カバー画像URLを取得
+            cover_image_elem = soup.select_one("div.p-clubArticle__thumb img")
+            if cover_image_elem and cover_image_elem.has_attr("src"):
+                cover_image_url = str(cover_image_elem["src"])
+
+            if not audio_src:
+                self.logger.warning("音声URLが見つかりませんでした。")
+                return None
+
+            return [
+                AudioInfo(
+                    program_name=program_name,
+                    episode_title=episode_title,
+                    artist_name=artist_name,
+                    cover_image_url=cover_image_url,
+                    audio_src=audio_src,
+                )
+            ]
+        except Exception as e:
+            self.logger.error(f"bitfan.netのHTML解析に失敗しました: {e}", exc_info=True)
+            return None
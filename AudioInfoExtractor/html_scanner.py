@@ -0,0 +1,180 @@
+import html
+import re
+from dataclasses import dataclass, field
+
+# 属性値の中の ">" で途切れないよう、引用符で囲まれた部分は読み飛ばす
+_TAG_BODY = r"""(?:[^>"']|"[^"]*"|'[^']*')*"""
+_ATTR_RE = re.compile(r"""([^\s=/>"']+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>"']+)))?""")
+
+
+def parse_attrs(tag_body: str) -> dict[str, str]:
+    """
+    タグの属性部分を辞書に変換する（同じ属性が複数ある場合は最初の値を使う）。
+
+    引数:
+        tag_body (str): タグ名の後ろから ">" の手前までの文字列。
+
+    戻り値:
+        dict[str, str]: 属性名（小文字）と、文字参照を展開した値。
+    """
+    attrs: dict[str, str] = {}
+    for match in _ATTR_RE.finditer(tag_body):
+        name = match.group(1).lower()
+        if name in attrs:
+            continue
+        value = next((v for v in match.group(2, 3, 4) if v is not None), "")
+        attrs[name] = html.unescape(value)
+    return attrs
+
+
+def first_element_body(fragment: str, tag: str) -> str | None:
+    """HTML断片の中で最初に現れる tag 要素の中身を返す。見つからない場合はNone。"""
+    match = re.search(
+        rf"<{re.escape(tag)}\b{_TAG_BODY}>(.*?)</{re.escape(tag)}\s*>",
+        fragment,
+        re.DOTALL | re.IGNORECASE,
+    )
+    return match.group(1) if match else None
+
+
+def text_of(fragment: str) -> str:
+    """
+    HTML断片のテキストを、BeautifulSoupの get_text(strip=True) と同じ規則で取り出す。
+    （タグで区切られた各テキストの前後の空白を除き、空でないものを連結する）
+    """
+    pieces = (html.unescape(piece).strip() for piece in re.split(r"<[^>]*>", fragment))
+    return "".join(piece for piece in pieces if piece)
+
+
+_PAGE_URL_RE = re.compile(
+    rf"<!--.*?-->|<(link|meta)\b({_TAG_BODY})>", re.DOTALL | re.IGNORECASE
+)
+
+
+def find_page_url(html_content: str) -> str | None:
+    """
+    保存されたHTMLから、ページの元のURLを取り出す。
+    <link rel="canonical"> を優先し、なければ <meta property="og:url"> を使う。
+
+    引数:
+        html_content (str): HTML文字列。
+
+    戻り値:
+        str | None: ページのURL。見つからない場合はNone。
+    """
+    og_url = None
+    for match in _PAGE_URL_RE.finditer(html_content):
+        if match.group(1) is None:
+            continue  # コメント
+        attrs = parse_attrs(match.group(2))
+        if match.group(1).lower() == "link":
+            if "canonical" in attrs.get("rel", "").lower().split() and attrs.get("href"):
+                return attrs["href"]
+        elif og_url is None and attrs.get("property") == "og:url" and attrs.get("content"):
+            og_url = attrs["content"]
+    return og_url
+
+
+@dataclass
+class ScanResult:
+    """
+    HtmlScanner で取り出した要素。
+
+    Attributes:
+        scripts (list[tuple[dict[str, str], str]]): 対象のscript要素の (属性, 本文)。出現順。
+        meta (dict[str, str | None]): metaタグの property ごとの最初の content（属性がない場合はNone）。
+        fragments (dict[tuple[str, str], str]): (タグ名, クラス名) ごとの最初の要素の中身（HTML断片）。
+    """
+
+    scripts: list[tuple[dict[str, str], str]] = field(default_factory=list)
+    meta: dict[str, str | None] = field(default_factory=dict)
+    fragments: dict[tuple[str, str], str] = field(default_factory=dict)
+
+
+class HtmlScanner:
+    """
+    DOMツリーを作らずに、生のHTMLを1回走査して必要なscript要素・metaタグ・見出しなどを取り出す。
+
+    コメントの中の要素は無視し、script要素の本文は最初の </script> までとする（HTMLパーサーと同じ）。
+    fragments で指定する要素は、同じタグの入れ子がないものに限る。
+    """
+
+    def __init__(
+        self,
+        script_types: tuple[str, ...] = (),
+        script_ids: tuple[str, ...] = (),
+        meta_properties: tuple[str, ...] = (),
+        fragments: tuple[tuple[str, str], ...] = (),
+    ):
+        """
+        引数:
+            script_types (tuple[str, ...]): 取り出すscript要素の type 属性。
+            script_ids (tuple[str, ...]): 取り出すscript要素の id 属性。
+            meta_properties (tuple[str, ...]): 取り出すmetaタグの property 属性。
+            fragments (tuple[tuple[str, str], ...]): 中身を取り出す要素の (タグ名, クラス名)。
+                クラス名は空白区切りで複数指定でき、すべてを含む要素に一致する。
+        """
+        self.script_types = set(script_types)
+        self.script_ids = set(script_ids)
+        self.meta_properties = set(meta_properties)
+        self.fragments = fragments
+
+        alternatives = [
+            r"(?P<comment>!--.*?-->)",
+            rf"script\b(?P<script_attrs>{_TAG_BODY})>(?P<script_body>.*?)</script\s*>",
+        ]
+        if meta_properties:
+            alternatives.append(rf"meta\b(?P<meta_attrs>{_TAG_BODY})>")
+        fragment_tags = sorted({tag for tag, _ in fragments})
+        if fragment_tags:
+            tag_pattern = "|".join(re.escape(tag) for tag in fragment_tags)
+            alternatives.append(
+                rf"(?P<fragment_tag>{tag_pattern})\b(?P<fragment_attrs>{_TAG_BODY})>"
+                rf"(?P<fragment_body>.*?)</(?P=fragment_tag)\s*>"
+            )
+        # 先頭の "<" を共通にして、"<" 以外の位置では照合を試みないようにする
+        self._pattern = re.compile(
+            "<(?:" + "|".join(alternatives) + ")", re.DOTALL | re.IGNORECASE
+        )
+
+    def scan(self, html_content: str) -> ScanResult:
+        """
+        HTMLを走査して対象の要素を取り出す。
+
+        引数:
+            html_content (str): HTML文字列。
+
+        戻り値:
+            ScanResult: 取り出した要素。
+        """
+        result = ScanResult()
+        for match in self._pattern.finditer(html_content):
+            if match.group("comment") is not None:
+                continue
+
+            if match.group("script_body") is not None:
+                attrs = parse_attrs(match.group("script_attrs"))
+                if attrs.get("type") in self.script_types or attrs.get("id") in self.script_ids:
+                    result.scripts.append((attrs, match.group("script_body")))
+                continue
+
+            if self.meta_properties and match.group("meta_attrs") is not None:
+                attrs = parse_attrs(match.group("meta_attrs"))
+                key = attrs.get("property")
+                if key in self.meta_properties:
+                    result.meta.setdefault(key, attrs.get("content"))
+                continue
+
+            if self.fragments and match.group("fragment_tag") is not None:
+                tag = match.group("fragment_tag").lower()
+                attrs = parse_attrs(match.group("fragment_attrs"))
+                classes = set(attrs.get("class", "").split())
+                for key in self.fragments:
+                    fragment_tag, class_name = key
+                    if (
+                        fragment_tag == tag
+                        and set(class_name.split()) <= classes
+                        and key not in result.fragments
+                    ):
+                        result.fragments[key] = match.group("fragment_body")
+        return result
@@ -0,0 +1,106 @@
+import json
+import re
+from collections.abc import Sequence
+from json.decoder import scanstring
+from typing import Any
+
+# orjsonがインストールされていれば使い、なければ標準のjsonを使う
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+_WS = re.compile(r"[ \t\n\r]*")
+# orjsonは64ビットを超える整数を浮動小数点数として読むため、その可能性がある場合は標準のjsonを使う
+_LONG_DIGITS = re.compile(r"\d{19}")
+
+
+def loads(text: str, strict: bool = True) -> Any:
+    """
+    JSON文字列を読み込む。
+
+    orjsonがある場合は先にorjsonで読み、読めない場合（NaNなど）は標準のjsonで読み直す。
+    19桁以上の数字を含む場合は最初から標準のjsonで読むため、結果とエラーは標準のjsonと同じになる。
+
+    引数:
+        text (str): JSON文字列。
+        strict (bool): Falseの場合は文字列中の制御文字を許可する（標準のjsonで読む）。
+
+    戻り値:
+        Any: 読み込んだ値。
+
+    例外:
+        json.JSONDecodeError: JSONとして読めない場合。
+    """
+    if orjson is not None and strict and not _LONG_DIGITS.search(text):
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(text, strict=strict)
+
+
+def extract_path(text: str, path: Sequence[str], strict: bool = True) -> Any:
+    """
+    JSON文字列から、キーをたどった先の値だけを取り出す（例: ("props", "pageProps", "clip")）。
+
+    経路上のオブジェクトは目的のキーが見つかるまで先頭から読み、目的の値を読んだ時点で終了する。
+    目的のキーより前の兄弟の値は読み飛ばし、後ろの部分は読まない。
+    同じキーが複数ある場合は最初のものを使う。
+
+    引数:
+        text (str): JSON文字列。
+        path (Sequence[str]): たどるキーの並び。
+        strict (bool): Falseの場合は文字列中の制御文字を許可する。
+
+    戻り値:
+        Any: 取り出した値。途中のキーがない、またはオブジェクトでない場合はNone。
+
+    例外:
+        json.JSONDecodeError: 読んだ範囲がJSONとして正しくない場合。
+    """
+    decoder = json.JSONDecoder(strict=strict)
+    idx = _WS.match(text, 0).end()
+    for key in path:
+        found = _find_member(text, idx, key, decoder)
+        if found is None:
+            return None
+        idx = found
+    value, _ = decoder.raw_decode(text, idx)
+    return value
+
+
+def _find_member(
+    text: str, idx: int, key: str, decoder: json.JSONDecoder
+) -> int | None:
+    """idx の位置のオブジェクトから key の値の開始位置を返す。見つからない場合はNone。"""
+    if text[idx : idx + 1] != "{":
+        return None
+    idx = _WS.match(text, idx + 1).end()
+    if text[idx : idx + 1] == "}":
+        return None
+
+    while True:
+        if text[idx : idx + 1] != '"':
+            raise json.JSONDecodeError(
+                "Expecting property name enclosed in double quotes", text, idx
+            )
+        name, idx = scanstring(text, idx + 1, decoder.strict)
+        idx = _WS.match(text, idx).end()
+        if text[idx : idx + 1] != ":":
+            raise json.JSONDecodeError("Expecting ':' delimiter", text, idx)
+        idx = _WS.match(text, idx + 1).end()
+        if name == key:
+            return idx
+
+        # 目的のキー以外の値は読み飛ばす
+        _, idx = decoder.raw_decode(text, idx)
+        idx = _WS.match(text, idx).end()
+        delimiter = text[idx : idx + 1]
+        if delimiter == "}":
+            return None
+        if delimiter != ",":
+            raise json.JSONDecodeError("Expecting ',' delimiter", text, idx)
+        idx = _WS.match(text, idx + 1).end()
@@ -0,0 +1,103 @@
+import json
+
+from . import json_backend
+from .audio_info_extractor import (
+    AudioInfo,
+    AudioInfoExtractorBase,
+    ParseTargets,
+    _format_broadcast_date,
+)
+from .html_scanner import HtmlScanner
+
+# __NEXT_DATA__ 内のエピソード情報の位置
+CLIP_PATH = ("props", "pageProps", "clip")
+
+
+class OmnyInfoExtractor(AudioInfoExtractorBase):
+    """omny.fmの音声情報抽出クラス"""
+
+    PARSE_TARGETS = ParseTargets(("meta", {"property": "og:image"}))
+    # DOMを作らずに取り出す要素
+    FAST_PATH = HtmlScanner(script_ids=("__NEXT_DATA__",), meta_properties=("og:image",))
+
+    def get_audio_info(self, html_content: str) -> list[AudioInfo] | None:
+        self.logger.info("omny.fmのメタデータと音声URLを解析します...")
+        try:
+            # 保存されたHTMLには通常ページと埋め込みページのNext.jsデータが同居する場合があるため、
+            # HTMLパーサーに頼り切らず、生HTMLからclipを含むデータを明示的に選ぶ。
+            scanned = self.FAST_PATH.scan(html_content)
+            next_data_texts = [body for _, body in scanned.scripts]
+            if not next_data_texts:
+                self.logger.warning("__NEXT_DATA__が見つかりませんでした。")
+                return None
+
+            clip = None
+            for next_data_text in next_data_texts:
+                if not next_data_text:
+                    continue
+
+                # 通常ページは pageProps.clip に対象エピソードが入る
+                # （Next.jsの状態全体は読み込まず、clipを読んだ時点で終了する）
+                try:
+                    candidate_clip = json_backend.extract_path(
+                        next_data_text, CLIP_PATH
+                    )
+                except json.JSONDecodeError as e:
+                    self.logger.warning(
+                        f"__NEXT_DATA__の厳密JSON解析に失敗したため、緩和モードで再試行します: {e}"
+                    )
+                    candidate_clip = json_backend.extract_path(
+                        next_data_text, CLIP_PATH, strict=False
+                    )
+
+                if isinstance(candidate_clip, dict):
+                    clip = candidate_clip
+                    break
+
+            if not isinstance(clip, dict):
+                self.logger.warning("clip情報が見つかりませんでした。")
+                return None
+
+            program = clip.get("Program", {}) if isinstance(clip.get("Program"), dict) else {}
+
+            program_name = str(program.get("Name") or "")
+            episode_title = str(clip.get("Title") or "")
+            artist_name = str(program.get("Author") or program_name)
+            cover_image_url = str(clip.get("ImageUrl") or "")
+            audio_src = str(clip.get("AudioUrl") or "")
+            broadcast_date = _format_broadcast_date(
+                str(clip.get("PublishedUtc") or "")
+            )
+
+            # フォールバック: og:image からカバー画像を補完
+            if not cover_image_url:
+                og_image = scanned.meta.get("og:image") if self.fast_path else None
+                if og_image is not None:
+                    cover_image_url = og_image
+                else:
+                    # 走査で見つからない場合のみ、DOMを作って確認する
+                    soup = self._make_soup(html_content)
+                    cover_image_elem = soup.select_one("meta[property='og:image']")
+                    if cover_image_elem and cover_image_elem.has_attr("content"):
+                        cover_image_url = str(cover_image_elem["content"])
+
+            if not audio_src:
+                self.logger.warning("音声URLが見つかりませんでした。")
+                return None
+
+            return [
+                AudioInfo(
+                    program_name=program_name,
+                    episode_title=episode_title,
+                    artist_name=artist_name,
+                    cover_image_url=cover_image_url,
+                    audio_src=audio_src,
+                    broadcast_date=broadcast_date,
+                )
+            ]
+        except json.JSONDecodeError as e:
+            self.logger.error(f"omny.fmのJSON解析に失敗しました: {e}", exc_info=True)
+            return None
+        except Exception as e:
+            self.logger.error(f"omny.fmのHTML解析に失敗しました: {e}", exc_info=True)
+            return None
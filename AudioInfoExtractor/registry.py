@@ -0,0 +1,113 @@
+import importlib
+import threading
+from urllib.parse import urlsplit
+
+from .audio_info_extractor import AudioInfoExtractorBase
+
+# --- ホスト名とExtractorのマッピング ---
+# ホスト名（サブドメインを含めて一致するサフィックス）と "モジュール名:クラス名"。
+# モジュールは最初に使うときに読み込む。
+EXTRACTOR_REGISTRY: dict[str, str | type[AudioInfoExtractorBase]] = {
+    "audee.jp": "AudioInfoExtractor.audee_info_extractor:AudeeInfoExtractor",
+    "ij-matome.bitfan.id": "AudioInfoExtractor.bitfan_info_extractor:BitfanInfoExtractor",
+    "omny.fm": "AudioInfoExtractor.omny_info_extractor:OmnyInfoExtractor",
+    "jfn-pods.com": "AudioInfoExtractor.jfn_pods_info_extractor:JfnPodsInfoExtractor",
+}
+
+# 作成済みのExtractor（Extractorは状態を持たないため、同じ設定のものは使い回す）
+_instances: dict[tuple, AudioInfoExtractorBase] = {}
+_lock = threading.Lock()
+
+
+def register_extractor(
+    hostname: str, extractor: str | type[AudioInfoExtractorBase]
+):
+    """
+    Extractorを登録する。
+
+    引数:
+        hostname (str): 対象のホスト名。サブドメインにも一致する。
+        extractor (str | type): Extractorのクラス、または "モジュール名:クラス名"。
+    """
+    with _lock:
+        EXTRACTOR_REGISTRY[normalize_hostname(hostname)] = extractor
+        _instances.clear()
+
+
+def normalize_hostname(domain_or_url: str) -> str:
+    """
+    URLまたはドメイン名からホスト名を取り出す（小文字、ポート・末尾の "." を除く）。
+
+    引数:
+        domain_or_url (str): "https://audee.jp/voice/xxx" や "www.audee.jp" など。
+
+    戻り値:
+        str: ホスト名。
+    """
+    value = domain_or_url.strip()
+    if "//" not in value:
+        value = f"//{value}"
+    return (urlsplit(value).hostname or "").rstrip(".")
+
+
+def find_extractor_class(domain_or_url: str) -> type[AudioInfoExtractorBase] | None:
+    """
+    ホスト名に一致するExtractorのクラスを返す。
+
+    ホスト名の長いサフィックスから順に登録を確認するため、
+    登録数によらずホスト名のラベル数の回数で決まる。
+
+    引数:
+        domain_or_url (str): URLまたはドメイン名。
+
+    戻り値:
+        type | None: Extractorのクラス。未対応の場合はNone。
+    """
+    labels = normalize_hostname(domain_or_url).split(".")
+    for i in range(len(labels)):
+        suffix = ".".join(labels[i:])
+        target = EXTRACTOR_REGISTRY.get(suffix)
+        if target is None:
+            continue
+        if isinstance(target, str):
+            module_name, class_name = target.split(":")
+            target = getattr(importlib.import_module(module_name), class_name)
+            EXTRACTOR_REGISTRY[suffix] = target
+        return target
+    return None
+
+
+def get_extractor(
+    domain,
+    logger=None,
+    parser: str = "lxml",
+    only_targets: bool = True,
+    fast_path: bool = True,
+):
+    """
+    URLまたはドメイン名に一致するExtractorのインスタンスを返す。
+    同じExtractorと設定の組み合わせには、同じインスタンスを返す。
+
+    引数:
+        domain (str): URLまたはドメイン名（"https://audee.jp/voice/xxx"、"audee.jp" など）。
+        logger: ロガー。
+        parser (str): BeautifulSoupのパーサー。
+        only_targets (bool): Trueの場合は必要な要素だけをパースする。
+        fast_path (bool): Trueの場合は、DOMを作らずに取得できる情報を先に使う。
+
+    戻り値:
+        AudioInfoExtractorBase | None: Extractor。未対応の場合はNone。
+    """
+    extractor_class = find_extractor_class(domain)
+    if extractor_class is None:
+        return None
+
+    key = (extractor_class, logger, parser, only_targets, fast_path)
+    with _lock:
+        extractor = _instances.get(key)
+        if extractor is None:
+            extractor = extractor_class(
+                logger, parser=parser, only_targets=only_targets, fast_path=fast_path
+            )
+            _instances[key] = extractor
+    return extractor
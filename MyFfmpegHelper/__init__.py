@@ -1,6 +1,31 @@
+from .async_ffmpeg_helper import AsyncFfmpegHelper
+from .bitrate_profile import BitrateProfile
+from .cover_cache import CoverImageCache
+from .keyframe_index import KeyframeIndex
+from .media_info import MediaInfo, MediaInfoCache
 from .my_ffmpeg_helper import FfmpegMetadata, MyFfmpegHelper
+from .oversized_transcoder import OversizedTranscoder
+from .progress import FfmpegProgress, FfmpegRunStats, ProgressMonitor
+from .transcode_profile import (
+    DEFAULT_TRANSCODE_PROFILES,
+    TranscodePlan,
+    TranscodeProfile,
+)
 
 __all__ = [
     "MyFfmpegHelper",
+    "AsyncFfmpegHelper",
     "FfmpegMetadata",
+    "BitrateProfile",
+    "CoverImageCache",
+    "KeyframeIndex",
+    "MediaInfo",
+    "MediaInfoCache",
+    "OversizedTranscoder",
+    "FfmpegProgress",
+    "FfmpegRunStats",
+    "ProgressMonitor",
+    "DEFAULT_TRANSCODE_PROFILES",
+    "TranscodePlan",
+    "TranscodeProfile",
 ]
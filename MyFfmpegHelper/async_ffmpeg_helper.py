@@ -0,0 +1,312 @@
+import asyncio
+import logging
+import os
+from collections.abc import Iterable
+from typing import Literal
+
+from .keyframe_index import KeyframeIndex, KeyframeIndexParser
+from .media_info import MediaInfo, MediaInfoCache
+from .my_ffmpeg_helper import FfmpegMetadata, MyFfmpegHelper
+
+
+class AsyncFfmpegHelper:
+    """
+    ffmpeg/ffprobeをasyncioのサブプロセスとして実行するヘルパー。
+    1つのイベントループから複数ファイルの解析・分割・タグ付けを並行して実行できる。
+
+    - 同時に実行する子プロセスの数は max_concurrency で制限する。
+    - timeout 秒を超えた子プロセスは強制終了し、TimeoutError を送出する。
+    - 呼び出し元のタスクがキャンセルされた場合も、子プロセスを強制終了する。
+
+    コマンドの組み立てと出力の解析は MyFfmpegHelper と共通のものを使う。
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        timeout: float | None = 600,
+        logger: logging.Logger = logging.getLogger(__name__),
+    ):
+        """
+        Args:
+            max_concurrency (int): 同時に実行する子プロセスの数。デフォルトは4。
+            timeout (float | None): 子プロセス1回あたりのタイムアウト（秒）。Noneの場合は無制限。
+            logger (logging.Logger): ロガー。
+        """
+        self.timeout = timeout
+        self.logger = logger
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _run(self, cmd: list[str], timeout: float | None) -> bytes:
+        """
+        コマンドを実行し、標準出力を返す。
+
+        Args:
+            cmd (list[str]): 実行するコマンド。
+            timeout (float | None): タイムアウト（秒）。Noneの場合は無制限。
+
+        Returns:
+            bytes: 標準出力。
+
+        Raises:
+            TimeoutError: タイムアウトした場合。
+            Exception: コマンドがエラー終了した場合。
+        """
+        async with self._semaphore:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            try:
+                stdout, stderr = await asyncio.wait_for(
+                    process.communicate(), timeout
+                )
+            except BaseException:
+                # タイムアウト・キャンセル時は子プロセスを残さない
+                await self._kill(process)
+                raise
+
+        if process.returncode != 0:
+            raise Exception(
+                f"{cmd[0]}の実行に失敗しました (returncode={process.returncode}): "
+                f"{stderr.decode('utf-8', errors='replace').strip()}"
+            )
+        return stdout
+
+    @staticmethod
+    async def _kill(process: asyncio.subprocess.Process):
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+
+    async def probe(
+        self, file_path: str, cache: MediaInfoCache | None = None
+    ) -> MediaInfo:
+        """
+        MyFfmpegHelper.probe の非同期版。
+
+        Args:
+            file_path (str): メディアファイルのパス。
+            cache (MediaInfoCache, optional): ディスクキャッシュ。Defaults to None.
+
+        Returns:
+            MediaInfo: ファイルの情報。
+        """
+        info = cache.load(file_path) if cache is not None else None
+        if info is not None:
+            return info
+
+        self.logger.info(f"AsyncFfmpegHelper.probe: {file_path}")
+        output = await self._run(
+            MyFfmpegHelper.build_probe_command(file_path), self.timeout
+        )
+        info = MyFfmpegHelper.media_info_from_probe(file_path, output)
+        if cache is not None:
+            cache.save(info)
+        return info
+
+    async def probe_many(
+        self, file_paths: Iterable[str], cache: MediaInfoCache | None = None
+    ) -> dict[str, MediaInfo | BaseException]:
+        """
+        複数のファイルを並行して解析する。
+
+        Args:
+            file_paths (Iterable[str]): メディアファイルのパス。
+            cache (MediaInfoCache, optional): ディスクキャッシュ。Defaults to None.
+
+        Returns:
+            dict[str, MediaInfo | BaseException]: ファイルパスごとの解析結果。
+                解析に失敗したファイルは、発生した例外が入る。
+        """
+        file_paths = list(file_paths)
+        results = await asyncio.gather(
+            *(self.probe(file_path, cache=cache) for file_path in file_paths),
+            return_exceptions=True,
+        )
+        return dict(zip(file_paths, results))
+
+    async def is_video(
+        self, file_path: str, media_info: MediaInfo | None = None
+    ) -> bool:
+        """MyFfmpegHelper.is_video の非同期版。解析に失敗した場合はFalseを返す。"""
+        if media_info is None:
+            try:
+                media_info = await self.probe(file_path)
+            except Exception:
+                return False
+        return media_info.is_video
+
+    async def build_keyframe_index(self, input_video: str) -> KeyframeIndex:
+        """
+        MyFfmpegHelper.build_keyframe_index の非同期版。
+        ffprobeの出力は1行ずつ読み込むため、長い動画でも出力全体をメモリに保持しない。
+
+        Args:
+            input_video (str): 入力動画ファイルのパス。
+
+        Returns:
+            KeyframeIndex: キーフレームのインデックス。
+        """
+        cmd = MyFfmpegHelper.build_keyframe_index_command(input_video)
+        parser = KeyframeIndexParser(MyFfmpegHelper.get_size_bytes(input_video))
+
+        async def read_lines(process: asyncio.subprocess.Process):
+            assert process.stdout is not None
+            async for line in process.stdout:
+                parser.feed(line.decode("utf-8", errors="replace"))
+
+        async with self._semaphore:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+            try:
+                await asyncio.wait_for(read_lines(process), self.timeout)
+                await process.wait()
+            except BaseException:
+                await self._kill(process)
+                raise
+
+        if process.returncode != 0:
+            raise Exception(
+                f"ffprobeの実行に失敗しました (returncode={process.returncode}): {input_video}"
+            )
+        return parser.finish()
+
+    async def split_video_lossless_by_keyframes(
+        self,
+        input_video: str,
+        output_dir: str | None = None,
+        split_size_bytes: int = 5 * 1024**3,
+        mode: Literal["segment", "per_part"] = "segment",
+        media_info: MediaInfo | None = None,
+        timeout: float | None = None,
+    ) -> list[str]:
+        """
+        MyFfmpegHelper.split_video_lossless_by_keyframes の非同期版。
+
+        Args:
+            input_video (str): 入力動画のパス。
+            output_dir (str): 分割後の動画を保存するディレクトリ。
+            split_size_bytes (int): 各分割ファイルの目標サイズ（バイト）。デフォルトは5GiB。
+            mode (str): "segment" はsegmentマルチプレクサで入力を1回だけ読んで全パートを切り出す。
+                "per_part" はパートごとにffmpegを起動して切り出す。デフォルトは "segment"。
+            media_info (MediaInfo, optional): 取得済みの情報。キーフレームインデックスがあればffprobeを実行しない。
+            timeout (float | None): ffmpeg1回あたりのタイムアウト（秒）。入力全体を読むため、デフォルトは無制限。
+
+        Returns:
+            list[str]: 作成されたファイルパスのリスト。
+        """
+        if output_dir is None:
+            output_dir = os.path.dirname(input_video)
+        os.makedirs(output_dir, exist_ok=True)
+
+        if media_info is not None and media_info.keyframe_index is not None:
+            index = media_info.keyframe_index
+        else:
+            index = await self.build_keyframe_index(input_video)
+            MyFfmpegHelper._store_keyframe_index(media_info, index)
+
+        keyframes = MyFfmpegHelper.get_split_keyframe_sec_by_size(
+            input_video, split_size_bytes, logger=self.logger, index=index
+        )
+        base_name = os.path.splitext(os.path.basename(input_video))[0]
+
+        if mode == "segment" and keyframes:
+            try:
+                output = await self._run(
+                    MyFfmpegHelper.build_segment_split_command(
+                        input_video,
+                        MyFfmpegHelper.segment_output_pattern(output_dir, base_name),
+                        keyframes,
+                    ),
+                    timeout,
+                )
+            except BaseException:
+                # 失敗・タイムアウト・キャンセル時は、書き出し済みのパートも残さない
+                MyFfmpegHelper.remove_segment_outputs(
+                    output_dir, base_name, len(keyframes) + 1
+                )
+                raise
+            return [
+                MyFfmpegHelper.segment_output_path(output_dir, name.strip())
+                for name in output.decode("utf-8").splitlines()
+                if name.strip()
+            ]
+
+        output_files = []
+        for output_file, start, end in MyFfmpegHelper.plan_split_parts(
+            output_dir, base_name, keyframes, index.duration_sec
+        ):
+            try:
+                await self._run(
+                    MyFfmpegHelper.build_cut_command(
+                        input_video, start, end, output_file
+                    ),
+                    timeout,
+                )
+            except BaseException:
+                # 途中まで書き込まれたパートを残さない
+                if os.path.exists(output_file):
+                    os.remove(output_file)
+                raise
+            output_files.append(output_file)
+        return output_files
+
+    async def embed_metadata(
+        self,
+        input_path: str,
+        output_path: str,
+        metadata: FfmpegMetadata,
+        cover_path: str | None = None,
+    ):
+        """
+        MyFfmpegHelper.embed_metadata の非同期版。
+        カバー画像は同期版と同じく、Pillowで読み込めればプロセス内で変換し、読み込めない場合はffmpegで変換する。
+
+        Args:
+            input_path (str): 入力ファイルのパス。
+            output_path (str): 出力ファイルのパス。
+            metadata (dict): 埋め込むメタデータ。
+            cover_path (str, optional): カバー画像のパス。Defaults to None.
+
+        Raises:
+            Exception: ffmpegの実行中にエラーが発生した場合。
+        """
+        normalized_cover_path = None
+        try:
+            if cover_path:
+                normalized_cover_path = MyFfmpegHelper.normalized_cover_path_for(
+                    cover_path
+                )
+                converted = await asyncio.to_thread(
+                    MyFfmpegHelper.convert_cover_with_pillow,
+                    cover_path,
+                    normalized_cover_path,
+                    self.logger,
+                )
+                if not converted:
+                    await self._run(
+                        MyFfmpegHelper.build_normalize_cover_command(
+                            cover_path, normalized_cover_path
+                        ),
+                        self.timeout,
+                    )
+            await self._run(
+                MyFfmpegHelper.build_embed_metadata_command(
+                    input_path, output_path, metadata, normalized_cover_path
+                ),
+                self.timeout,
+            )
+        except BaseException:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            raise
+        finally:
+            if normalized_cover_path and os.path.exists(normalized_cover_path):
+                os.remove(normalized_cover_path)
@@ -0,0 +1,37 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass(eq=False)
+class BitrateProfile:
+    """
+    動画全体に分散させた複数の区間で計測したビットレートの分布。
+
+    Attributes:
+        duration_sec (float): 動画の長さ（秒）。
+        starts (np.ndarray): 各区間の開始秒数。
+        durations (np.ndarray): 各区間の長さ（秒）。
+        bitrates (np.ndarray): 各区間の映像ビットレート（bps）。
+        packet_mean (float): サンプリングした全パケットのサイズの平均（バイト）。
+        packet_std (float): サンプリングした全パケットのサイズの標準偏差（バイト）。
+    """
+
+    duration_sec: float
+    starts: np.ndarray
+    durations: np.ndarray
+    bitrates: np.ndarray
+    packet_mean: float = 0.0
+    packet_std: float = 0.0
+
+    @property
+    def bitrate_cv(self) -> float:
+        """区間ごとのビットレートの変動係数（標準偏差 / 平均）。"""
+        mean = float(self.bitrates.mean()) if self.bitrates.size else 0.0
+        return float(self.bitrates.std() / mean) if mean > 0 else 0.0
+
+    @property
+    def packet_cv(self) -> float:
+        """パケットサイズの変動係数（標準偏差 / 平均）。"""
+        return self.packet_std / self.packet_mean if self.packet_mean > 0 else 0.0
+
@@ -0,0 +1,184 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+
+import requests
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+def convert_cover_to_jpeg(
+    data: bytes, max_dimension: int | None = None, quality: int = 90
+) -> bytes:
+    """
+    カバー画像をPillowでMP3埋め込み用のJPEGに変換する。
+
+    Args:
+        data (bytes): 元の画像データ。
+        max_dimension (int | None): 長辺の最大ピクセル数。Noneの場合は縮小しない。
+        quality (int): JPEGの画質。
+
+    Returns:
+        bytes: JPEGの画像データ。
+
+    Raises:
+        UnidentifiedImageError: Pillowで読み込めない画像の場合。
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ("RGBA", "LA", "P"):
+            # 透過部分は白で塗りつぶす
+            rgba = image.convert("RGBA")
+            background = Image.new("RGB", rgba.size, (255, 255, 255))
+            background.paste(rgba, mask=rgba.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+        if max_dimension:
+            image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+        output = io.BytesIO()
+        image.save(output, format="JPEG", quality=quality)
+        return output.getvalue()
+
+
+class CoverImageCache:
+    """
+    MP3埋め込み用に正規化したカバー画像のキャッシュ。
+
+    正規化したJPEGは元画像の内容のハッシュをキーに保存するため、同じ画像は1回だけ変換する。
+    また画像のURLと内容のハッシュの対応を記録し、max_age 秒以内に取得したURLは
+    ダウンロードせずにキャッシュ済みのJPEGを返す。
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = "~/.cache/shortcuts_app/covers",
+        max_dimension: int | None = 1400,
+        quality: int = 90,
+        max_age: float = 24 * 3600,
+        logger: logging.Logger = logging.getLogger(__name__),
+    ):
+        """
+        Args:
+            cache_dir (str): キャッシュを保存するディレクトリ。
+            max_dimension (int | None): 正規化後の長辺の最大ピクセル数。Noneの場合は縮小しない。
+            quality (int): JPEGの画質。
+            max_age (float): URLごとの取得結果を再利用する秒数。
+            logger (logging.Logger): ロガー。
+        """
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.max_dimension = max_dimension
+        self.quality = quality
+        self.max_age = max_age
+        self.logger = logger
+        self._index_path = os.path.join(self.cache_dir, "urls.json")
+        self._lock = threading.Lock()
+
+    def _load_index(self) -> dict:
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self, index: dict):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{self._index_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(index, f, indent=2)
+            os.replace(tmp_path, self._index_path)
+        except OSError as e:
+            self.logger.warning(f"カバー画像のキャッシュを保存できませんでした: {e}")
+
+    def _cover_path(self, content_hash: str) -> str:
+        size = self.max_dimension or "orig"
+        return os.path.join(self.cache_dir, f"{content_hash}_{size}_q{self.quality}.jpg")
+
+    def get(self, url: str, session: requests.Session | None = None) -> str:
+        """
+        URLのカバー画像を正規化したJPEGのパスを返す。
+
+        Args:
+            url (str): カバー画像のURL。
+            session (requests.Session, optional): ダウンロードに使うセッション。
+
+        Returns:
+            str: 正規化したJPEGのパス（キャッシュ内のファイルのため削除しないこと）。
+
+        Raises:
+            Exception: ダウンロードまたは変換に失敗した場合。
+        """
+        with self._lock:
+            entry = self._load_index().get(url)
+        if entry and time.time() - entry.get("fetched_at", 0) < self.max_age:
+            cover_path = self._cover_path(entry["content_hash"])
+            if os.path.exists(cover_path):
+                self.logger.info(f"キャッシュ済みのカバー画像を使用します: {url}")
+                return cover_path
+
+        self.logger.info(f"カバー画像をダウンロードしています: {url}")
+        response = (session or requests).get(url, timeout=60)
+        response.raise_for_status()
+        cover_path, content_hash = self._store(response.content)
+
+        with self._lock:
+            index = self._load_index()
+            index[url] = {"content_hash": content_hash, "fetched_at": time.time()}
+            self._save_index(index)
+        return cover_path
+
+    def normalize(self, data: bytes) -> str:
+        """
+        画像データを正規化したJPEGのパスを返す（同じ内容の画像は変換済みのものを使う）。
+
+        Args:
+            data (bytes): 元の画像データ。
+
+        Returns:
+            str: 正規化したJPEGのパス（キャッシュ内のファイルのため削除しないこと）。
+        """
+        return self._store(data)[0]
+
+    def _store(self, data: bytes) -> tuple[str, str]:
+        content_hash = hashlib.sha256(data).hexdigest()
+        cover_path = self._cover_path(content_hash)
+        if os.path.exists(cover_path):
+            return cover_path, content_hash
+
+        jpeg = self._convert(data)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{cover_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(jpeg)
+        os.replace(tmp_path, cover_path)
+        return cover_path, content_hash
+
+    def _convert(self, data: bytes) -> bytes:
+        try:
+            return convert_cover_to_jpeg(data, self.max_dimension, self.quality)
+        except (UnidentifiedImageError, OSError) as e:
+            # Pillowで読めない形式はffmpegでJPEGにしてから縮小する
+            self.logger.info(f"Pillowで変換できないため、ffmpegを使用します: {e}")
+            from .my_ffmpeg_helper import MyFfmpegHelper
+
+            os.makedirs(self.cache_dir, exist_ok=True)
+            source_path = os.path.join(
+                self.cache_dir, f"source.{threading.get_ident()}.tmp"
+            )
+            with open(source_path, "wb") as f:
+                f.write(data)
+            jpeg_path = None
+            try:
+                jpeg_path = MyFfmpegHelper.normalize_cover_image_for_mp3(
+                    source_path, logger=self.logger, use_pillow=False
+                )
+                with open(jpeg_path, "rb") as f:
+                    return convert_cover_to_jpeg(f.read(), self.max_dimension, self.quality)
+            finally:
+                for path in (source_path, jpeg_path):
+                    if path and os.path.exists(path):
+                        os.remove(path)
@@ -0,0 +1,265 @@
+import os
+import shutil
+import struct
+from collections.abc import Mapping
+
+# ID3v2のヘッダー・フレームヘッダーのサイズ
+HEADER_SIZE = 10
+FRAME_HEADER_SIZE = 10
+# 既存のタグに書き足せない場合に、新しく作るタグに確保する余白（次回以降の書き換え用）
+DEFAULT_PADDING = 4096
+
+# メタデータのキーとテキストフレームIDの対応
+TEXT_FRAME_IDS = {
+    "title": "TIT2",
+    "artist": "TPE1",
+    "album": "TALB",
+    "album_artist": "TPE2",
+    "genre": "TCON",
+    "track": "TRCK",
+    "composer": "TCOM",
+}
+
+
+class Id3UnsupportedError(Exception):
+    """ID3タグを直接書き換えられないファイル（ffmpegで処理する必要がある）"""
+
+
+def _syncsafe_decode(data: bytes) -> int:
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def _syncsafe_encode(value: int) -> bytes:
+    if value >= 1 << 28:
+        raise Id3UnsupportedError("ID3タグが大きすぎます。")
+    return bytes(
+        [(value >> 21) & 0x7F, (value >> 14) & 0x7F, (value >> 7) & 0x7F, value & 0x7F]
+    )
+
+
+def read_id3v2_header(f) -> tuple[int, int, int] | None:
+    """
+    ファイル先頭のID3v2ヘッダーを読み込む。
+
+    Args:
+        f: バイナリモードで開いたファイル（先頭から読む）。
+
+    Returns:
+        tuple[int, int, int] | None: (メジャーバージョン, フラグ, ヘッダーを除くタグのサイズ)。
+            ID3v2タグがない場合はNone。
+    """
+    f.seek(0)
+    header = f.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE or header[:3] != b"ID3":
+        return None
+    return header[3], header[5], _syncsafe_decode(header[6:10])
+
+
+def empty_id3_tag(padding: int = DEFAULT_PADDING) -> bytes:
+    """
+    フレームを含まず、余白だけを確保したID3v2.3タグを返す。
+    ダウンロード時に先頭へ書いておくと、後からタグをその場で書き込める。
+    """
+    return b"ID3\x03\x00\x00" + _syncsafe_encode(padding) + b"\x00" * padding
+
+
+def _frame(frame_id: str, body: bytes, version: int) -> bytes:
+    size = _syncsafe_encode(len(body)) if version == 4 else struct.pack(">I", len(body))
+    return frame_id.encode("ascii") + size + b"\x00\x00" + body
+
+
+def _encode_text(value: str) -> bytes:
+    # UTF-16（BOM付き）はID3v2.3・v2.4のどちらでも使え、日本語も扱える
+    return value.encode("utf-16")
+
+
+def _text_frame(frame_id: str, value: str, version: int) -> bytes:
+    return _frame(frame_id, b"\x01" + _encode_text(value), version)
+
+
+def _txxx_frame(description: str, value: str, version: int) -> bytes:
+    body = b"\x01" + _encode_text(description) + b"\x00\x00" + _encode_text(value)
+    return _frame("TXXX", body, version)
+
+
+def _apic_frame(image: bytes, mime_type: str, version: int) -> bytes:
+    # テキストエンコーディング(ISO-8859-1), MIMEタイプ, 画像の種類(3: 表紙), 説明(空)
+    body = b"\x00" + mime_type.encode("ascii") + b"\x00" + b"\x03" + b"\x00" + image
+    return _frame("APIC", body, version)
+
+
+def _txxx_description(body: bytes) -> str | None:
+    encoding, rest = body[:1], body[1:]
+    try:
+        if encoding in (b"\x00", b"\x03"):
+            return rest.split(b"\x00", 1)[0].decode(
+                "latin-1" if encoding == b"\x00" else "utf-8"
+            )
+        # UTF-16 の終端は2バイト境界の \x00\x00
+        for i in range(0, len(rest) - 1, 2):
+            if rest[i : i + 2] == b"\x00\x00":
+                return rest[:i].decode("utf-16-be" if encoding == b"\x02" else "utf-16")
+    except UnicodeDecodeError:
+        return None
+    return None
+
+
+def _iter_frames(tag: bytes, version: int):
+    """タグ本体（ヘッダーを除く）からフレームを (ID, 本体, フレーム全体) で返す。"""
+    offset = 0
+    while offset + FRAME_HEADER_SIZE <= len(tag):
+        frame_id = tag[offset : offset + 4]
+        if frame_id[:1] == b"\x00":
+            break  # 以降は余白
+        size_bytes = tag[offset + 4 : offset + 8]
+        size = (
+            _syncsafe_decode(size_bytes)
+            if version == 4
+            else struct.unpack(">I", size_bytes)[0]
+        )
+        end = offset + FRAME_HEADER_SIZE + size
+        if end > len(tag):
+            raise Id3UnsupportedError("ID3タグのフレームが壊れています。")
+        yield (
+            frame_id.decode("latin-1"),
+            tag[offset + FRAME_HEADER_SIZE : end],
+            tag[offset:end],
+        )
+        offset = end
+
+
+def estimate_tag_size(
+    metadata: Mapping[str, str | None], cover_size: int = 0, padding: int = DEFAULT_PADDING
+) -> int:
+    """
+    write_id3_tags で書き込むタグが収まる大きさ（余白を含む）を見積もる。
+    empty_id3_tag でこの大きさを確保しておけば、タグはその場で書き込める。
+    """
+    size = padding
+    for key, value in metadata.items():
+        if value:
+            # フレームヘッダー + エンコーディング + UTF-16(BOM付き) の説明と値
+            size += FRAME_HEADER_SIZE + 1 + 4 * (len(key) + len(value)) + 8
+    if cover_size:
+        size += FRAME_HEADER_SIZE + 16 + cover_size
+    return size
+
+
+def looks_like_mp3(data: bytes) -> bool:
+    """データの先頭がID3タグまたはMPEGオーディオのフレーム同期で始まるかどうかを返す。"""
+    if data.startswith(b"ID3"):
+        return True
+    return len(data) >= 2 and data[0] == 0xFF and (data[1] & 0xE0) == 0xE0
+
+
+def detect_image_mime_type(image: bytes) -> str | None:
+    """APICにそのまま埋め込める画像（JPEG・PNG）であればMIMEタイプを返す。"""
+    if image.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if image.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    return None
+
+
+def write_id3_tags(
+    file_path: str,
+    metadata: Mapping[str, str | None],
+    cover_image: bytes | None = None,
+    padding: int = DEFAULT_PADDING,
+) -> bool:
+    """
+    MP3ファイルにID3v2のテキストフレームとカバー画像（APIC）を直接書き込む。
+
+    既存のタグの余白に収まる場合は、タグの領域だけをその場で書き換える。
+    収まらない場合やタグがない場合は、余白を確保した新しいタグを付けて
+    同じディレクトリの一時ファイルに1回だけ書き出し、元のファイルと置き換える。
+    書き換え対象以外の既存のフレームはそのまま残す。
+
+    Args:
+        file_path (str): MP3ファイルのパス。
+        metadata (Mapping[str, str | None]): 書き込むメタデータ（空の値は書き込まない）。
+        cover_image (bytes, optional): カバー画像（JPEGまたはPNG）。Defaults to None.
+        padding (int): タグを作り直す場合に確保する余白（バイト）。
+
+    Returns:
+        bool: タグの領域だけを書き換えた場合はTrue、ファイル全体を書き直した場合はFalse。
+
+    Raises:
+        Id3UnsupportedError: このファイルのタグを直接書き換えられない場合。
+    """
+    cover_mime_type = None
+    if cover_image is not None:
+        cover_mime_type = detect_image_mime_type(cover_image)
+        if cover_mime_type is None:
+            raise Id3UnsupportedError("JPEG・PNG以外のカバー画像は埋め込めません。")
+
+    with open(file_path, "rb") as f:
+        header = read_id3v2_header(f)
+        if header is None:
+            version, old_size, old_tag = 3, 0, b""
+        else:
+            version, flags, old_size = header
+            if version not in (3, 4):
+                raise Id3UnsupportedError(f"ID3v2.{version} は扱えません。")
+            # 非同期化・拡張ヘッダー・フッター付きのタグは扱わない
+            if flags & 0xF0:
+                raise Id3UnsupportedError("フラグ付きのID3タグは扱えません。")
+            old_tag = f.read(old_size)
+        audio_offset = HEADER_SIZE + old_size if header is not None else 0
+
+    # 新しく書き込むフレーム
+    new_frames: list[bytes] = []
+    replaced_ids: set[str] = set()
+    replaced_txxx: set[str] = set()
+    for key, value in metadata.items():
+        if not value:  # 値が空でない場合のみ追加
+            continue
+        frame_id = TEXT_FRAME_IDS.get(key)
+        if frame_id:
+            new_frames.append(_text_frame(frame_id, value, version))
+            replaced_ids.add(frame_id)
+        else:
+            new_frames.append(_txxx_frame(key, value, version))
+            replaced_txxx.add(key)
+    if cover_image is not None and cover_mime_type is not None:
+        new_frames.append(_apic_frame(cover_image, cover_mime_type, version))
+        replaced_ids.add("APIC")
+
+    # 既存のフレームのうち、書き換えないものは残す
+    kept_frames = [
+        raw
+        for frame_id, body, raw in _iter_frames(old_tag, version)
+        if frame_id not in replaced_ids
+        and not (frame_id == "TXXX" and _txxx_description(body) in replaced_txxx)
+    ]
+    frames = b"".join(kept_frames + new_frames)
+
+    if header is not None and len(frames) <= old_size:
+        # 既存のタグの領域に収まるため、ヘッダー領域だけを書き換える
+        tag = (
+            b"ID3"
+            + bytes([version, 0, 0])
+            + _syncsafe_encode(old_size)
+            + frames
+            + b"\x00" * (old_size - len(frames))
+        )
+        with open(file_path, "r+b") as f:
+            f.write(tag)
+        return True
+
+    # 余白を確保したタグを付けて書き直す
+    size = len(frames) + padding
+    tag = b"ID3" + bytes([version, 0, 0]) + _syncsafe_encode(size) + frames
+    tag += b"\x00" * padding
+    tmp_path = f"{file_path}.id3tmp"
+    try:
+        with open(file_path, "rb") as src, open(tmp_path, "wb") as dst:
+            dst.write(tag)
+            src.seek(audio_offset)
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        shutil.copymode(file_path, tmp_path)
+        os.replace(tmp_path, file_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return False
@@ -0,0 +1,185 @@
+import bisect
+import logging
+from dataclasses import dataclass, field
+
+
+@dataclass
+class KeyframeIndex:
+    """
+    動画のキーフレーム位置のインデックス。
+    ffprobeでパケット情報を1回だけ読み込んで作成し、分割位置の計算はすべてこのインデックスから行う。
+
+    Attributes:
+        duration_sec (float): 動画の長さ（秒）。
+        size_bytes (int): ファイルサイズ（バイト）。
+        times (list[float]): キーフレームの秒数（昇順）。
+        offsets (list[int]): 各キーフレームより前にある全ストリームのパケットの累積バイト数
+            （パケットサイズを読み込んでいない場合は-1）。times の順に並ぶため、
+            読み込み順と時刻の順が異なるキーフレームがあると昇順とは限らない。
+        packet_bytes (int): 全ストリームのパケットの合計バイト数（不明な場合は0）。
+    """
+
+    duration_sec: float
+    size_bytes: int
+    times: list[float] = field(default_factory=list)
+    offsets: list[int] = field(default_factory=list)
+    packet_bytes: int = 0
+
+    def add_keyframe(self, time_sec: float, offset: int = -1):
+        """キーフレームを追加する（ffprobeの出力順は概ね昇順のため、順序を保って挿入する）。"""
+        if not self.times or time_sec >= self.times[-1]:
+            self.times.append(time_sec)
+            self.offsets.append(offset)
+            return
+        i = bisect.bisect_right(self.times, time_sec)
+        self.times.insert(i, time_sec)
+        self.offsets.insert(i, offset)
+
+    @property
+    def has_byte_offsets(self) -> bool:
+        """パケットの累積バイト数から分割点を計算できるかどうか。"""
+        return (
+            self.packet_bytes > 0
+            and bool(self.offsets)
+            and all(offset >= 0 for offset in self.offsets)
+        )
+
+    def split_points_by_bytes(
+        self,
+        split_size_bytes: int,
+        logger: logging.Logger = logging.getLogger(__name__),
+    ) -> list[float]:
+        """
+        パケットの累積バイト数から、各パートが split_size_bytes を超えない範囲で
+        最も後ろにあるキーフレームを分割点として選ぶ。
+        ビットレートが一定でない動画でも各パートをサイズ上限近くまで詰められるため、パート数が最小になる。
+
+        コンテナのオーバーヘッド（ファイルサイズとパケット合計の差）はパケットのバイト数に比例するとみなし、
+        予算をその分だけ小さくして計算する。
+
+        Args:
+            split_size_bytes (int): 1パートの上限サイズ（バイト）。
+            logger (logging.Logger): ロガー。
+
+        Returns:
+            list[float]: 分割点のキーフレームの秒数のリスト（先頭の0秒は含まない）。
+
+        Raises:
+            ValueError: パケットの累積バイト数が記録されていない場合。
+        """
+        if not self.has_byte_offsets:
+            raise ValueError("パケットサイズを含むキーフレームインデックスではありません。")
+
+        # ファイルサイズ上の予算を、パケットのバイト数上の予算に換算する
+        ratio = self.packet_bytes / self.size_bytes if self.size_bytes > 0 else 1.0
+        budget = split_size_bytes * min(1.0, ratio)
+
+        # 累積バイト数で二分探索するため、読み込み順（累積バイト数の昇順）に並べ直す
+        keyframes = sorted(zip(self.offsets, self.times))
+        offsets = [offset for offset, _ in keyframes]
+        times = [time_sec for _, time_sec in keyframes]
+
+        points: list[float] = []
+        start = 0
+        start_offset = 0
+        while self.packet_bytes - start_offset > budget:
+            # start_offset + budget 以下の最後のキーフレーム
+            last = bisect.bisect_right(offsets, start_offset + budget) - 1
+            if last <= start:
+                # 1つのGOPが予算を超える場合は、次のキーフレームで切るしかない
+                last = start + 1
+                if last >= len(times):
+                    break
+                logger.warning(
+                    f"キーフレーム間隔が分割サイズを超えています: {times[start]} - {times[last]}"
+                )
+            # 先頭や、直前の分割点より前の時刻のキーフレームでは切れない
+            if times[last] <= (points[-1] if points else 0.0):
+                start = last
+                continue
+            points.append(times[last])
+            start = last
+            start_offset = offsets[last]
+
+        return points
+
+    def keyframe_before(self, sec: float) -> float:
+        """
+        指定された秒数以前で最も近いキーフレームの秒数を返す。
+        該当するキーフレームがない場合は先頭（0.0）を返す。
+        """
+        i = bisect.bisect_right(self.times, sec) - 1
+        return self.times[i] if i >= 0 else 0.0
+
+
+
+def parse_compact_line(line: str) -> tuple[str, dict[str, str]]:
+    """
+    ffprobe の `-of compact` 形式の1行を (セクション名, {キー: 値}) に分解する。
+
+    例: "packet|pts_time=1.001|size=4096|flags=K__" -> ("packet", {"pts_time": "1.001", ...})
+    """
+    section, _, rest = line.strip().partition("|")
+    values = {}
+    for item in rest.split("|"):
+        key, sep, value = item.partition("=")
+        if sep:
+            values[key] = value
+    return section, values
+
+
+def parse_float(value: str | None) -> float | None:
+    """ffprobeの数値文字列をfloatに変換する。N/Aや空文字の場合はNoneを返す。"""
+    if not value or value.upper() == "N/A":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+class KeyframeIndexParser:
+    """
+    ffprobe の `-of compact` 形式のパケット情報を1行ずつ受け取り、KeyframeIndex を作成する。
+    同期版・非同期版のどちらのffprobe実行でも同じ解析処理を使う。
+    """
+
+    def __init__(self, size_bytes: int):
+        """
+        Args:
+            size_bytes (int): 動画ファイルのサイズ（バイト）。
+        """
+        self.index = KeyframeIndex(duration_sec=0.0, size_bytes=size_bytes)
+        # キーフレームを記録する映像ストリーム（最初に現れた映像ストリーム）
+        self._video_stream: str | None = None
+        self._packet_bytes = 0
+
+    def feed(self, line: str):
+        """ffprobeの出力を1行解析する。"""
+        section, values = parse_compact_line(line)
+        if section == "packet":
+            offset = self._packet_bytes
+            size = parse_float(values.get("size"))
+            self._packet_bytes += int(size) if size is not None else 0
+
+            if values.get("codec_type", "video") != "video":
+                return
+            stream = values.get("stream_index")
+            if self._video_stream is None:
+                self._video_stream = stream
+            # キーフレームのパケットだけを記録する
+            if stream != self._video_stream or "K" not in values.get("flags", ""):
+                return
+            time_sec = parse_float(values.get("pts_time"))
+            if time_sec is None:
+                time_sec = parse_float(values.get("dts_time"))
+            if time_sec is None:
+                return
+            self.index.add_keyframe(time_sec, offset if size is not None else -1)
+        elif section == "format":
+            self.index.duration_sec = parse_float(values.get("duration")) or 0.0
+
+    def finish(self) -> KeyframeIndex:
+        """解析を終了し、作成したインデックスを返す。"""
+        self.index.packet_bytes = self._packet_bytes
+        return self.index
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import logging
+import os
+from dataclasses import asdict, dataclass, field
+
+from .keyframe_index import KeyframeIndex
+
+
+@dataclass
+class MediaInfo:
+    """
+    ffprobeで1回だけ取得したメディアファイルの情報。
+    MyFfmpegHelperの各メソッドに渡すと、ffprobeを実行せずにこの情報を使う。
+
+    Attributes:
+        path (str): ファイルのパス。
+        size_bytes (int): 取得時点のファイルサイズ（バイト）。
+        mtime_ns (int): 取得時点のファイルの更新日時（ナノ秒）。
+        format (dict): ffprobeの format セクション。
+        streams (list[dict]): ffprobeの streams セクション。
+        keyframe_index (KeyframeIndex | None): キーフレームのインデックス（未作成の場合はNone）。
+        cache (MediaInfoCache | None): 追加で取得した情報を保存するキャッシュ。
+    """
+
+    path: str
+    size_bytes: int
+    mtime_ns: int
+    format: dict = field(default_factory=dict)
+    streams: list[dict] = field(default_factory=list)
+    keyframe_index: KeyframeIndex | None = None
+    cache: "MediaInfoCache | None" = field(default=None, repr=False, compare=False)
+
+    @property
+    def duration_sec(self) -> float:
+        """メディアの長さ（秒）。取得できない場合は0.0。"""
+        try:
+            return float(self.format.get("duration", 0.0))
+        except (TypeError, ValueError):
+            return 0.0
+
+    @property
+    def tags(self) -> dict:
+        """format.tags に格納されているメタデータ。"""
+        return self.format.get("tags", {})
+
+    @property
+    def is_video(self) -> bool:
+        """映像ストリームを含むかどうか（MP3などのカバー画像（attached_pic）は映像として数えない）。"""
+        return any(
+            stream.get("codec_type") == "video"
+            and not stream.get("disposition", {}).get("attached_pic")
+            for stream in self.streams
+        )
+
+    def to_dict(self) -> dict:
+        """キャッシュに保存する形式に変換する。"""
+        return {
+            "path": self.path,
+            "size_bytes": self.size_bytes,
+            "mtime_ns": self.mtime_ns,
+            "format": self.format,
+            "streams": self.streams,
+            "keyframe_index": (
+                asdict(self.keyframe_index) if self.keyframe_index is not None else None
+            ),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "MediaInfo":
+        """to_dict で変換した形式から復元する。"""
+        index = data.get("keyframe_index")
+        return cls(
+            path=data["path"],
+            size_bytes=data["size_bytes"],
+            mtime_ns=data["mtime_ns"],
+            format=data.get("format", {}),
+            streams=data.get("streams", []),
+            keyframe_index=KeyframeIndex(**index) if index is not None else None,
+        )
+
+
+class MediaInfoCache:
+    """
+    MediaInfo をディスクに保存するキャッシュ。
+    ファイルごとに1つのJSONファイルとして保存し、「パス + サイズ + 更新日時」が一致する場合だけ使う。
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = "~/.cache/shortcuts_app/media_info",
+        logger: logging.Logger = logging.getLogger(__name__),
+    ):
+        """
+        Args:
+            cache_dir (str): キャッシュを保存するディレクトリ。
+            logger (logging.Logger): ロガー。
+        """
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.logger = logger
+
+    def _cache_path(self, file_path: str) -> str:
+        key = hashlib.sha256(os.path.realpath(file_path).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def load(self, file_path: str) -> MediaInfo | None:
+        """
+        キャッシュ済みの MediaInfo を返す。
+
+        Args:
+            file_path (str): メディアファイルのパス。
+
+        Returns:
+            MediaInfo | None: キャッシュがない、またはファイルが変更されている場合はNone。
+        """
+        try:
+            stat = os.stat(file_path)
+            with open(self._cache_path(file_path), "r", encoding="utf-8") as f:
+                info = MediaInfo.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+        if (
+            info.path != os.path.realpath(file_path)
+            or info.size_bytes != stat.st_size
+            or info.mtime_ns != stat.st_mtime_ns
+        ):
+            return None
+        info.cache = self
+        return info
+
+    def save(self, info: MediaInfo):
+        """MediaInfo を保存する。保存に失敗してもエラーにはしない。"""
+        info.cache = self
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            cache_path = self._cache_path(info.path)
+            tmp_path = f"{cache_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(info.to_dict(), f, ensure_ascii=False)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            self.logger.warning(f"MediaInfoのキャッシュを保存できませんでした: {e}")
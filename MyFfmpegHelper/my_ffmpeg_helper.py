@@ -1,9 +1,27 @@
+import concurrent.futures
+import json
 import logging
 import math
 import os
 import subprocess
-from typing import TypedDict
-import ffmpeg
+import tempfile
+import threading
+from collections.abc import Iterable, Iterator
+from typing import Literal, TypedDict
+import numpy as np
+from PIL import UnidentifiedImageError
+
+from .bitrate_profile import BitrateProfile
+from .cover_cache import convert_cover_to_jpeg
+from .id3_tag import Id3UnsupportedError, detect_image_mime_type, write_id3_tags
+from .keyframe_index import KeyframeIndex, KeyframeIndexParser, parse_float
+from .media_info import MediaInfo, MediaInfoCache
+from .progress import ProgressMonitor, kill_when_cancelled
+from .transcode_profile import (
+    DEFAULT_TRANSCODE_PROFILES,
+    TranscodePlan,
+    TranscodeProfile,
+)
 
 
 class FfmpegMetadata(TypedDict, total=False):
@@ -19,35 +37,37 @@ class MyFfmpegHelper:
     def normalize_cover_image_for_mp3(
         cover_path: str,
         logger: logging.Logger | None = None,
+        use_pillow: bool = True,
+        progress: ProgressMonitor | None = None,
     ) -> str:
         """
         MP3 に埋め込める JPEG カバー画像を生成し、そのパスを返す。
+        Pillowで読み込める画像はプロセス内で変換し、読み込めない場合はffmpegで変換する。
 
         Args:
             cover_path (str): 元のカバー画像パス。
             logger (optional): ロガーオブジェクト。Defaults to None.
+            use_pillow (bool): Pillowでの変換を試すかどうか。Defaults to True.
+            progress (ProgressMonitor, optional): ffmpegの進捗を監視する場合に指定する。Defaults to None.
 
         Returns:
             str: JPEG に正規化されたカバー画像パス。
         """
-        normalized_cover_path = f"{cover_path}.mp3_cover.jpg"
+        normalized_cover_path = MyFfmpegHelper.normalized_cover_path_for(cover_path)
+
+        if use_pillow and MyFfmpegHelper.convert_cover_with_pillow(
+            cover_path, normalized_cover_path, logger=logger
+        ):
+            return normalized_cover_path
 
         try:
             if logger:
                 logger.info("MP3埋め込み用にカバー画像をJPEGへ正規化しています...")
 
-            cmd = [
-                "ffmpeg",
-                "-i",
-                cover_path,
-                "-frames:v",
-                "1",
-                "-c:v",
-                "mjpeg",
-                "-y",
-                normalized_cover_path,
-            ]
-            subprocess.run(cmd, check=True, capture_output=True, text=True)
+            cmd = MyFfmpegHelper.build_normalize_cover_command(
+                cover_path, normalized_cover_path
+            )
+            MyFfmpegHelper._run_ffmpeg(cmd, progress)
             return normalized_cover_path
         except subprocess.CalledProcessError as e:
             if logger:
@@ -56,27 +76,200 @@ class MyFfmpegHelper:
             raise Exception(f"カバー画像の変換に失敗しました: {e.stderr}") from e
 
     @staticmethod
-    def get_audio_metadata(file_path: str) -> dict | None:
+    def normalized_cover_path_for(cover_path: str) -> str:
+        """MP3埋め込み用に正規化したカバー画像の保存先パスを返す。"""
+        return f"{cover_path}.mp3_cover.jpg"
+
+    @staticmethod
+    def convert_cover_with_pillow(
+        cover_path: str,
+        normalized_cover_path: str,
+        logger: logging.Logger | None = None,
+    ) -> bool:
         """
-        ffmpegを使って音声ファイルのメタデータを取得する
+        Pillowでカバー画像をMP3埋め込み用のJPEGに変換する。
+
+        Args:
+            cover_path (str): 元のカバー画像パス。
+            normalized_cover_path (str): 変換後のJPEGの保存先パス。
+            logger (optional): ロガーオブジェクト。Defaults to None.
+
+        Returns:
+            bool: 変換できた場合はTrue。Pillowで読み込めない場合はFalse（ffmpegで変換する）。
         """
         try:
-            # ffprobeでメタデータを取得
-            probe = ffmpeg.probe(file_path)
-            # format.tagsにメタデータが格納されている
-            metadata = probe.get("format", {}).get("tags", {})
-            return metadata
-        except ffmpeg.Error as e:
-            print(f"Error reading metadata: {e.stderr}")
-            return None
+            with open(cover_path, "rb") as f:
+                jpeg = convert_cover_to_jpeg(f.read())
+            with open(normalized_cover_path, "wb") as f:
+                f.write(jpeg)
+            return True
+        except (UnidentifiedImageError, OSError) as e:
+            if logger:
+                logger.info(f"Pillowで変換できないため、ffmpegを使用します: {e}")
+            return False
+
+    @staticmethod
+    def probe(
+        file_path: str,
+        cache: MediaInfoCache | None = None,
+        keyframes: bool = False,
+        logger: logging.Logger = logging.getLogger(__name__),
+    ) -> MediaInfo:
+        """
+        ffprobeでファイルのformatとstreamsを1回だけ取得する。
+        キャッシュを指定した場合、「パス + サイズ + 更新日時」が一致すればffprobeを実行せずにキャッシュを返す。
+
+        Args:
+            file_path (str): メディアファイルのパス。
+            cache (MediaInfoCache, optional): ディスクキャッシュ。Defaults to None.
+            keyframes (bool): Trueの場合はキーフレームインデックスも作成する。Defaults to False.
+
+        Returns:
+            MediaInfo: ファイルの情報。
+
+        Raises:
+            Exception: ffprobeの実行中にエラーが発生した場合。
+        """
+        info = cache.load(file_path) if cache is not None else None
+        if info is None:
+            logger.info(f"MyFfmpegHelper.probe: {file_path}")
+            cmd = MyFfmpegHelper.build_probe_command(file_path)
+            try:
+                output = subprocess.check_output(cmd, stderr=subprocess.DEVNULL)
+                info = MyFfmpegHelper.media_info_from_probe(file_path, output)
+            except Exception as e:
+                raise Exception(f"エラーが発生しました: {e}")
+
+            if cache is not None:
+                cache.save(info)
+
+        if keyframes:
+            MyFfmpegHelper._get_keyframe_index(file_path, info, logger=logger)
+        return info
+
+    @staticmethod
+    def build_probe_command(file_path: str) -> list[str]:
+        """formatとstreamsをJSONで出力するffprobeコマンドを作成する。"""
+        return [
+            "ffprobe",
+            "-v",
+            "error",
+            "-show_format",
+            "-show_streams",
+            "-of",
+            "json",
+            file_path,
+        ]
+
+    @staticmethod
+    def media_info_from_probe(file_path: str, output: bytes | str) -> MediaInfo:
+        """
+        build_probe_command の出力（JSON）から MediaInfo を作成する。
+
+        Args:
+            file_path (str): メディアファイルのパス。
+            output (bytes | str): ffprobeの標準出力。
+
+        Returns:
+            MediaInfo: ファイルの情報。
+        """
+        probe = json.loads(output)
+        stat = os.stat(file_path)
+        return MediaInfo(
+            path=os.path.realpath(file_path),
+            size_bytes=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            format=probe.get("format", {}),
+            streams=probe.get("streams", []),
+        )
+
+    @staticmethod
+    def _get_keyframe_index(
+        input_video: str,
+        media_info: MediaInfo | None,
+        logger: logging.Logger = logging.getLogger(__name__),
+    ) -> KeyframeIndex:
+        # MediaInfoに作成済みのインデックスがあればそれを使い、なければ作成してキャッシュにも保存する
+        if media_info is not None and media_info.keyframe_index is not None:
+            return media_info.keyframe_index
+        index = MyFfmpegHelper.build_keyframe_index(input_video, logger=logger)
+        MyFfmpegHelper._store_keyframe_index(media_info, index)
+        return index
+
+    @staticmethod
+    def _store_keyframe_index(media_info: MediaInfo | None, index: KeyframeIndex):
+        # 作成したインデックスをMediaInfoとそのキャッシュに保存する
+        if media_info is not None:
+            media_info.keyframe_index = index
+            if media_info.cache is not None:
+                media_info.cache.save(media_info)
+
+    @staticmethod
+    def _run_ffmpeg(
+        cmd: list[str],
+        progress: ProgressMonitor | None = None,
+        duration_sec: float | None = None,
+    ):
+        # 進捗の監視を指定した場合は -progress の出力を解析しながら実行する
+        if progress is not None:
+            progress.run(cmd, duration_sec=duration_sec)
+        else:
+            subprocess.run(cmd, check=True, capture_output=True, text=True)
+
+    @staticmethod
+    def build_normalize_cover_command(
+        cover_path: str, normalized_cover_path: str
+    ) -> list[str]:
+        """カバー画像をMP3埋め込み用のJPEGに変換するffmpegコマンドを作成する。"""
+        return [
+            "ffmpeg",
+            "-i",
+            cover_path,
+            "-frames:v",
+            "1",
+            "-c:v",
+            "mjpeg",
+            "-y",
+            normalized_cover_path,
+        ]
+
+    @staticmethod
+    def get_audio_metadata(
+        file_path: str,
+        media_info: MediaInfo | None = None,
+        cache: MediaInfoCache | None = None,
+        logger: logging.Logger = logging.getLogger(__name__),
+    ) -> dict | None:
+        """
+        音声ファイルのメタデータ（formatのタグ）を取得する。
+
+        Args:
+            file_path (str): 音声ファイルのパス。
+            media_info (MediaInfo, optional): 取得済みの情報。指定した場合はffprobeを実行しない。
+            cache (MediaInfoCache, optional): MyFfmpegHelper.probe に渡すディスクキャッシュ。Defaults to None.
+            logger (logging.Logger): ロガー。
+
+        Returns:
+            dict | None: メタデータ。取得に失敗した場合はNone。
+        """
+        if media_info is None:
+            try:
+                media_info = MyFfmpegHelper.probe(file_path, cache=cache, logger=logger)
+            except Exception as e:
+                logger.error(f"メタデータの取得に失敗しました: {file_path}: {e}")
+                return None
+        return media_info.tags
 
     @staticmethod
-    def get_duration_sec(input_video: str) -> float:
+    def get_duration_sec(
+        input_video: str, media_info: MediaInfo | None = None
+    ) -> float:
         """
         動画の長さ（秒：小数）を取得する。
 
         Args:
             input_video (str): 動画ファイルのパス。
+            media_info (MediaInfo, optional): 取得済みの情報。指定した場合はffprobeを実行しない。
 
         Returns:
             float: 動画の長さ（秒）。
@@ -84,6 +277,8 @@ class MyFfmpegHelper:
         Raises:
             Exception: ffprobeの実行中にエラーが発生した場合。
         """
+        if media_info is not None:
+            return media_info.duration_sec
         try:
             cmd = [
                 "ffprobe",
@@ -128,7 +323,9 @@ class MyFfmpegHelper:
 
     @staticmethod
     def get_split_sec_by_size(
-        input_video: str, split_size_bytes: int = 5 * 1024**3
+        input_video: str,
+        split_size_bytes: int = 5 * 1024**3,
+        index: KeyframeIndex | None = None,
     ) -> float:
         """
         指定された動画を指定されたサイズで分割するときの、分割時間を計算する。
@@ -136,6 +333,8 @@ class MyFfmpegHelper:
         Args:
             input_video (str): 動画ファイルのパス。
             split_size_bytes (int): 分割したい動画ファイルサイズ（バイト）。デフォルトは5GiB。
+            index (KeyframeIndex, optional): 作成済みのキーフレームインデックス。
+                指定した場合はffprobeを実行せずにインデックスの値を使う。Defaults to None.
 
         Returns:
             float: 分割目安の時間（秒）。
@@ -144,10 +343,14 @@ class MyFfmpegHelper:
             Exception: 動画の長さやファイルサイズの取得中にエラーが発生した場合。
         """
         try:
-            # 動画の尺を取得
-            duration_sec = MyFfmpegHelper.get_duration_sec(input_video)
-            # 動画のファイルサイズを取得
-            file_size_bytes = MyFfmpegHelper.get_size_bytes(input_video)
+            if index is not None:
+                duration_sec = index.duration_sec
+                file_size_bytes = index.size_bytes
+            else:
+                # 動画の尺を取得
+                duration_sec = MyFfmpegHelper.get_duration_sec(input_video)
+                # 動画のファイルサイズを取得
+                file_size_bytes = MyFfmpegHelper.get_size_bytes(input_video)
 
             # 分割したいファイルサイズにおける尺を計算
             ratio = split_size_bytes / file_size_bytes
@@ -158,6 +361,144 @@ class MyFfmpegHelper:
         except Exception:
             raise
 
+    @staticmethod
+    def build_keyframe_index(
+        input_video: str,
+        logger: logging.Logger = logging.getLogger(__name__),
+    ) -> KeyframeIndex:
+        """
+        ffprobeを1回だけ実行し、動画のキーフレームの秒数とバイト位置、動画の長さを取得する。
+        全ストリームのパケットサイズを累積し、各キーフレームより前のバイト数も記録する。
+        出力は1行ずつ読み込むため、長い動画でも出力全体をメモリに保持しない。
+
+        Args:
+            input_video (str): 入力動画ファイルのパス。
+
+        Returns:
+            KeyframeIndex: キーフレームのインデックス。
+
+        Raises:
+            Exception: ffprobeの実行中にエラーが発生した場合。
+        """
+        logger.info("MyFfmpegHelper.build_keyframe_index")
+
+        cmd = MyFfmpegHelper.build_keyframe_index_command(input_video)
+        parser = KeyframeIndexParser(MyFfmpegHelper.get_size_bytes(input_video))
+        for line in MyFfmpegHelper._iter_ffprobe_lines(cmd):
+            parser.feed(line)
+
+        index = parser.finish()
+        logger.info(
+            f"keyframes = {len(index.times)}, duration = {index.duration_sec}, packet_bytes = {index.packet_bytes}"
+        )
+        return index
+
+    @staticmethod
+    def build_keyframe_index_command(input_video: str) -> list[str]:
+        """キーフレームインデックスを作成するためのffprobeコマンドを作成する。"""
+        return [
+            "ffprobe",
+            "-v",
+            "error",
+            "-show_entries",
+            "packet=stream_index,codec_type,pts_time,dts_time,size,flags:format=duration",
+            "-of",
+            "compact",
+            input_video,
+        ]
+
+    @staticmethod
+    def _iter_ffprobe_lines(cmd: list[str]) -> Iterator[str]:
+        """
+        ffprobeを実行し、標準出力を1行ずつ返す（空行は除く）。
+        出力全体をメモリに保持しないため、長い動画でもメモリ使用量は一定。
+        呼び出し側が途中で読むのをやめた場合（ジェネレーターを閉じた場合）は、残りを読まずにffprobeを終了させる。
+
+        Args:
+            cmd (list[str]): ffprobeのコマンド。
+
+        Yields:
+            str: 前後の空白を除いた出力の1行。
+
+        Raises:
+            Exception: 最後まで読んだ時点でffprobeがエラー終了していた場合。
+        """
+        process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        )
+        finished = False
+        try:
+            assert process.stdout is not None
+            for line in process.stdout:
+                line = line.strip()
+                if line:
+                    yield line
+            finished = True
+        finally:
+            if not finished and process.poll() is None:
+                # 必要な情報は読み終えたため、残りの解析はさせない
+                process.kill()
+            if process.stdout is not None:
+                process.stdout.close()
+            returncode = process.wait()
+
+        if returncode != 0:
+            raise Exception(
+                f"ffprobeの実行に失敗しました (returncode={returncode}): {cmd[-1]}"
+            )
+
+    @staticmethod
+    def iter_keyframes(
+        input_video: str,
+        start_sec: float | None = None,
+        read_duration: float | None = None,
+    ) -> Iterator[float]:
+        """
+        指定された動画のキーフレームの秒数を、ffprobeの出力を読み進めながら順に返す。
+        呼び出し側がイテレーションをやめた時点でffprobeは終了する。
+
+        Args:
+            input_video (str): 入力動画ファイルのパス。
+            start_sec (float, optional): 読み込みを開始する秒数。Noneの場合は先頭から。Defaults to None.
+            read_duration (float, optional): 読み込む秒数。Noneの場合は最後まで。Defaults to None.
+
+        Yields:
+            float: キーフレームの秒数。
+
+        Raises:
+            Exception: ffprobeの実行中にエラーが発生した場合。
+        """
+        cmd = [
+            "ffprobe",
+            "-v",
+            "error",
+            "-skip_frame",
+            "nokey",
+            "-select_streams",
+            "v:0",
+            "-show_entries",
+            "frame=pkt_dts_time",
+            "-of",
+            "csv=p=0",
+        ]
+        if start_sec is not None or read_duration is not None:
+            interval = f"{start_sec or 0}%"
+            if read_duration is not None:
+                interval += f"+{read_duration}"
+            cmd.extend(["-read_intervals", interval])
+        cmd.append(input_video)
+
+        for line in MyFfmpegHelper._iter_ffprobe_lines(cmd):
+            # カンマで分割したトークンのうち、数値に変換できるもの（N/A以外）を返す
+            for token in line.split(","):
+                time_sec = parse_float(token.strip())
+                if time_sec is not None:
+                    yield time_sec
+
     @staticmethod
     def get_keyframes(
         input_video: str,
@@ -178,62 +519,62 @@ class MyFfmpegHelper:
         Raises:
             Exception: ffprobeの実行中にエラーが発生した場合。
         """
-        try:
-            logger.info("MyFfmpegHelper.get_keyframes")
-
-            cmd = [
-                "ffprobe",
-                "-v",
-                "error",
-                "-skip_frame",
-                "nokey",
-                "-select_streams",
-                "v:0",
-                "-show_entries",
-                "frame=pkt_dts_time",
-                "-of",
-                "csv=p=0",
-            ]
-
-            # キーフレーム調査を行う秒数が指定してあれば、
-            # 指定秒数＋手前の幅分読み込む設定にする
-            if split_time_sec is not None:
-                start_time = max(0, split_time_sec - read_duration)
-                cmd.extend(["-read_intervals", f"{start_time}%+{read_duration}"])
-
-            cmd.append(input_video)
-
-            output = subprocess.check_output(cmd, stderr=subprocess.DEVNULL).decode(
-                "utf-8"
+        logger.info("MyFfmpegHelper.get_keyframes")
+
+        # キーフレーム調査を行う秒数が指定してあれば、
+        # 指定秒数＋手前の幅分読み込む設定にする
+        if split_time_sec is not None:
+            start_time = max(0, split_time_sec - read_duration)
+            keyframe_times = list(
+                MyFfmpegHelper.iter_keyframes(input_video, start_time, read_duration)
             )
+        else:
+            keyframe_times = list(MyFfmpegHelper.iter_keyframes(input_video))
 
-            logger.info(f"output = {output}")
+        logger.debug(f"keyframes = {len(keyframe_times)}")
+        return keyframe_times
 
-            # FFmpeg出力を行ごとに処理
-            # カンマで分割したトークンを前後の空白を落とす
-            # 空文字は弾いてリスト化
-            tokens = [
-                token.strip()
-                for line in output.strip().splitlines()
-                for token in line.split(",")
-                if token.strip()
-            ]
-            # トークンがN/Aのものは要素削除
-            if tokens and tokens[-1].upper() == "N/A":
-                tokens.pop()
-            # 残った正常なトークンをfloatに変換
-            keyframe_times = [float(token) for token in tokens]
+    @staticmethod
+    def find_keyframe_before(
+        input_video: str,
+        target_sec: float,
+        read_duration: float = 10,
+    ) -> float | None:
+        """
+        指定された秒数以前で最も近いキーフレームの秒数を取得する。
+        target_sec の read_duration 秒手前から読み始め、target_sec を過ぎたキーフレームが
+        見つかった時点で読み込みをやめてffprobeを終了する。
 
-            return keyframe_times
+        Args:
+            input_video (str): 入力動画ファイルのパス。
+            target_sec (float): 基準の秒数。
+            read_duration (float): 基準の秒数より手前に読み込む秒数。デフォルトは10秒。
 
-        except Exception:
-            raise
+        Returns:
+            float | None: キーフレームの秒数。読み込んだ範囲に見つからない場合はNone。
+
+        Raises:
+            Exception: ffprobeの実行中にエラーが発生した場合。
+        """
+        keyframe_before = None
+        keyframes = MyFfmpegHelper.iter_keyframes(
+            input_video, max(0, target_sec - read_duration)
+        )
+        try:
+            for keyframe in keyframes:
+                if keyframe > target_sec:
+                    break
+                keyframe_before = keyframe
+        finally:
+            keyframes.close()
+        return keyframe_before
 
     @staticmethod
     def get_split_keyframe_sec(
         input_video: str,
         split_sec: float,
         logger: logging.Logger = logging.getLogger(__name__),
+        index: KeyframeIndex | None = None,
     ) -> float:
         """
         指定された秒数 `split_sec` の直前のキーフレームの秒数を取得します。
@@ -241,6 +582,8 @@ class MyFfmpegHelper:
         Args:
             input_video (str): 入力動画ファイルのパス。
             split_sec (float): 分割したい秒数。
+            index (KeyframeIndex, optional): 作成済みのキーフレームインデックス。
+                指定した場合はffprobeを実行せずにインデックスから求める。Defaults to None.
 
         Returns:
             float: 指定された秒数 `split_sec` の直前のキーフレームの秒数。
@@ -251,23 +594,29 @@ class MyFfmpegHelper:
         try:
             logger.info("MyFfmpegHelper.get_split_keyframe_sec")
 
-            # 分割したい秒数より直前のキーフレームリストを取得する
-            keyframes = MyFfmpegHelper.get_keyframes(input_video, split_sec, 10)
+            if index is not None:
+                return index.keyframe_before(split_sec)
 
-            for keyframe in keyframes:
-                logger.info(f"keyframe = {keyframe}")
+            # 分割したい秒数の直前のキーフレームを、分割したい秒数を過ぎるまで読んで探す
+            keyframe = MyFfmpegHelper.find_keyframe_before(input_video, split_sec, 10)
 
-            # split_secに最も近いキーフレームを探す
-            closest_keyframe_sec = min(keyframes, key=lambda x: abs(x - split_sec))
+            # 読み込んだ範囲にキーフレームがない場合は、動画全体のインデックスから探す
+            if keyframe is None:
+                logger.info("読み込み範囲にキーフレームがないため、インデックスから探します。")
+                index = MyFfmpegHelper.build_keyframe_index(input_video, logger=logger)
+                return index.keyframe_before(split_sec)
 
-            return closest_keyframe_sec
+            logger.info(f"keyframe = {keyframe}")
+            return keyframe
 
         except Exception:
             raise
 
     @staticmethod
     def get_split_points_by_size(
-        input_video: str, split_size_bytes: int = 5 * 1024**3
+        input_video: str,
+        split_size_bytes: int = 5 * 1024**3,
+        index: KeyframeIndex | None = None,
     ) -> list[float]:
         """
         動画を指定されたサイズで分割するための分割点を計算します。
@@ -275,6 +624,7 @@ class MyFfmpegHelper:
         Args:
             input_video (str): 入力動画ファイルのパス。
             split_size_bytes (int): 分割後のファイルの目標サイズ（バイト単位）。デフォルトは5GiB。
+            index (KeyframeIndex, optional): 作成済みのキーフレームインデックス。Defaults to None.
 
         Returns:
             list[float]: 分割点の秒数のリスト。
@@ -283,9 +633,14 @@ class MyFfmpegHelper:
             Exception: 動画の長さの取得中にエラーが発生した場合。
         """
         # 動画の尺を取得
-        duration = MyFfmpegHelper.get_duration_sec(input_video)
+        if index is not None:
+            duration = index.duration_sec
+        else:
+            duration = MyFfmpegHelper.get_duration_sec(input_video)
         # 指定のファイルサイズにおける尺を取得
-        split_sec = MyFfmpegHelper.get_split_sec_by_size(input_video, split_size_bytes)
+        split_sec = MyFfmpegHelper.get_split_sec_by_size(
+            input_video, split_size_bytes, index=index
+        )
         return [i * split_sec for i in range(1, math.ceil(duration / split_sec))]
 
     @staticmethod
@@ -293,13 +648,23 @@ class MyFfmpegHelper:
         input_video: str,
         split_size_bytes: int = 5 * 1024**3,
         logger: logging.Logger = logging.getLogger(__name__),
+        index: KeyframeIndex | None = None,
+        media_info: MediaInfo | None = None,
     ) -> list[float]:
         """
         動画を指定されたサイズで分割するためのキーフレーム分割点を計算します。
+        ffprobeはキーフレームインデックスの作成で1回だけ実行し、分割点の数によらず
+        すべての分割点をインデックスから求めます。
+        パケットの累積バイト数から、各パートがサイズ上限を超えない最後のキーフレームを選ぶため、
+        ビットレートが一定でない動画でもパート数が最小になります。
 
         Args:
             input_video (str): 入力動画ファイルのパス。
             split_size_bytes (int): 分割後のファイルの目標サイズ（バイト単位）。デフォルトは5GiB。
+            index (KeyframeIndex, optional): 作成済みのキーフレームインデックス。
+                Noneの場合はここで作成する。Defaults to None.
+            media_info (MediaInfo, optional): 取得済みの情報。index がNoneの場合は、
+                このキーフレームインデックスを使う（なければ作成して保存する）。Defaults to None.
 
         Returns:
             list[float]: 分割点の秒数のリスト。各分割点は、指定されたサイズに最も近いキーフレームに基づいています。
@@ -307,21 +672,36 @@ class MyFfmpegHelper:
         Raises:
             Exception: 動画の長さの取得中にエラーが発生した場合、またはキーフレームの取得中にエラーが発生した場合。
         """
+        if index is None:
+            index = MyFfmpegHelper._get_keyframe_index(
+                input_video, media_info, logger=logger
+            )
+
+        # パケットサイズが取れていれば、実際のバイト数から分割点を決める
+        if index.has_byte_offsets:
+            keyframes = index.split_points_by_bytes(split_size_bytes, logger=logger)
+            for keyframe in keyframes:
+                logger.info(f"split_point = {keyframe}")
+            return keyframes
+
+        # 取れない場合は平均ビットレートから分割点を見積もる
         # 動画を指定のサイズで分割する際の秒数リストを取得
         split_points = MyFfmpegHelper.get_split_points_by_size(
-            input_video, split_size_bytes
+            input_video, split_size_bytes, index=index
         )
 
         for split_point in split_points:
             logger.info(f"split_point = {split_point}")
 
         # 分割する秒数リストから、それぞれ一番手前のキーフレームの秒数に変換
-        for i, split_point in enumerate(split_points):
-            split_points[i] = MyFfmpegHelper.get_split_keyframe_sec(
-                input_video, split_point, logger=logger
-            )
+        # （同じキーフレームや先頭に重なった分割点は除く）
+        keyframes: list[float] = []
+        for split_point in split_points:
+            keyframe = index.keyframe_before(split_point)
+            if keyframe > 0.0 and (not keyframes or keyframe > keyframes[-1]):
+                keyframes.append(keyframe)
 
-        return split_points
+        return keyframes
 
     @staticmethod
     def sample_get_keyframes(input_video: str) -> str:
@@ -363,16 +743,20 @@ class MyFfmpegHelper:
             raise
 
     @staticmethod
-    def is_video(file_path: str) -> bool:
+    def is_video(file_path: str, media_info: MediaInfo | None = None) -> bool:
         """
         指定されたファイルが動画ファイルかどうかを判定します。
+        カバー画像（attached_pic）だけを含む音声ファイルは動画として扱いません。
 
         Args:
             file_path (str): 判定するファイルのパス。
+            media_info (MediaInfo, optional): 取得済みの情報。指定した場合はffprobeを実行しない。
 
         Returns:
             bool: 動画ファイルの場合はTrue、そうでない場合はFalse。
         """
+        if media_info is not None:
+            return media_info.is_video
         try:
             result = subprocess.run(
                 [
@@ -380,7 +764,8 @@ class MyFfmpegHelper:
                     "-v",
                     "error",
                     "-select_streams",
-                    "v:0",
+                    # "V" はカバー画像（attached_pic）を除いた映像ストリーム
+                    "V:0",
                     "-show_entries",
                     "stream=codec_type",
                     "-of",
@@ -401,6 +786,9 @@ class MyFfmpegHelper:
         output_dir: str | None = None,
         split_size_bytes: int = 5 * 1024**3,
         logger: logging.Logger = logging.getLogger(__name__),
+        mode: Literal["segment", "per_part"] = "segment",
+        media_info: MediaInfo | None = None,
+        progress: ProgressMonitor | None = None,
     ) -> list[str]:
         """
         無劣化で動画をキーフレーム単位に分割する。
@@ -409,6 +797,10 @@ class MyFfmpegHelper:
             input_video (str): 入力動画のパス。
             output_dir (str): 分割後の動画を保存するディレクトリ。
             split_size_bytes (int): 各分割ファイルの目標サイズ（バイト）。デフォルトは5GiB。
+            mode (str): "segment" はsegmentマルチプレクサで入力を1回だけ読んで全パートを切り出す。
+                "per_part" はパートごとにffmpegを起動して切り出す。デフォルトは "segment"。
+            media_info (MediaInfo, optional): 取得済みの情報。キーフレームインデックスがあればffprobeを実行しない。
+            progress (ProgressMonitor, optional): ffmpegの進捗を監視する場合に指定する。Defaults to None.
 
         Returns:
             list[str]: 作成されたファイルパスのリスト。
@@ -416,74 +808,405 @@ class MyFfmpegHelper:
         Raises:
             Exception: 分割中にエラーが発生した場合。
         """
-        try:
-            logger.info("MyFfmpegHelper.split_video_lossless_by_keyframes")
-            logger.info(f"input_video =  {input_video}")
+        return list(
+            MyFfmpegHelper.iter_split_video_lossless_by_keyframes(
+                input_video,
+                output_dir,
+                split_size_bytes,
+                logger=logger,
+                mode=mode,
+                media_info=media_info,
+                progress=progress,
+            )
+        )
 
-            if output_dir is None:
-                output_dir = os.path.dirname(input_video)
+    @staticmethod
+    def iter_split_video_lossless_by_keyframes(
+        input_video: str,
+        output_dir: str | None = None,
+        split_size_bytes: int = 5 * 1024**3,
+        logger: logging.Logger = logging.getLogger(__name__),
+        mode: Literal["segment", "per_part"] = "segment",
+        media_info: MediaInfo | None = None,
+        progress: ProgressMonitor | None = None,
+        cancel: threading.Event | None = None,
+    ) -> Iterator[str]:
+        """
+        無劣化で動画をキーフレーム単位に分割し、各パートの切り出しが終わるたびにそのパスを返す。
+        呼び出し側は次のパートの切り出しを待たずに、完成したパートを処理（アップロードなど）できる。
+
+        Args:
+            input_video (str): 入力動画のパス。
+            output_dir (str): 分割後の動画を保存するディレクトリ。
+            split_size_bytes (int): 各分割ファイルの目標サイズ（バイト）。デフォルトは5GiB。
+            mode (str): "segment" はsegmentマルチプレクサで入力を1回だけ読んで全パートを切り出す。
+                "per_part" はパートごとにffmpegを起動して切り出す（次のパートは呼び出し側が
+                値を受け取るまで切り出さないため、ディスク使用量を抑えられる）。デフォルトは "segment"。
+            media_info (MediaInfo, optional): 取得済みの情報。キーフレームインデックスがあればffprobeを実行せず、
+                なければ作成してキャッシュに保存する。
+            progress (ProgressMonitor, optional): ffmpegの進捗を監視する場合に指定する。Defaults to None.
+            cancel (threading.Event, optional): 別のスレッドから分割を中止する場合に指定する。
+                設定されると実行中のffmpegを強制終了し、例外を送出する。Defaults to None.
+
+        Yields:
+            str: 切り出しが完了したファイルのパス（パート順）。
 
-            logger.info(f"output_dir = {output_dir}")
+        Raises:
+            Exception: 分割中にエラーが発生した場合。
+        """
+        logger.info("MyFfmpegHelper.iter_split_video_lossless_by_keyframes")
+        logger.info(f"input_video =  {input_video}")
 
-            os.makedirs(output_dir, exist_ok=True)
+        if output_dir is None:
+            output_dir = os.path.dirname(input_video)
 
-            duration = MyFfmpegHelper.get_duration_sec(input_video)
+        logger.info(f"output_dir = {output_dir}")
 
-            logger.info(f"dulation = {duration}")
+        os.makedirs(output_dir, exist_ok=True)
 
-            keyframes = MyFfmpegHelper.get_split_keyframe_sec_by_size(
-                input_video, split_size_bytes, logger=logger
+        # キーフレームインデックスを1回だけ作成し、長さと分割点をそこから求める
+        index = MyFfmpegHelper._get_keyframe_index(input_video, media_info, logger=logger)
+        duration = index.duration_sec
+
+        logger.info(f"dulation = {duration}")
+
+        keyframes = MyFfmpegHelper.get_split_keyframe_sec_by_size(
+            input_video, split_size_bytes, logger=logger, index=index
+        )
+
+        for keyframe in keyframes:
+            logger.info(f"keyframe = {keyframe}")
+
+        # 元のファイル名を取得
+        base_name = os.path.splitext(os.path.basename(input_video))[0]
+
+        if mode == "segment" and keyframes:
+            yield from MyFfmpegHelper._iter_split_by_segment_muxer(
+                input_video, output_dir, base_name, keyframes, progress, duration, cancel
             )
+            return
+
+        # 分割数分だけ分割する
+        for output_file, start, end in MyFfmpegHelper.plan_split_parts(
+            output_dir, base_name, keyframes, duration
+        ):
+            cmd = MyFfmpegHelper.build_cut_command(input_video, start, end, output_file)
+            try:
+                if progress is not None:
+                    progress.run(cmd, duration_sec=end - start, cancel=cancel)
+                else:
+                    MyFfmpegHelper._run_cancellable(cmd, cancel)
+            except BaseException:
+                # 途中まで書き込まれたパートを残さない
+                if os.path.exists(output_file):
+                    os.remove(output_file)
+                raise
+            yield output_file
 
-            for keyframe in keyframes:
-                logger.info(f"keyframe = {keyframe}")
-
-            # 開始点と終了点を追加（分割に活用）
-            keyframes = [0.0] + keyframes + [duration]
-
-            output_files = []
-            # 元のファイル名を取得
-            base_name = os.path.splitext(os.path.basename(input_video))[0]
-            # 分割数分だけ分割する
-            for i in range(len(keyframes) - 1):
-                start = keyframes[i]
-                end = keyframes[i + 1]
-                output_file = os.path.join(output_dir, f"{base_name}_part{i + 1}.mp4")
-
-                cmd = [
-                    "ffmpeg",
-                    "-ss",
-                    str(start),
-                    "-to",
-                    str(end),
-                    "-i",
-                    input_video,
-                    "-c",
-                    "copy",
-                    output_file,
-                ]
-                subprocess.run(
-                    cmd,
-                    check=True,
-                    stdout=subprocess.DEVNULL,
-                    stderr=subprocess.DEVNULL,
-                )
-                output_files.append(output_file)
+    @staticmethod
+    def _run_cancellable(cmd: list[str], cancel: threading.Event | None = None):
+        # subprocess.run と同じく終了を待つが、cancel が設定されたら強制終了する
+        with subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        ) as process:
+            with kill_when_cancelled(process, cancel):
+                returncode = process.wait()
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, cmd)
 
-            return output_files
+    @staticmethod
+    def plan_split_parts(
+        output_dir: str, base_name: str, keyframes: list[float], duration_sec: float
+    ) -> list[tuple[str, float, float]]:
+        """
+        パートごとに切り出す場合の、出力ファイルのパスと切り出す範囲を返す。
 
-        except Exception:
+        Args:
+            output_dir (str): 分割後の動画を保存するディレクトリ。
+            base_name (str): 出力ファイル名の元になる名前（拡張子なし）。
+            keyframes (list[float]): 分割点のキーフレームの秒数（先頭の0秒は含まない）。
+            duration_sec (float): 動画の長さ（秒）。
+
+        Returns:
+            list[tuple[str, float, float]]: (出力ファイルのパス, 開始秒, 終了秒) のリスト（パート順）。
+        """
+        # 開始点と終了点を追加（分割に活用）
+        points = [0.0] + keyframes + [duration_sec]
+        return [
+            (
+                os.path.join(output_dir, f"{base_name}_part{i + 1}.mp4"),
+                points[i],
+                points[i + 1],
+            )
+            for i in range(len(points) - 1)
+        ]
+
+    @staticmethod
+    def segment_output_pattern(output_dir: str, base_name: str) -> str:
+        """segmentマルチプレクサに渡す出力ファイル名のパターンを返す。"""
+        # ファイル名の % はパターンとして解釈されるためエスケープする
+        return os.path.join(output_dir, f"{base_name.replace('%', '%%')}_part%d.mp4")
+
+    @staticmethod
+    def segment_output_path(output_dir: str, name: str) -> str:
+        """segmentマルチプレクサが出力したファイル名を、出力ディレクトリのパスに変換する。"""
+        return name if os.path.isabs(name) else os.path.join(output_dir, name)
+
+    @staticmethod
+    def remove_segment_outputs(
+        output_dir: str, base_name: str, part_count: int, keep: Iterable[str] = ()
+    ):
+        """
+        segmentマルチプレクサが書き出したパートのうち、keep に含まれないものを削除する。
+
+        Args:
+            output_dir (str): 分割後の動画を保存するディレクトリ。
+            base_name (str): 出力ファイル名の元になる名前（拡張子なし）。
+            part_count (int): 分割するパートの数。
+            keep (Iterable[str]): 削除しないパートのパス。
+        """
+        keep = set(keep)
+        for i in range(1, part_count + 1):
+            path = os.path.join(output_dir, f"{base_name}_part{i}.mp4")
+            if path not in keep and os.path.exists(path):
+                os.remove(path)
+
+    @staticmethod
+    def build_cut_command(
+        input_video: str, start: float, end: float, output_file: str
+    ) -> list[str]:
+        """start秒からend秒までを無劣化で切り出すffmpegコマンドを作成する。"""
+        return [
+            "ffmpeg",
+            "-ss",
+            str(start),
+            "-to",
+            str(end),
+            "-i",
+            input_video,
+            "-c",
+            "copy",
+            output_file,
+        ]
+
+    @staticmethod
+    def build_segment_split_command(
+        input_video: str, output_pattern: str, keyframes: list[float]
+    ) -> list[str]:
+        """
+        segmentマルチプレクサで、指定したキーフレームの位置で無劣化分割するffmpegコマンドを作成する。
+        完成したパートのファイル名は、1つ完成するごとに標準出力へ1行ずつ出力される。
+
+        Args:
+            input_video (str): 入力動画のパス。
+            output_pattern (str): 出力ファイル名のパターン（パート番号の位置に %d）。
+            keyframes (list[float]): 分割点のキーフレームの秒数（先頭の0秒は含まない）。
+
+        Returns:
+            list[str]: ffmpegのコマンド。
+        """
+        # segmentマルチプレクサは指定時刻「以降」の最初のキーフレームで切るため、
+        # 秒数の丸め誤差で次のキーフレームまで伸びないよう少し手前を指定する
+        segment_times = ",".join(f"{max(0.0, k - 0.001):.6f}" for k in keyframes)
+        return [
+            "ffmpeg",
+            "-v",
+            "error",
+            "-i",
+            input_video,
+            "-c",
+            "copy",
+            "-f",
+            "segment",
+            "-segment_format",
+            "mp4",
+            "-segment_times",
+            segment_times,
+            "-reset_timestamps",
+            "1",
+            "-segment_start_number",
+            "1",
+            "-segment_list",
+            "pipe:1",
+            "-segment_list_type",
+            "flat",
+            output_pattern,
+        ]
+
+    @staticmethod
+    def _iter_split_by_segment_muxer(
+        input_video: str,
+        output_dir: str,
+        base_name: str,
+        keyframes: list[float],
+        progress: ProgressMonitor | None = None,
+        duration_sec: float | None = None,
+        cancel: threading.Event | None = None,
+    ) -> Iterator[str]:
+        output_pattern = MyFfmpegHelper.segment_output_pattern(output_dir, base_name)
+        cmd = MyFfmpegHelper.build_segment_split_command(
+            input_video, output_pattern, keyframes
+        )
+        # 呼び出し側に渡したパート（以降は呼び出し側が管理するため、失敗しても削除しない）
+        handed: set[str] = set()
+        try:
+            if progress is not None:
+                lines = progress.iter_stdout(
+                    cmd, duration_sec=duration_sec, cancel=cancel
+                )
+                try:
+                    for name in lines:
+                        path = MyFfmpegHelper.segment_output_path(output_dir, name)
+                        handed.add(path)
+                        yield path
+                finally:
+                    # 途中で終了した場合は、ffmpegを終了させてから後片付けする
+                    lines.close()
+                return
+
+            process = subprocess.Popen(
+                cmd,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+            )
+            finished = False
+            try:
+                assert process.stdout is not None
+                with kill_when_cancelled(process, cancel):
+                    for line in process.stdout:
+                        name = line.strip()
+                        if not name:
+                            continue
+                        path = MyFfmpegHelper.segment_output_path(output_dir, name)
+                        handed.add(path)
+                        yield path
+                finished = True
+            finally:
+                if not finished and process.poll() is None:
+                    # 呼び出し側が途中で読むのをやめた場合は、残りのパートを書き出させない
+                    process.kill()
+                returncode = process.wait()
+
+            if returncode != 0:
+                raise subprocess.CalledProcessError(returncode, cmd)
+        except BaseException:
+            # 書き出し済み・書き出し中で、呼び出し側に渡していないパートを残さない
+            MyFfmpegHelper.remove_segment_outputs(
+                output_dir, base_name, len(keyframes) + 1, keep=handed
+            )
             raise
 
     @staticmethod
-    def is_vbr(input_video: str, sample_duration: int = 10) -> bool:
+    def _sample_packet_sizes(
+        input_video: str, start_sec: float, window_sec: float
+    ) -> np.ndarray:
+        # 指定区間の映像パケットのサイズを読み込む
+        cmd = [
+            "ffprobe",
+            "-v",
+            "error",
+            "-select_streams",
+            "v:0",
+            "-show_entries",
+            "packet=size",
+            "-of",
+            "csv=p=0",
+            "-read_intervals",
+            f"{start_sec:.3f}%+{window_sec}",
+            input_video,
+        ]
+        output = subprocess.check_output(cmd, stderr=subprocess.DEVNULL)
+        if not output.strip():
+            return np.empty(0, dtype=np.int64)
+        return np.array(output.split(), dtype=np.int64)
+
+    @staticmethod
+    def get_bitrate_profile(
+        input_video: str,
+        windows: int = 8,
+        window_sec: float = 10,
+        max_workers: int = 4,
+        media_info: MediaInfo | None = None,
+    ) -> BitrateProfile:
+        """
+        動画全体に均等に分散させた複数の区間のパケットサイズを並列に読み込み、
+        区間ごとのビットレートを計測する。
+
+        Args:
+            input_video (str): 動画ファイルのパス。
+            windows (int): 計測する区間の数。デフォルトは8。
+            window_sec (float): 1区間の長さ（秒）。デフォルトは10秒。
+            max_workers (int): 同時に実行するffprobeの数。デフォルトは4。
+            media_info (MediaInfo, optional): 取得済みの情報。指定した場合は長さの取得にffprobeを実行しない。
+
+        Returns:
+            BitrateProfile: 区間ごとのビットレート。
+
+        Raises:
+            Exception: ffprobeの実行中にエラーが発生した場合。
+        """
+        duration = MyFfmpegHelper.get_duration_sec(input_video, media_info=media_info)
+
+        # 区間を動画全体に均等に配置する（短い動画では区間が重ならないように数を減らす）
+        windows = max(1, min(windows, math.ceil(duration / window_sec) if duration else 1))
+        if duration > window_sec:
+            starts = (duration - window_sec) * (np.arange(windows) + 0.5) / windows
+        else:
+            starts = np.zeros(1)
+        durations = np.minimum(window_sec, np.maximum(duration - starts, 0.0))
+
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                samples = list(
+                    executor.map(
+                        lambda start: MyFfmpegHelper._sample_packet_sizes(
+                            input_video, float(start), window_sec
+                        ),
+                        starts,
+                    )
+                )
+        except Exception as e:
+            raise Exception(f"エラーが発生しました: {e}")
+
+        window_bytes = np.array([sample.sum() for sample in samples], dtype=np.float64)
+        bitrates = np.divide(
+            window_bytes * 8,
+            durations,
+            out=np.zeros_like(window_bytes),
+            where=durations > 0,
+        )
+        packets = np.concatenate(samples) if samples else np.empty(0)
+
+        return BitrateProfile(
+            duration_sec=duration,
+            starts=starts,
+            durations=durations,
+            bitrates=bitrates,
+            packet_mean=float(packets.mean()) if packets.size else 0.0,
+            packet_std=float(packets.std()) if packets.size else 0.0,
+        )
+
+    @staticmethod
+    def is_vbr(
+        input_video: str,
+        sample_duration: int = 10,
+        windows: int = 8,
+        media_info: MediaInfo | None = None,
+    ) -> bool:
         """
         動画がVBR（可変ビットレート）かどうかを大まかに判定する。
-        指定された秒数分のパケットサイズをサンプリングし、そのばらつきから判断する。
+        動画全体に分散させた複数の区間のパケットサイズをサンプリングし、そのばらつきから判断する。
 
         Args:
             input_video (str): 動画ファイルのパス。
-            sample_duration (int): 分析する動画の先頭からの秒数。デフォルトは10秒。
+            sample_duration (int): 1区間あたりの分析する秒数。デフォルトは10秒。
+            windows (int): 分析する区間の数。デフォルトは8。
+            media_info (MediaInfo, optional): 取得済みの情報。Defaults to None.
 
         Returns:
             bool: VBRと判定された場合はTrue、CBRと判定された場合はFalse。
@@ -491,58 +1214,311 @@ class MyFfmpegHelper:
         Raises:
             Exception: ffprobeの実行中にエラーが発生した場合。
         """
-        try:
-            cmd = [
-                "ffprobe",
-                "-v",
-                "error",
-                "-select_streams",
-                "v:0",
-                "-show_entries",
-                "packet=size",
-                "-of",
-                "csv=p=0",
-                "-read_intervals",
-                f"%+{sample_duration}",
-                input_video,
-            ]
+        profile = MyFfmpegHelper.get_bitrate_profile(
+            input_video,
+            windows=windows,
+            window_sec=sample_duration,
+            media_info=media_info,
+        )
 
-            output = (
-                subprocess.check_output(cmd, stderr=subprocess.DEVNULL)
-                .decode("utf-8")
-                .strip()
-            )
+        # パケット情報が取得できない場合は、判定不能としてCBRとみなす
+        if profile.packet_mean <= 0:
+            return False
+
+        # パケットサイズの標準偏差が平均値の10%を超える場合、または区間ごとの
+        # ビットレートが10%を超えてばらつく場合はVBRと判定
+        # この閾値は経験的なもので、調整が必要な場合がある
+        return profile.packet_cv > 0.1 or profile.bitrate_cv > 0.1
+
+    @staticmethod
+    def build_transcode_command(
+        input_path: str,
+        output_path: str,
+        profile: TranscodeProfile,
+        start_sec: float | None = None,
+        duration_sec: float | None = None,
+    ) -> list[str]:
+        """
+        プロファイルの設定で再エンコードするffmpegコマンドを作成する。
+
+        Args:
+            input_path (str): 入力ファイルのパス。
+            output_path (str): 出力ファイルのパス。
+            profile (TranscodeProfile): 再エンコードの設定。
+            start_sec (float | None): 変換を開始する秒数（試し変換用）。
+            duration_sec (float | None): 変換する長さ（秒）（試し変換用）。
+
+        Returns:
+            list[str]: ffmpegのコマンド。
+        """
+        cmd = ["ffmpeg", "-y", "-v", "error"]
+        if start_sec:
+            cmd += ["-ss", f"{start_sec:.3f}"]
+        if duration_sec:
+            cmd += ["-t", f"{duration_sec:.3f}"]
+        cmd += ["-i", input_path]
+
+        if profile.is_audio_only:
+            cmd += ["-vn", "-map", "0:a:0"]
+        else:
+            # カバー画像（attached_pic）ではなく本編の映像を使う
+            cmd += ["-map", "0:V:0", "-map", "0:a:0?", "-c:v", profile.video_codec]
+            if profile.video_bitrate:
+                # 平均ビットレートを目標にしつつ、一時的な増加を1.5倍までに抑える
+                cmd += [
+                    "-b:v",
+                    str(profile.video_bitrate),
+                    "-maxrate",
+                    str(int(profile.video_bitrate * 1.5)),
+                    "-bufsize",
+                    str(profile.video_bitrate * 2),
+                ]
+            if profile.preset:
+                cmd += ["-preset", profile.preset]
+            if profile.max_height:
+                # 元の高さが上限を超える場合のみ縮小する（幅は偶数に揃える）
+                cmd += ["-vf", f"scale=-2:min(ih\\,{profile.max_height})"]
+            cmd += ["-pix_fmt", "yuv420p"]
+
+        cmd += ["-c:a", profile.audio_codec, "-b:a", str(profile.audio_bitrate)]
+        if profile.audio_channels:
+            cmd += ["-ac", str(profile.audio_channels)]
+        cmd += ["-movflags", "+faststart", output_path]
+        return cmd
+
+    @staticmethod
+    def predict_transcode_size(
+        input_path: str,
+        profile: TranscodeProfile,
+        samples: int = 3,
+        sample_sec: float = 10,
+        media_info: MediaInfo | None = None,
+    ) -> int:
+        """
+        ファイル全体に分散させた短い区間を試しに変換し、全体を変換した場合の出力サイズを予測する。
+
+        Args:
+            input_path (str): 入力ファイルのパス。
+            profile (TranscodeProfile): 再エンコードの設定。
+            samples (int): 試し変換する区間の数。デフォルトは3。
+            sample_sec (float): 1区間の長さ（秒）。デフォルトは10秒。
+            media_info (MediaInfo, optional): 取得済みの情報。指定した場合は長さの取得にffprobeを実行しない。
+
+        Returns:
+            int: 予測した出力ファイルのサイズ（バイト）。
 
-            if not output:
-                # パケット情報が取得できない場合は、判定不能としてCBRとみなす
-                return False
+        Raises:
+            Exception: ffmpegの実行中にエラーが発生した場合。
+        """
+        duration = MyFfmpegHelper.get_duration_sec(input_path, media_info=media_info)
+
+        # 区間をファイル全体に均等に配置する（短いファイルでは区間が重ならないように数を減らす）
+        samples = max(1, min(samples, math.ceil(duration / sample_sec) if duration else 1))
+        if duration > sample_sec:
+            starts = (duration - sample_sec) * (np.arange(samples) + 0.5) / samples
+        else:
+            starts = np.zeros(1)
+        durations = np.minimum(sample_sec, np.maximum(duration - starts, 0.0))
+
+        sample_bytes = 0
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for i, (start, length) in enumerate(zip(starts, durations)):
+                sample_path = os.path.join(tmp_dir, f"sample{i}{profile.extension}")
+                cmd = MyFfmpegHelper.build_transcode_command(
+                    input_path, sample_path, profile, float(start), float(length)
+                )
+                try:
+                    subprocess.run(cmd, check=True, capture_output=True, text=True)
+                except subprocess.CalledProcessError as e:
+                    raise Exception(f"試し変換に失敗しました: {e.stderr}") from e
+                sample_bytes += os.path.getsize(sample_path)
+
+        sampled_sec = float(durations.sum())
+        if sampled_sec <= 0:
+            return sample_bytes
+        return int(sample_bytes / sampled_sec * duration)
+
+    @staticmethod
+    def choose_transcode_profile(
+        input_path: str,
+        limit_bytes: int,
+        profiles: Iterable[TranscodeProfile] = DEFAULT_TRANSCODE_PROFILES,
+        upload_bytes_per_sec: float | None = None,
+        safety_margin: float = 0.05,
+        media_info: MediaInfo | None = None,
+        logger: logging.Logger | None = None,
+    ) -> TranscodePlan | None:
+        """
+        上限サイズに収まるプロファイルのうち、最も劣化の少ないものを選ぶ。
+        プロファイルは並び順（劣化の少ない順）に試し変換し、最初に収まったものを返す。
 
-            packet_sizes = [int(s.strip()) for s in output.splitlines()]
+        Args:
+            input_path (str): 入力ファイルのパス。
+            limit_bytes (int): 出力ファイルの上限サイズ（バイト）。
+            profiles (Iterable[TranscodeProfile]): 候補のプロファイル（劣化の少ない順）。
+            upload_bytes_per_sec (float | None): アップロードの速度（バイト/秒）。短縮できる時間の予測に使う。
+            safety_margin (float): 予測したサイズに上乗せする割合。デフォルトは5%。
+            media_info (MediaInfo, optional): 取得済みの情報。Defaults to None.
+            logger (optional): ロガーオブジェクト。Defaults to None.
 
-            if len(packet_sizes) < 2:
-                # パケットが1つ以下の場合は、判定不能としてCBRとみなす
-                return False
+        Returns:
+            TranscodePlan | None: 選んだプロファイルと予測結果。収まるものがない場合はNone。
 
-            # パケットサイズの標準偏差を計算
-            # TODO: これ問題
-            mean = sum(packet_sizes) / len(packet_sizes)
-            variance = sum([((x - mean) ** 2) for x in packet_sizes]) / len(
-                packet_sizes
+        Raises:
+            Exception: ffprobe・ffmpegの実行中にエラーが発生した場合。
+        """
+        if media_info is None:
+            media_info = MyFfmpegHelper.probe(
+                input_path, logger=logger or logging.getLogger(__name__)
+            )
+        input_bytes = MyFfmpegHelper.get_size_bytes(input_path)
+        duration = media_info.duration_sec
+
+        for profile in profiles:
+            # 動画は映像付きのプロファイル、音声は音声専用のプロファイルだけを使う
+            # （カバー画像付きのMP3は音声として扱う）
+            if profile.is_audio_only == media_info.is_video:
+                continue
+            # 目標ビットレートからの概算が明らかに収まらない場合は、試し変換を省く
+            if duration and profile.target_bitrate * duration / 8 > limit_bytes * 1.25:
+                if logger:
+                    logger.info(f"{profile.name}: 目標ビットレートでは上限を超えるため省略します。")
+                continue
+
+            predicted = MyFfmpegHelper.predict_transcode_size(
+                input_path, profile, media_info=media_info
             )
-            std_dev = math.sqrt(variance)
+            plan = TranscodePlan(
+                profile=profile,
+                input_bytes=input_bytes,
+                predicted_bytes=int(predicted * (1 + safety_margin)),
+                limit_bytes=limit_bytes,
+                upload_bytes_per_sec=upload_bytes_per_sec,
+            )
+            if logger:
+                saved_sec = plan.upload_sec_saved
+                logger.info(
+                    f"{profile.name}: predicted = {plan.predicted_bytes} bytes, "
+                    f"saved = {plan.bytes_saved} bytes"
+                    + (f", upload time saved = {saved_sec:.0f}s" if saved_sec is not None else "")
+                )
+            if plan.fits and plan.bytes_saved > 0:
+                return plan
 
-            print("mean = ", mean * 0.1)
-            print("std_dev = ", std_dev)
+        return None
 
-            # 標準偏差が平均値の10%を超える場合はVBRと判定
-            # この閾値は経験的なもので、調整が必要な場合がある
-            if std_dev > mean * 0.1:
-                return True
-            else:
-                return False
+    @staticmethod
+    def transcode(
+        input_path: str,
+        output_path: str,
+        profile: TranscodeProfile,
+        media_info: MediaInfo | None = None,
+        progress: ProgressMonitor | None = None,
+        logger: logging.Logger | None = None,
+    ) -> str:
+        """
+        プロファイルの設定でファイル全体を再エンコードする。
 
-        except Exception as e:
-            raise Exception(f"エラーが発生しました: {e}")
+        Args:
+            input_path (str): 入力ファイルのパス。
+            output_path (str): 出力ファイルのパス。
+            profile (TranscodeProfile): 再エンコードの設定。
+            media_info (MediaInfo, optional): 取得済みの情報。進捗のETAの計算に使う。
+            progress (ProgressMonitor, optional): ffmpegの進捗を監視する場合に指定する。Defaults to None.
+            logger (optional): ロガーオブジェクト。Defaults to None.
+
+        Returns:
+            str: 出力ファイルのパス。
+
+        Raises:
+            Exception: ffmpegの実行中にエラーが発生した場合。
+        """
+        if logger:
+            logger.info(f"{profile.name}で再エンコードしています: {input_path}")
+        cmd = MyFfmpegHelper.build_transcode_command(input_path, output_path, profile)
+        duration = media_info.duration_sec if media_info is not None else None
+        try:
+            MyFfmpegHelper._run_ffmpeg(cmd, progress, duration_sec=duration)
+        except subprocess.CalledProcessError as e:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            raise Exception(f"ffmpegの実行に失敗しました: {e.stderr}") from e
+        return output_path
+
+    @staticmethod
+    def transcode_to_fit(
+        input_path: str,
+        limit_bytes: int,
+        output_dir: str | None = None,
+        profiles: Iterable[TranscodeProfile] = DEFAULT_TRANSCODE_PROFILES,
+        upload_bytes_per_sec: float | None = None,
+        media_info: MediaInfo | None = None,
+        progress: ProgressMonitor | None = None,
+        logger: logging.Logger | None = None,
+    ) -> tuple[str, TranscodePlan] | None:
+        """
+        上限サイズに収まるプロファイルを選んで再エンコードする。
+        予測が外れて上限を超えた場合は、出力を削除してNoneを返す。
+
+        Args:
+            input_path (str): 入力ファイルのパス。
+            limit_bytes (int): 出力ファイルの上限サイズ（バイト）。
+            output_dir (str, optional): 出力先のディレクトリ。Noneの場合は入力と同じディレクトリ。
+            profiles (Iterable[TranscodeProfile]): 候補のプロファイル（劣化の少ない順）。
+            upload_bytes_per_sec (float | None): アップロードの速度（バイト/秒）。
+            media_info (MediaInfo, optional): 取得済みの情報。Defaults to None.
+            progress (ProgressMonitor, optional): ffmpegの進捗を監視する場合に指定する。Defaults to None.
+            logger (optional): ロガーオブジェクト。Defaults to None.
+
+        Returns:
+            tuple[str, TranscodePlan] | None: (出力ファイルのパス, 選んだプロファイルと予測結果)。
+                収まるプロファイルがない場合はNone。
+
+        Raises:
+            Exception: ffprobe・ffmpegの実行中にエラーが発生した場合。
+        """
+        if media_info is None:
+            media_info = MyFfmpegHelper.probe(
+                input_path, logger=logger or logging.getLogger(__name__)
+            )
+        plan = MyFfmpegHelper.choose_transcode_profile(
+            input_path,
+            limit_bytes,
+            profiles=profiles,
+            upload_bytes_per_sec=upload_bytes_per_sec,
+            media_info=media_info,
+            logger=logger,
+        )
+        if plan is None:
+            if logger:
+                logger.info(f"上限サイズに収まるプロファイルがありません: {input_path}")
+            return None
+
+        if output_dir is None:
+            output_dir = os.path.dirname(input_path)
+        base_name = os.path.splitext(os.path.basename(input_path))[0]
+        output_path = os.path.join(
+            output_dir, f"{base_name}_{plan.profile.name}{plan.profile.extension}"
+        )
+        MyFfmpegHelper.transcode(
+            input_path,
+            output_path,
+            plan.profile,
+            media_info=media_info,
+            progress=progress,
+            logger=logger,
+        )
+
+        output_bytes = os.path.getsize(output_path)
+        if output_bytes > limit_bytes:
+            if logger:
+                logger.warning(
+                    f"再エンコード後も上限サイズを超えました: {output_path} "
+                    f"(size: {output_bytes} bytes, predicted: {plan.predicted_bytes} bytes)"
+                )
+            os.remove(output_path)
+            return None
+        return output_path, plan
 
     @staticmethod
     def embed_metadata(
@@ -551,6 +1527,7 @@ class MyFfmpegHelper:
         metadata: FfmpegMetadata,
         cover_path: str | None = None,
         logger: logging.Logger | None = None,
+        progress: ProgressMonitor | None = None,
     ):
         """
         音声ファイルにメタデータと（オプションで）カバー画像を埋め込みます。
@@ -561,6 +1538,7 @@ class MyFfmpegHelper:
             metadata (dict): 埋め込むメタデータ。キーは 'title', 'artist', 'album' など。
             cover_path (str, optional): カバー画像のパス。Defaults to None.
             logger (optional): ロガーオブジェクト。Defaults to None.
+            progress (ProgressMonitor, optional): ffmpegの進捗を監視する場合に指定する。Defaults to None.
 
         Raises:
             Exception: ffmpegの実行中にエラーが発生した場合。
@@ -575,40 +1553,16 @@ class MyFfmpegHelper:
                     log_msg += "を埋め込んでいます..."
                 logger.info(log_msg)
 
-            cmd = ["ffmpeg", "-i", input_path]
-
             if cover_path:
                 normalized_cover_path = MyFfmpegHelper.normalize_cover_image_for_mp3(
-                    cover_path, logger=logger
+                    cover_path, logger=logger, progress=progress
                 )
-                cmd.extend(
-                    [
-                        "-i",
-                        normalized_cover_path,
-                        "-map",
-                        "0:a:0",
-                        "-map",
-                        "1:v:0",
-                        "-c:a",
-                        "copy",
-                        "-c:v",
-                        "mjpeg",
-                        "-id3v2_version",
-                        "3",
-                        "-disposition:v:0",
-                        "attached_pic",
-                    ]
-                )
-            else:
-                cmd.extend(["-c", "copy"])
 
-            for key, value in metadata.items():
-                if value:  # 値が空でない場合のみ追加
-                    cmd.extend(["-metadata", f"{key}={value}"])
-
-            cmd.extend(["-y", output_path])
+            cmd = MyFfmpegHelper.build_embed_metadata_command(
+                input_path, output_path, metadata, normalized_cover_path
+            )
 
-            subprocess.run(cmd, check=True, capture_output=True, text=True)
+            MyFfmpegHelper._run_ffmpeg(cmd, progress)
 
             if logger:
                 logger.info("ffmpeg処理が完了しました。")
@@ -629,3 +1583,212 @@ class MyFfmpegHelper:
         finally:
             if normalized_cover_path and os.path.exists(normalized_cover_path):
                 os.remove(normalized_cover_path)
+
+    @staticmethod
+    def build_embed_metadata_command(
+        input_path: str,
+        output_path: str,
+        metadata: FfmpegMetadata,
+        normalized_cover_path: str | None = None,
+    ) -> list[str]:
+        """
+        メタデータと（オプションで）JPEGに正規化済みのカバー画像を埋め込むffmpegコマンドを作成する。
+
+        Args:
+            input_path (str): 入力ファイルのパス。
+            output_path (str): 出力ファイルのパス。
+            metadata (dict): 埋め込むメタデータ。
+            normalized_cover_path (str, optional): JPEGに正規化済みのカバー画像のパス。Defaults to None.
+
+        Returns:
+            list[str]: ffmpegのコマンド。
+        """
+        cmd = ["ffmpeg", "-i", input_path]
+
+        if normalized_cover_path:
+            cmd.extend(
+                [
+                    "-i",
+                    normalized_cover_path,
+                    "-map",
+                    "0:a:0",
+                    "-map",
+                    "1:v:0",
+                    "-c:a",
+                    "copy",
+                    "-c:v",
+                    "mjpeg",
+                    "-id3v2_version",
+                    "3",
+                    "-disposition:v:0",
+                    "attached_pic",
+                ]
+            )
+        else:
+            cmd.extend(["-c", "copy"])
+
+        for key, value in metadata.items():
+            if value:  # 値が空でない場合のみ追加
+                cmd.extend(["-metadata", f"{key}={value}"])
+
+        cmd.extend(["-y", output_path])
+        return cmd
+
+    @staticmethod
+    def prepare_cover_for_id3(
+        cover_path: str, logger: logging.Logger | None = None
+    ) -> str:
+        """
+        ID3タグ（APIC）にそのまま埋め込める画像のパスを返す。
+        JPEG・PNGはそのまま、それ以外の形式はJPEGに変換したファイルのパスを返す。
+
+        Args:
+            cover_path (str): 元のカバー画像パス。
+            logger (optional): ロガーオブジェクト。Defaults to None.
+
+        Returns:
+            str: 埋め込める画像のパス（変換した場合は呼び出し側で削除する）。
+        """
+        with open(cover_path, "rb") as f:
+            head = f.read(16)
+        if detect_image_mime_type(head) is not None:
+            return cover_path
+        return MyFfmpegHelper.normalize_cover_image_for_mp3(cover_path, logger=logger)
+
+    @staticmethod
+    def tag_audio_in_place(
+        file_path: str,
+        metadata: FfmpegMetadata,
+        cover_path: str | None = None,
+        logger: logging.Logger | None = None,
+    ):
+        """
+        音声ファイルにメタデータと（オプションで）カバー画像を、新しいファイルを作らずに埋め込みます。
+
+        MP3の場合はID3v2タグを直接書き込み、既存のタグの余白に収まればヘッダー領域だけを書き換えます。
+        MP3以外や直接書き込めないタグの場合は、ffmpegで同じディレクトリに書き出してから置き換えます。
+
+        Args:
+            file_path (str): 音声ファイルのパス。
+            metadata (dict): 埋め込むメタデータ。キーは 'title', 'artist', 'album' など。
+            cover_path (str, optional): カバー画像のパス。Defaults to None.
+            logger (optional): ロガーオブジェクト。Defaults to None.
+
+        Raises:
+            Exception: タグの書き込み中にエラーが発生した場合。
+        """
+        if os.path.splitext(file_path)[1].lower() == ".mp3":
+            prepared_cover_path = None
+            try:
+                cover_image = None
+                if cover_path:
+                    prepared_cover_path = MyFfmpegHelper.prepare_cover_for_id3(
+                        cover_path, logger=logger
+                    )
+                    with open(prepared_cover_path, "rb") as f:
+                        cover_image = f.read()
+
+                in_place = write_id3_tags(file_path, metadata, cover_image)
+                if logger:
+                    if in_place:
+                        logger.info("ID3タグをその場で書き換えました。")
+                    else:
+                        logger.info("ID3タグの余白が足りないため、タグを付けて書き直しました。")
+                return
+            except Id3UnsupportedError as e:
+                if logger:
+                    logger.info(f"ID3タグを直接書き込めないため、ffmpegを使用します: {e}")
+            finally:
+                if prepared_cover_path and prepared_cover_path != cover_path:
+                    os.remove(prepared_cover_path)
+
+        # ffmpegで書き出してから置き換える
+        root, ext = os.path.splitext(file_path)
+        tmp_path = f"{root}.tagging{ext}"
+        MyFfmpegHelper.embed_metadata(
+            input_path=file_path,
+            output_path=tmp_path,
+            metadata=metadata,
+            cover_path=cover_path,
+            logger=logger,
+        )
+        os.replace(tmp_path, file_path)
+
+    @staticmethod
+    def embed_metadata_from_stream(
+        chunks: Iterable[bytes],
+        output_path: str,
+        metadata: FfmpegMetadata,
+        cover_path: str | None = None,
+        logger: logging.Logger | None = None,
+    ):
+        """
+        音声データを受け取りながらffmpegの標準入力に流し込み、メタデータと（オプションで）
+        カバー画像を埋め込んだファイルだけを書き出します。
+        ダウンロード中のHTTPレスポンスを渡すと、一時ファイルを作らずにダウンロードと同時にタグ付けが終わります。
+
+        Args:
+            chunks (Iterable[bytes]): 音声データ（HTTPレスポンスの iter_content など）。
+            output_path (str): 出力ファイルのパス。
+            metadata (dict): 埋め込むメタデータ。キーは 'title', 'artist', 'album' など。
+            cover_path (str, optional): カバー画像のパス。Defaults to None.
+            logger (optional): ロガーオブジェクト。Defaults to None.
+
+        Raises:
+            Exception: ffmpegの実行中にエラーが発生した場合。
+        """
+        normalized_cover_path = None
+        try:
+            if logger:
+                logger.info("ffmpegの標準入力に音声を流し込みながらメタデータを埋め込んでいます...")
+
+            if cover_path:
+                normalized_cover_path = MyFfmpegHelper.prepare_cover_for_id3(
+                    cover_path, logger=logger
+                )
+
+            cmd = MyFfmpegHelper.build_embed_metadata_command(
+                "pipe:0", output_path, metadata, normalized_cover_path
+            )
+            # 標準エラー出力はパイプが詰まらないよう一時ファイルに受ける
+            with tempfile.TemporaryFile() as stderr:
+                process = subprocess.Popen(
+                    cmd,
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.DEVNULL,
+                    stderr=stderr,
+                )
+                assert process.stdin is not None
+                try:
+                    for chunk in chunks:
+                        if chunk:
+                            process.stdin.write(chunk)
+                except BrokenPipeError:
+                    # ffmpegが先に終了した（エラー内容は終了コードと標準エラー出力で判定する）
+                    pass
+                finally:
+                    try:
+                        process.stdin.close()
+                    except BrokenPipeError:
+                        pass
+                    returncode = process.wait()
+
+                if returncode != 0:
+                    stderr.seek(0)
+                    message = stderr.read().decode("utf-8", errors="replace")
+                    raise Exception(f"ffmpegの実行に失敗しました: {message}")
+
+            if logger:
+                logger.info("ffmpeg処理が完了しました。")
+
+        except Exception:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            raise
+        finally:
+            if (
+                normalized_cover_path
+                and normalized_cover_path != cover_path
+                and os.path.exists(normalized_cover_path)
+            ):
+                os.remove(normalized_cover_path)
@@ -0,0 +1,108 @@
+import logging
+import os
+
+from .media_info import MediaInfo
+from .my_ffmpeg_helper import MyFfmpegHelper
+from .progress import ProgressMonitor
+
+# Notionにアップロードできるファイルサイズの上限
+NOTION_MAX_FILE_BYTES = 5 * 1024 * 1024 * 1024
+
+
+class OversizedTranscoder:
+    """
+    上限サイズを超えるファイルを、MyFfmpegHelper.transcode_to_fit で収まるように再エンコードする。
+    作成したファイルは cleanup で削除する（with ブロックを抜けるときは、例外の場合も削除する）。
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        limit_bytes: int = NOTION_MAX_FILE_BYTES,
+        upload_bytes_per_sec: float | None = None,
+        logger: logging.Logger = logging.getLogger(__name__),
+    ):
+        """
+        Args:
+            enabled (bool): Falseの場合は再エンコードしない（transcode は常にNoneを返す）。
+            limit_bytes (int): 出力ファイルの上限サイズ（バイト）。デフォルトは5GiB。
+            upload_bytes_per_sec (float | None): アップロードの速度（バイト/秒）。短縮できる時間の予測に使う。
+            logger (logging.Logger): ロガー。
+        """
+        self.enabled = enabled
+        self.limit_bytes = limit_bytes
+        self.upload_bytes_per_sec = upload_bytes_per_sec
+        self.logger = logger
+        self.created_files: list[str] = []
+
+    @classmethod
+    def from_env(
+        cls, logger: logging.Logger = logging.getLogger(__name__)
+    ) -> "OversizedTranscoder":
+        """
+        環境変数から設定を読み込んで作成する。
+
+        - TRANSCODE_OVERSIZED: "true" の場合、上限を超えるファイルを分割・スキップする代わりに再エンコードする。
+        - UPLOAD_BYTES_PER_SEC: アップロードの速度（バイト/秒）。
+
+        Args:
+            logger (logging.Logger): ロガー。
+
+        Returns:
+            OversizedTranscoder: 設定を読み込んだインスタンス。
+        """
+        return cls(
+            enabled=os.getenv("TRANSCODE_OVERSIZED", "false").lower() == "true",
+            upload_bytes_per_sec=float(os.getenv("UPLOAD_BYTES_PER_SEC", "0")) or None,
+            logger=logger,
+        )
+
+    def transcode(self, file: str, media_info: MediaInfo | None) -> str | None:
+        """
+        有効な場合、上限サイズに収まるように再エンコードする。失敗した場合は警告を出してNoneを返す。
+
+        Args:
+            file (str): 上限サイズを超えるファイルのパス。
+            media_info (MediaInfo | None): ffprobeの結果。解析に失敗した場合はNone。
+
+        Returns:
+            str | None: 再エンコードしたファイルのパス。再エンコードしない場合はNone。
+        """
+        if not self.enabled or media_info is None:
+            return None
+        try:
+            result = MyFfmpegHelper.transcode_to_fit(
+                file,
+                self.limit_bytes,
+                upload_bytes_per_sec=self.upload_bytes_per_sec,
+                media_info=media_info,
+                progress=ProgressMonitor(
+                    log_interval=30, stall_timeout=300, logger=self.logger
+                ),
+                logger=self.logger,
+            )
+        except Exception as e:
+            self.logger.warning(f"再エンコードに失敗しました: {file}: {e}")
+            return None
+        if result is None:
+            return None
+        transcoded, plan = result
+        self.created_files.append(transcoded)
+        self.logger.info(
+            f"{plan.profile.name}で再エンコードしました: {transcoded} "
+            f"(saved: {plan.bytes_saved} bytes)"
+        )
+        return transcoded
+
+    def cleanup(self):
+        """再エンコードで作成したファイルを削除する。"""
+        for file in self.created_files:
+            if os.path.exists(file):
+                os.remove(file)
+        self.created_files.clear()
+
+    def __enter__(self) -> "OversizedTranscoder":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.cleanup()
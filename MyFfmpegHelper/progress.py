@@ -0,0 +1,329 @@
+import contextlib
+import logging
+import subprocess
+import threading
+import time
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
+
+
+@dataclass
+class FfmpegProgress:
+    """
+    ffmpegの `-progress` 出力の1ブロック分の進捗。
+
+    Attributes:
+        out_time_sec (float): 書き出し済みのメディアの時間（秒）。
+        total_size (int): 書き出し済みのバイト数。
+        speed (float | None): 処理速度（再生速度に対する倍率）。不明な場合はNone。
+        elapsed_sec (float): ffmpegの起動からの経過秒数。
+        duration_sec (float | None): 処理対象のメディアの長さ（秒）。不明な場合はNone。
+        finished (bool): ffmpegが最後の進捗を出力したかどうか。
+    """
+
+    out_time_sec: float = 0.0
+    total_size: int = 0
+    speed: float | None = None
+    elapsed_sec: float = 0.0
+    duration_sec: float | None = None
+    finished: bool = False
+
+    @property
+    def ratio(self) -> float | None:
+        """処理済みの割合（0〜1）。長さが不明な場合はNone。"""
+        if not self.duration_sec:
+            return None
+        return min(1.0, self.out_time_sec / self.duration_sec)
+
+    @property
+    def eta_sec(self) -> float | None:
+        """残りの推定秒数。推定できない場合はNone。"""
+        if not self.duration_sec or self.out_time_sec <= 0 or self.elapsed_sec <= 0:
+            return None
+        rate = self.out_time_sec / self.elapsed_sec
+        return max(0.0, (self.duration_sec - self.out_time_sec) / rate)
+
+
+@dataclass
+class FfmpegRunStats:
+    """
+    ffmpegの1回の実行の計測結果。
+
+    Attributes:
+        cmd (list[str]): 実行したコマンド。
+        elapsed_sec (float): 実行にかかった秒数。
+        out_time_sec (float): 書き出したメディアの時間（秒）。
+        total_size (int): 書き出したバイト数。
+        returncode (int | None): 終了コード。
+        stalls (int): 進捗が止まったと判定した回数。
+    """
+
+    cmd: list[str]
+    elapsed_sec: float = 0.0
+    out_time_sec: float = 0.0
+    total_size: int = 0
+    returncode: int | None = None
+    stalls: int = 0
+
+    @property
+    def bytes_per_sec(self) -> float:
+        """書き出しのスループット（バイト/秒）。"""
+        return self.total_size / self.elapsed_sec if self.elapsed_sec > 0 else 0.0
+
+
+def _parse_out_time(values: dict[str, str]) -> float | None:
+    # out_time_us を優先し、なければ out_time_ms（実際はマイクロ秒）、out_time(HH:MM:SS.micro) を使う
+    for key in ("out_time_us", "out_time_ms"):
+        value = values.get(key)
+        if value and value.lstrip("-").isdigit():
+            return max(0.0, int(value) / 1_000_000)
+    value = values.get("out_time")
+    if value and value.count(":") == 2:
+        try:
+            hours, minutes, seconds = value.split(":")
+            return max(0.0, int(hours) * 3600 + int(minutes) * 60 + float(seconds))
+        except ValueError:
+            return None
+    return None
+
+
+@contextlib.contextmanager
+def kill_when_cancelled(
+    process: subprocess.Popen, cancel: threading.Event | None
+) -> Iterator[None]:
+    """
+    with ブロックの間、cancel が設定されたら子プロセスを強制終了する。
+    呼び出し側が子プロセスの終了を待っている間に、別のスレッドから中止できるようにする。
+
+    Args:
+        process (subprocess.Popen): 監視する子プロセス。
+        cancel (threading.Event | None): 中止を知らせるイベント。Noneの場合は何もしない。
+    """
+    if cancel is None:
+        yield
+        return
+
+    done = threading.Event()
+
+    def watch():
+        while not done.is_set():
+            if cancel.wait(0.2):
+                if process.poll() is None:
+                    process.kill()
+                return
+
+    watcher = threading.Thread(target=watch, daemon=True)
+    watcher.start()
+    try:
+        yield
+    finally:
+        done.set()
+        watcher.join()
+
+
+class ProgressMonitor:
+    """
+    ffmpegの `-progress` 出力を逐次解析し、進捗のコールバックと停止（ストール）の検知を行う。
+    MyFfmpegHelperのffmpegを実行するメソッドに渡して使う。
+
+    実行ごとの計測結果は records に追加される。
+    """
+
+    def __init__(
+        self,
+        on_progress: Callable[[FfmpegProgress], None] | None = None,
+        stall_timeout: float | None = None,
+        on_stall: Callable[[FfmpegProgress], None] | None = None,
+        kill_on_stall: bool = False,
+        log_interval: float | None = None,
+        logger: logging.Logger = logging.getLogger(__name__),
+    ):
+        """
+        Args:
+            on_progress (Callable, optional): 進捗が更新されるたびに呼び出す関数。
+            stall_timeout (float | None): 進捗が更新されない状態をストールとみなす秒数。Noneの場合は検知しない。
+            on_stall (Callable, optional): ストールを検知したときに呼び出す関数。
+            kill_on_stall (bool): ストールを検知したときにffmpegを強制終了するかどうか。
+            log_interval (float | None): 進捗とETAをログに出力する間隔（秒）。Noneの場合は出力しない。
+            logger (logging.Logger): ロガー。
+        """
+        self.on_progress = on_progress
+        self.stall_timeout = stall_timeout
+        self.on_stall = on_stall
+        self.kill_on_stall = kill_on_stall
+        self.log_interval = log_interval
+        self.logger = logger
+        self.records: list[FfmpegRunStats] = []
+
+    @staticmethod
+    def with_progress_args(cmd: list[str]) -> list[str]:
+        """ffmpegのコマンドに、進捗を標準エラー出力へ機械可読な形式で出す引数を追加する。"""
+        return [cmd[0], "-progress", "pipe:2", "-nostats", *cmd[1:]]
+
+    def log_progress(self, progress: FfmpegProgress):
+        """on_progress に渡せる、進捗とETAをログに出力する関数。"""
+        ratio = f"{progress.ratio * 100:.1f}%" if progress.ratio is not None else "-"
+        speed = f"{progress.speed:.2f}x" if progress.speed is not None else "-"
+        eta = f"{progress.eta_sec:.0f}s" if progress.eta_sec is not None else "-"
+        self.logger.info(
+            f"ffmpeg progress {ratio} out_time={progress.out_time_sec:.1f}s "
+            f"size={progress.total_size / 1024**2:.1f}MiB speed={speed} ETA={eta}"
+        )
+
+    def iter_stdout(
+        self,
+        cmd: list[str],
+        duration_sec: float | None = None,
+        cancel: threading.Event | None = None,
+    ) -> Iterator[str]:
+        """
+        進捗を監視しながらffmpegを実行し、標準出力を1行ずつ返す。
+
+        Args:
+            cmd (list[str]): ffmpegのコマンド（進捗用の引数は自動で追加する）。
+            duration_sec (float | None): 処理対象のメディアの長さ（ETAの計算に使う）。
+            cancel (threading.Event | None): 設定されたらffmpegを強制終了するイベント。
+
+        Yields:
+            str: 標準出力の1行（前後の空白を除く）。
+
+        Raises:
+            subprocess.CalledProcessError: ffmpegがエラー終了した場合。
+        """
+        stats = FfmpegRunStats(cmd=cmd)
+        progress = FfmpegProgress(duration_sec=duration_sec)
+        errors: list[str] = []
+        started_at = time.monotonic()
+        last_update = [started_at]
+        last_logged = [started_at]
+        done = threading.Event()
+
+        process = subprocess.Popen(
+            self.with_progress_args(cmd),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+
+        def read_progress():
+            assert process.stderr is not None
+            values: dict[str, str] = {}
+            for line in process.stderr:
+                key, sep, value = line.strip().partition("=")
+                if not sep or " " in key:
+                    errors.append(line)
+                    continue
+                values[key] = value
+                if key != "progress":
+                    continue
+                # "progress=" で1ブロック分の進捗が揃う
+                out_time = _parse_out_time(values)
+                if out_time is not None:
+                    progress.out_time_sec = out_time
+                if values.get("total_size", "").isdigit():
+                    progress.total_size = int(values["total_size"])
+                speed = values.get("speed", "").rstrip("x")
+                try:
+                    progress.speed = float(speed)
+                except ValueError:
+                    progress.speed = None
+                progress.elapsed_sec = time.monotonic() - started_at
+                progress.finished = value == "end"
+                last_update[0] = time.monotonic()
+                values = {}
+                if self.on_progress:
+                    self.on_progress(progress)
+                if self.log_interval is not None and (
+                    progress.finished
+                    or last_update[0] - last_logged[0] >= self.log_interval
+                ):
+                    last_logged[0] = last_update[0]
+                    self.log_progress(progress)
+
+        def watch_stall():
+            assert self.stall_timeout is not None
+            stalled = False
+            while not done.wait(min(1.0, self.stall_timeout / 4)):
+                idle = time.monotonic() - last_update[0]
+                if idle < self.stall_timeout:
+                    stalled = False
+                    continue
+                if stalled:
+                    continue
+                # 進捗が stall_timeout 秒以上更新されていない
+                stalled = True
+                stats.stalls += 1
+                self.logger.warning(
+                    f"ffmpegの進捗が{idle:.0f}秒間更新されていません: {' '.join(cmd)}"
+                )
+                if self.on_stall:
+                    self.on_stall(progress)
+                if self.kill_on_stall:
+                    process.kill()
+
+        reader = threading.Thread(target=read_progress, daemon=True)
+        reader.start()
+        watcher = None
+        if self.stall_timeout:
+            watcher = threading.Thread(target=watch_stall, daemon=True)
+            watcher.start()
+
+        finished = False
+        try:
+            assert process.stdout is not None
+            with kill_when_cancelled(process, cancel):
+                for line in process.stdout:
+                    line = line.strip()
+                    if line:
+                        yield line
+            finished = True
+        finally:
+            if not finished and process.poll() is None:
+                # 呼び出し側が途中で読むのをやめた場合は、ffmpegを終了させる
+                process.kill()
+            returncode = process.wait()
+            reader.join()
+            done.set()
+            if watcher is not None:
+                watcher.join()
+
+            stats.elapsed_sec = time.monotonic() - started_at
+            stats.out_time_sec = progress.out_time_sec
+            stats.total_size = progress.total_size
+            stats.returncode = returncode
+            self.records.append(stats)
+            self.logger.info(
+                f"ffmpeg finished in {stats.elapsed_sec:.1f}s "
+                f"(out_time={stats.out_time_sec:.1f}s, {stats.bytes_per_sec / 1024**2:.1f} MiB/s, "
+                f"returncode={returncode})"
+            )
+
+        if returncode != 0:
+            raise subprocess.CalledProcessError(
+                returncode, cmd, stderr="".join(errors)
+            )
+
+    def run(
+        self,
+        cmd: list[str],
+        duration_sec: float | None = None,
+        cancel: threading.Event | None = None,
+    ) -> FfmpegRunStats:
+        """
+        進捗を監視しながらffmpegを実行する（標準出力は使わない）。
+
+        Args:
+            cmd (list[str]): ffmpegのコマンド（進捗用の引数は自動で追加する）。
+            duration_sec (float | None): 処理対象のメディアの長さ（ETAの計算に使う）。
+            cancel (threading.Event | None): 設定されたらffmpegを強制終了するイベント。
+
+        Returns:
+            FfmpegRunStats: 実行の計測結果。
+
+        Raises:
+            subprocess.CalledProcessError: ffmpegがエラー終了した場合。
+        """
+        for _ in self.iter_stdout(cmd, duration_sec, cancel=cancel):
+            pass
+        return self.records[-1]
@@ -0,0 +1,119 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class TranscodeProfile:
+    """
+    サイズを小さくするための再エンコードの設定。
+
+    Attributes:
+        name (str): プロファイル名。
+        extension (str): 出力ファイルの拡張子（"." を含む）。
+        video_codec (str | None): 映像のコーデック。Noneの場合は映像を出力しない（音声専用）。
+        video_bitrate (int | None): 映像の目標ビットレート（bps）。
+        max_height (int | None): 映像の最大の高さ（ピクセル）。これより大きい場合のみ縮小する。
+        preset (str | None): エンコーダーのプリセット。
+        audio_codec (str): 音声のコーデック。
+        audio_bitrate (int): 音声のビットレート（bps）。
+        audio_channels (int | None): 音声のチャンネル数。Noneの場合は元のまま。
+    """
+
+    name: str
+    extension: str
+    video_codec: str | None = None
+    video_bitrate: int | None = None
+    max_height: int | None = None
+    preset: str | None = None
+    audio_codec: str = "aac"
+    audio_bitrate: int = 128_000
+    audio_channels: int | None = None
+
+    @property
+    def is_audio_only(self) -> bool:
+        """映像を出力しないプロファイルかどうか。"""
+        return self.video_codec is None
+
+    @property
+    def target_bitrate(self) -> int:
+        """映像と音声を合わせた目標ビットレート（bps）。"""
+        return (self.video_bitrate or 0) + self.audio_bitrate
+
+
+# 画質・音質を落とす度合いが小さい順に並べる
+DEFAULT_TRANSCODE_PROFILES: tuple[TranscodeProfile, ...] = (
+    TranscodeProfile(
+        name="1080p_h264",
+        extension=".mp4",
+        video_codec="libx264",
+        video_bitrate=4_000_000,
+        max_height=1080,
+        preset="veryfast",
+        audio_bitrate=128_000,
+    ),
+    TranscodeProfile(
+        name="720p_h264",
+        extension=".mp4",
+        video_codec="libx264",
+        video_bitrate=2_000_000,
+        max_height=720,
+        preset="veryfast",
+        audio_bitrate=128_000,
+    ),
+    TranscodeProfile(
+        name="480p_h264",
+        extension=".mp4",
+        video_codec="libx264",
+        video_bitrate=900_000,
+        max_height=480,
+        preset="veryfast",
+        audio_bitrate=96_000,
+    ),
+    TranscodeProfile(
+        name="music_aac",
+        extension=".m4a",
+        audio_bitrate=160_000,
+    ),
+    TranscodeProfile(
+        name="speech_aac",
+        extension=".m4a",
+        audio_bitrate=64_000,
+        audio_channels=1,
+    ),
+)
+
+
+@dataclass
+class TranscodePlan:
+    """
+    試し変換から予測した、プロファイルで再エンコードした場合の結果。
+
+    Attributes:
+        profile (TranscodeProfile): 使用するプロファイル。
+        input_bytes (int): 入力ファイルのサイズ（バイト）。
+        predicted_bytes (int): 予測した出力ファイルのサイズ（バイト）。
+        limit_bytes (int): 出力ファイルの上限サイズ（バイト）。
+        upload_bytes_per_sec (float | None): アップロードの速度（バイト/秒）。不明な場合はNone。
+    """
+
+    profile: TranscodeProfile
+    input_bytes: int
+    predicted_bytes: int
+    limit_bytes: int
+    upload_bytes_per_sec: float | None = None
+
+    @property
+    def fits(self) -> bool:
+        """予測した出力が上限サイズに収まるかどうか。"""
+        return self.predicted_bytes <= self.limit_bytes
+
+    @property
+    def bytes_saved(self) -> int:
+        """削減できるバイト数の予測。"""
+        return self.input_bytes - self.predicted_bytes
+
+    @property
+    def upload_sec_saved(self) -> float | None:
+        """短縮できるアップロード時間（秒）の予測。速度が不明な場合はNone。"""
+        if not self.upload_bytes_per_sec:
+            return None
+        return self.bytes_saved / self.upload_bytes_per_sec
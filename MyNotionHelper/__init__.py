@@ -1,4 +1,17 @@
-# MyNotionHelper/__init__.py
-from .my_notion_helper import MyNotionHelper, MimeTypeInfo
+from .dedup_index import DedupEntry, UploadDedupIndex
+from .my_notion_helper import MimeTypeInfo, MyNotionHelper, UploadedFile
+from .rate_limiter import NotionRateLimiter
+from .upload_journal import UploadJournal
+from .upload_tuner import UploadTuner, UploadTuning
 
-__all__ = ["MyNotionHelper", "MimeTypeInfo"]
\ No newline at end of file
+__all__ = [
+    "DedupEntry",
+    "MyNotionHelper",
+    "MimeTypeInfo",
+    "NotionRateLimiter",
+    "UploadDedupIndex",
+    "UploadedFile",
+    "UploadJournal",
+    "UploadTuner",
+    "UploadTuning",
+]
@@ -0,0 +1,164 @@
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+
+@dataclass
+class DedupEntry:
+    """
+    Notionにアップロード済みのファイルを表すデータクラス。
+
+    属性:
+        content_hash (str): ファイル内容のSHA-256。
+        size (int): ファイルサイズ（バイト）。
+        page_id (str): 添付先のNotionページのID。
+        block_id (str): 添付したブロックのID。
+        file_upload_id (str): Notionのfile_upload ID。
+        file_name (str): Notion上のファイル名。
+    """
+
+    content_hash: str
+    size: int
+    page_id: str
+    block_id: str
+    file_upload_id: str
+    file_name: str
+
+
+class UploadDedupIndex:
+    """
+    アップロード済みファイルの重複排除インデックス（SQLiteの単一ファイル）。
+
+    「内容のハッシュ + サイズ + ページ」から、作成済みのNotionブロックを引けるようにします。
+    また「パス + サイズ + 更新日時」からハッシュを引けるようにし、
+    変更されていないファイルはディスクを読まずに判定できるようにします。
+    """
+
+    def __init__(self, db_path: str = "~/.cache/shortcuts_app/notion_dedup.sqlite3"):
+        """
+        引数:
+            db_path (str): インデックスのSQLiteファイルのパス。
+        """
+        self.db_path = os.path.expanduser(db_path)
+        self._lock = threading.Lock()
+        if os.path.dirname(self.db_path):
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS uploads (
+                    content_hash TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    page_id TEXT NOT NULL,
+                    block_id TEXT NOT NULL,
+                    file_upload_id TEXT NOT NULL,
+                    file_name TEXT NOT NULL,
+                    uploaded_at REAL NOT NULL,
+                    PRIMARY KEY (content_hash, size, page_id)
+                );
+                CREATE INDEX IF NOT EXISTS uploads_size ON uploads (size);
+                CREATE TABLE IF NOT EXISTS file_hashes (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    content_hash TEXT NOT NULL
+                );
+                """
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with conn:  # 正常終了時にcommitする
+                yield conn
+        finally:
+            conn.close()
+
+    def lookup_hash(self, file_path: str) -> str | None:
+        """
+        ファイルが前回ハッシュを計算した時点から変更されていなければ、そのハッシュを返します。
+
+        引数:
+            file_path (str): ファイルパス。
+
+        戻り値:
+            str | None: 記録済みのハッシュ。未記録または変更されている場合はNone。
+        """
+        stat = os.stat(file_path)
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT content_hash FROM file_hashes WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (os.path.realpath(file_path), stat.st_size, stat.st_mtime_ns),
+            ).fetchone()
+        return row[0] if row else None
+
+    def remember_hash(self, file_path: str, content_hash: str):
+        """ファイルのハッシュを「パス + サイズ + 更新日時」で記録します。"""
+        stat = os.stat(file_path)
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO file_hashes VALUES (?, ?, ?, ?)",
+                (
+                    os.path.realpath(file_path),
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                    content_hash,
+                ),
+            )
+
+    def has_size(self, size: int) -> bool:
+        """同じサイズのアップロード済みファイルがあるか（重複の候補があるか）を返します。"""
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT 1 FROM uploads WHERE size = ? LIMIT 1", (size,)
+            ).fetchone()
+        return row is not None
+
+    def find(self, content_hash: str, size: int, page_id: str) -> DedupEntry | None:
+        """
+        同じ内容のファイルが指定ページにアップロード済みであれば、その情報を返します。
+
+        引数:
+            content_hash (str): ファイル内容のSHA-256。
+            size (int): ファイルサイズ。
+            page_id (str): 添付先のNotionページのID。
+
+        戻り値:
+            DedupEntry | None: アップロード済みのファイルの情報。
+        """
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT content_hash, size, page_id, block_id, file_upload_id, file_name "
+                "FROM uploads WHERE content_hash = ? AND size = ? AND page_id = ?",
+                (content_hash, size, page_id),
+            ).fetchone()
+        return DedupEntry(*row) if row else None
+
+    def record(self, entry: DedupEntry):
+        """アップロードしたファイルを記録します。"""
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    entry.content_hash,
+                    entry.size,
+                    entry.page_id,
+                    entry.block_id,
+                    entry.file_upload_id,
+                    entry.file_name,
+                    time.time(),
+                ),
+            )
+
+    def forget(self, entry: DedupEntry):
+        """ブロックが存在しなくなったエントリを削除します。"""
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "DELETE FROM uploads WHERE content_hash = ? AND size = ? AND page_id = ?",
+                (entry.content_hash, entry.size, entry.page_id),
+            )
@@ -1,14 +1,30 @@
 import concurrent.futures
+import hashlib
 import json
 import logging
 import os
+import queue
+import threading
 import time
+from collections.abc import Callable, Iterable, Iterator
 from dataclasses import dataclass
 
+import httpx
 import requests
 from notion_client import Client
+from requests.adapters import HTTPAdapter
 
-from MyFfmpegHelper import MyFfmpegHelper
+from MyFfmpegHelper import MediaInfo, MyFfmpegHelper
+
+from .dedup_index import DedupEntry, UploadDedupIndex
+from .rate_limiter import (
+    NotionRateLimiter,
+    RateLimitedTransport,
+    get_default_rate_limiter,
+    is_idempotent_request,
+)
+from .upload_journal import UploadJournal
+from .upload_tuner import UploadTuner
 
 
 @dataclass
@@ -25,23 +41,188 @@ class MimeTypeInfo:
     file_type: str
 
 
+@dataclass
+class UploadedFile:
+    """
+    Notionへの送信が完了したファイルの情報を表すデータクラス。
+
+    属性:
+        file_path (str): アップロードしたファイルのパス。
+        file_name (str): Notion上のファイル名。
+        mime_type_info (MimeTypeInfo): MIMEタイプとファイルタイプ。
+        file_upload_id (str): Notionのfile_upload ID。
+        journal (UploadJournal | None): 再開用のジャーナル（ページへの添付後に削除）。
+        block_id (str | None): ページに添付したブロックのID。
+        content_hash (str | None): ファイル内容のSHA-256（重複排除が有効な場合）。
+        skipped (bool): アップロード済みのため送信を省略した場合はTrue。
+        size (int): ファイルサイズ（送信後にファイルを削除しても重複排除インデックスに記録できるよう保持する）。
+    """
+
+    file_path: str
+    file_name: str
+    mime_type_info: MimeTypeInfo
+    file_upload_id: str
+    journal: UploadJournal | None = None
+    block_id: str | None = None
+    content_hash: str | None = None
+    skipped: bool = False
+    size: int = 0
+
+
+class _PartUploadPool:
+    """
+    パートの送信に使うスレッドプールと、送信中（メモリ上）のパート数の上限（ウィンドウ）。
+    upload_files では全ファイルで1つを共有し、ファイル数によらず
+    メモリ上のパート数と同時リクエスト数を一定に保ちます。
+    """
+
+    def __init__(self, max_workers: int, window: Callable[[], int]):
+        """
+        引数:
+            max_workers (int): パートを送信するスレッド数。
+            window (Callable[[], int]): 送信中のパート数の上限を返す関数（自動調整時は変化する）。
+        """
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self._window = window
+        self._in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """送信中のパート数が上限未満になるまで待ち、1つ分の枠を確保します。"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._in_flight < self._window())
+            self._in_flight += 1
+
+    def release(self):
+        """acquire で確保した枠を解放します。"""
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def __enter__(self) -> "_PartUploadPool":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.executor.shutdown(wait=True)
+
+
 class MyNotionHelper:
     token: str
     notion: Client
     version: str
     CHUNK_SIZE: int = 10 * 1024 * 1024  # 10MB
+    MAX_RETRIES: int = 5
+    MAX_BLOCK_CHILDREN: int = 100
     logger: logging.Logger
+    max_workers: int
+    upload_window: int
+    max_parallel_files: int
+    session: requests.Session
+    resumable: bool
+    rate_limiter: NotionRateLimiter
+    tuner: UploadTuner | None
+    dedup_index: UploadDedupIndex | None
 
     def __init__(
         self,
         token: str,
         version: str = "2022-06-28",
         logger: logging.Logger = logging.getLogger(__name__),
+        max_workers: int = 5,
+        upload_window: int | None = None,
+        max_parallel_files: int = 3,
+        resumable: bool = False,
+        rate_limiter: NotionRateLimiter | None = None,
+        adaptive: bool = False,
+        tuner: UploadTuner | None = None,
+        dedup_index: UploadDedupIndex | None = None,
     ):
+        """
+        引数:
+            token (str): Notionインテグレーションのトークン。
+            version (str): Notion APIのバージョン。
+            logger (logging.Logger): ロガー。
+            max_workers (int): マルチパートアップロードの並列数。
+            upload_window (int | None): マルチパートアップロード時にメモリ上に保持するパート数の上限。
+                Noneの場合は max_workers と同じ値を使用します。
+                ピークのメモリ使用量はおよそ upload_window × CHUNK_SIZE になります。
+                upload_files で複数のファイルを送信する場合も、全ファイルで共有する上限です。
+            max_parallel_files (int): upload_files で同時に送信するファイル数。
+            resumable (bool): Trueの場合、マルチパートアップロードの進捗をジャーナルに記録し、
+                中断後の再実行時に未送信のパートだけを送信します。
+            rate_limiter (NotionRateLimiter | None): Notionへの全リクエストが経由するレートリミッター。
+                Noneの場合はプロセス全体で共有するリミッターを使用します。
+            adaptive (bool): Trueの場合、マルチパートアップロードのパートサイズと並列数を
+                計測結果から自動調整します（調整結果はホストごとに記録され、次回の初期値になります）。
+            tuner (UploadTuner | None): 自動調整に使う UploadTuner。指定した場合は adaptive=True とみなします。
+            dedup_index (UploadDedupIndex | None): 重複排除インデックス。指定した場合、
+                同じ内容のファイルが同じページにアップロード済みであれば送信を省略します。
+
+        Notion APIへの生のRESTリクエストはすべて self.session を経由します。
+        コネクションプールは同時リクエスト数（パートの並列数 + 同時に送信するファイル数）に合わせて確保され、
+        keep-aliveで再利用されます。
+        """
         self.token = token
-        self.notion = Client(auth=token)
+        self.rate_limiter = rate_limiter or get_default_rate_limiter()
+        # notion_clientのリクエストもレートリミッターを経由させる
+        self.notion = Client(
+            auth=token,
+            client=httpx.Client(transport=RateLimitedTransport(self.rate_limiter)),
+        )
         self.version = version
         self.logger = logger
+        self.max_workers = max(1, max_workers)
+        self.upload_window = max(1, upload_window or self.max_workers)
+        self.max_parallel_files = max(1, max_parallel_files)
+        self.tuner = tuner or (UploadTuner(logger=logger) if adaptive else None)
+        # パートを送信するスレッドと、ファイルごとの作成・送信・完了通知を行うスレッドが同時に使う
+        part_workers = self.tuner.max_concurrency if self.tuner else self.max_workers
+        self.session = self._create_session(part_workers + self.max_parallel_files)
+        self.dedup_index = dedup_index
+        self.resumable = resumable
+
+    @staticmethod
+    def _create_session(pool_size: int) -> requests.Session:
+        """
+        Notion API用のkeep-aliveなHTTPセッションを作成します。
+        アップロードの全スレッドで共有できるよう、プールサイズを同時リクエスト数に合わせます。
+
+        引数:
+            pool_size (int): 同時に保持するコネクション数（アップロードの同時リクエスト数）。
+
+        戻り値:
+            requests.Session: コネクションプールを設定したセッション。
+        """
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        return session
+
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        共有セッションでNotion APIにリクエストを送信します。
+        送信はレートリミッターを経由し、429の場合は Retry-After に従ってリトライします。
+        5xx・通信エラーは、GETやパートの送信など再送してよいリクエストの場合だけ
+        ジッター付き指数バックオフでリトライします（ブロック追加などは重複を避けるためリトライしません）。
+
+        引数:
+            method (str): HTTPメソッド。
+            url (str): リクエスト先のURL。
+            **kwargs: requests.Session.request に渡す引数。
+
+        戻り値:
+            requests.Response: 最後に受け取ったレスポンス。
+        """
+        return self.rate_limiter.call(
+            lambda: self.session.request(method, url, **kwargs),
+            max_retries=self.MAX_RETRIES,
+            retry_exceptions=(requests.ConnectionError, requests.Timeout),
+            idempotent=is_idempotent_request(method, url),
+        )
+
+    def close(self):
+        """HTTPセッションのコネクションプールを解放します。"""
+        self.session.close()
 
     # Notionデータベースからアイテムを取得する関数
     def get_items(self, database_id) -> list:
@@ -269,15 +450,159 @@ class MyNotionHelper:
         戻り値:
             なし
         """
+        self.upload_files(page_id, [file_path])
 
+    # 指定したNotionページに複数のファイルをまとめてアップロードする関数
+    def upload_files(self, page_id: str, file_paths: list[str]) -> list[UploadedFile]:
+        """
+        指定したNotionページに複数のファイルをまとめてアップロードします。
+        ファイルの送信は max_parallel_files 個ずつ並列に行い、ページへの添付は1回のブロック追加と
+        1回のファイルプロパティ更新でまとめて行います。
+        パートの送信スレッドとメモリ上のパート数の上限（upload_window）は全ファイルで共有します。
+        自動調整（adaptive）が有効な場合は計測が混ざらないよう1ファイルずつ送信します。
+        重複排除インデックスが有効な場合、同じ内容のファイルが添付済みであれば送信を省略します。
+
+        引数:
+            page_id (str): ファイルをアップロードするNotionページのID。
+            file_paths (list[str]): アップロードするファイルのパスのリスト。この順にページへ添付されます。
+
+        例外:
+            Exception: いずれかのファイルのアップロードに失敗した場合に発生します。
+                送信に成功したファイルはページに添付してから例外を送出します。
+
+        戻り値:
+            list[UploadedFile]: ページに添付したファイルの情報。
+        """
         try:
-            # 20MB以下ならsingle_part、20MB超ならmulti_partとする（Notion APIの仕様）
-            file_size = os.path.getsize(file_path)
-            file_name = os.path.basename(file_path)
-            mode = "single_part" if file_size <= 20 * 1024 * 1024 else "multi_part"
+            workers = 1 if self.tuner else max(1, min(self.max_parallel_files, len(file_paths)))
+            results: list[UploadedFile | None] = [None] * len(file_paths)
+            errors: list[Exception] = []
+
+            # Step 1, 2: 各ファイルの中身を並列に送信する
+            with (
+                self._create_part_pool() as part_pool,
+                concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor,
+            ):
+                futures = {
+                    executor.submit(
+                        self._send_file_contents, file_path, page_id, part_pool
+                    ): i
+                    for i, file_path in enumerate(file_paths)
+                }
+                for future in concurrent.futures.as_completed(futures):
+                    try:
+                        results[futures[future]] = future.result()
+                    except Exception as e:
+                        self.logger.error(
+                            f"ファイル「{file_paths[futures[future]]}」の送信に失敗しました: {e}"
+                        )
+                        errors.append(e)
+
+            # Step 3: 送信できたファイルをまとめてページに添付する
+            # （アップロード済みで送信を省略したファイルは添付済み）
+            uploaded = [result for result in results if result is not None]
+            to_attach = [u for u in uploaded if not u.skipped]
+            if to_attach:
+                self._attach_uploaded_files(page_id, to_attach)
+
+            if errors:
+                raise Exception(
+                    f"{len(errors)}件のファイルのアップロードに失敗しました: {errors[0]}"
+                )
+
+            return uploaded
+
+        except Exception as e:
+            self.logger.error(f"Notionへのアップロードに失敗しました: {e}")
+            raise
+
+    def _send_file_contents(
+        self,
+        file_path: str,
+        page_id: str | None = None,
+        part_pool: _PartUploadPool | None = None,
+    ) -> UploadedFile:
+        """
+        File Uploadオブジェクトを作成し、ファイルの中身を送信します（ページへの添付は行いません）。
+        重複排除インデックスが有効で、同じ内容のファイルが page_id に添付済みの場合は
+        送信せずに skipped=True の結果を返します。
+
+        引数:
+            file_path (str): アップロードするファイルのパス。
+            page_id (str | None): 添付先のNotionページのID（重複排除の判定に使用）。
+            part_pool (_PartUploadPool | None): 他のファイルと共有するパートの送信プール。
+                Noneの場合はこのファイルだけのプールを使います。
+
+        戻り値:
+            UploadedFile: 送信が完了したファイルの情報。
+
+        例外:
+            Exception: 送信に失敗した場合に発生します。
+        """
+        # 20MB以下ならsingle_part、20MB超ならmulti_partとする（Notion APIの仕様）
+        file_size = os.path.getsize(file_path)
+        file_name = os.path.basename(file_path)
+        mode = "single_part" if file_size <= 20 * 1024 * 1024 else "multi_part"
+
+        # ファイルからMIMEタイプとファイルタイプを取得
+        mime_type_info = self.get_mime_type_from_extension(file_path)
+
+        # 重複排除: 内容のハッシュが分かれば、アップロード済みのブロックを再利用する
+        content_hash: str | None = None
+        file_data: bytes | None = None
+        if self.dedup_index and page_id:
+            # 変更されていないファイルはディスクを読まずにハッシュが分かる
+            content_hash = self.dedup_index.lookup_hash(file_path)
+            if content_hash is None:
+                if mode == "single_part":
+                    # 送信用に読み込むデータをそのままハッシュする（追加の読み込みなし）
+                    with open(file_path, "rb") as f:
+                        file_data = f.read()
+                    content_hash = hashlib.sha256(file_data).hexdigest()
+                elif self.dedup_index.has_size(file_size):
+                    # 同じサイズのファイルがある場合だけ、送信前にハッシュを計算する
+                    self.logger.info(f"重複の候補があるためハッシュを計算します: {file_path}")
+                    content_hash = self._hash_file(file_path)
+                if content_hash:
+                    self.dedup_index.remember_hash(file_path, content_hash)
+
+            if content_hash:
+                entry = self._reuse_uploaded_block(page_id, content_hash, file_size)
+                if entry:
+                    self.logger.info(
+                        f"アップロード済みのためスキップします: {file_path} (block_id={entry.block_id})"
+                    )
+                    return UploadedFile(
+                        file_path=file_path,
+                        file_name=file_name,
+                        mime_type_info=mime_type_info,
+                        file_upload_id=entry.file_upload_id,
+                        block_id=entry.block_id,
+                        content_hash=content_hash,
+                        skipped=True,
+                        size=file_size,
+                    )
 
-            # ファイルからMIMEタイプとファイルタイプを取得
-            mime_type_info = self.get_mime_type_from_extension(file_path)
+        # 中断されたマルチパートアップロードがあれば、ジャーナルから再開する
+        journal: UploadJournal | None = None
+        if mode == "multi_part" and self.resumable:
+            journal = self._load_resumable_journal(file_path)
+
+        if journal:
+            part_size = journal.part_size
+        elif self.tuner:
+            part_size = self.tuner.part_size
+        else:
+            part_size = self.CHUNK_SIZE
+
+        if journal:
+            file_upload_id = journal.file_upload_id
+            number_of_parts = journal.number_of_parts
+            self.logger.info(
+                f"Resuming file upload ID: {file_upload_id} "
+                f"({len(journal.acknowledged_parts)}/{number_of_parts} parts already sent)"
+            )
+        else:
             payload = {}
 
             # Step 1: Create a File Upload object
@@ -287,8 +612,8 @@ class MyNotionHelper:
                     "filename": file_name,
                 }
             elif mode == "multi_part":
-                # 10MBごとの分割数を計算
-                number_of_parts = (file_size + self.CHUNK_SIZE - 1) // self.CHUNK_SIZE
+                # パートサイズ（デフォルト10MB）ごとの分割数を計算
+                number_of_parts = (file_size + part_size - 1) // part_size
                 payload = {
                     "filename": file_name,
                     "content_type": mime_type_info.mime_type,
@@ -296,7 +621,8 @@ class MyNotionHelper:
                     "number_of_parts": number_of_parts,
                 }
 
-            file_create_response = requests.post(
+            file_create_response = self._request(
+                "POST",
                 "https://api.notion.com/v1/file_uploads",
                 json=payload,
                 headers={
@@ -315,140 +641,275 @@ class MyNotionHelper:
             file_upload_id = json.loads(file_create_response.text)["id"]
             self.logger.info(f"File upload ID: {file_upload_id}")
 
-            # Step 2: Upload file contents
-            upload_url = f"https://api.notion.com/v1/file_uploads/{file_upload_id}/send"
-            upload_headers = {
-                "Authorization": f"Bearer {self.token}",
-                "Notion-Version": self.version,
-            }
+            # 再開用のジャーナルを作成
+            if mode == "multi_part" and self.resumable:
+                journal = UploadJournal.create(
+                    file_path, file_upload_id, part_size, number_of_parts
+                )
 
-            if mode == "single_part":
-                with open(file_path, "rb") as f:
-                    # Provide the MIME content type of the file as the 3rd argument.
-                    files = {"file": (file_name, f, mime_type_info.mime_type)}
+        # Step 2: Upload file contents
+        upload_url = f"https://api.notion.com/v1/file_uploads/{file_upload_id}/send"
+        upload_headers = {
+            "Authorization": f"Bearer {self.token}",
+            "Notion-Version": self.version,
+        }
+
+        if mode == "single_part":
+            # 共有プールがあれば、メモリ上のデータを1パートとしてウィンドウに数える
+            if part_pool:
+                part_pool.acquire()
+            try:
+                # リトライ時に再送できるよう、20MB以下のファイルはメモリに読み込んでから送る
+                if file_data is None:
+                    with open(file_path, "rb") as f:
+                        file_data = f.read()
+
+                # Provide the MIME content type of the file as the 3rd argument.
+                files = {"file": (file_name, file_data, mime_type_info.mime_type)}
+
+                # ファイルそのものをアップロード
+                upload_response = self._request(
+                    "POST",
+                    url=upload_url,
+                    headers=upload_headers,
+                    files=files,
+                )
+            finally:
+                file_data = None
+                if part_pool:
+                    part_pool.release()
+
+            if upload_response.status_code != 200:
+                raise Exception(
+                    f"File upload failed with status code {upload_response.status_code}: {upload_response.text}"
+                )
 
-                    # ファイルそのものをアップロード
-                    upload_response = requests.post(
+        elif mode == "multi_part" and not (journal and journal.completed):
+            # チャンクごとにアップロードする一時関数を定義
+            # （429・5xxのリトライは _request がレート制限と合わせて行う）
+            def upload_chunk(part_number: int, chunk: bytes):
+                files = {
+                    "file": (file_name, chunk, mime_type_info.mime_type),
+                    "part_number": (None, str(part_number)),
+                }
+                self.logger.info(
+                    f"Uploading part {part_number} of {number_of_parts}..."
+                )
+
+                started_at = time.monotonic()
+                try:
+                    response = self._request(
+                        "POST",
                         url=upload_url,
                         headers=upload_headers,
                         files=files,
                     )
+                except Exception:
+                    if self.tuner:
+                        self.tuner.record_part(len(chunk), 0.0, ok=False)
+                    raise
+
+                if self.tuner:
+                    self.tuner.record_part(
+                        len(chunk),
+                        time.monotonic() - started_at,
+                        ok=response.status_code == 200,
+                    )
 
-                    if upload_response.status_code != 200:
-                        raise Exception(
-                            f"File upload failed with status code {upload_response.status_code}: {upload_response.text}"
-                        )
+                if response.status_code != 200:
+                    raise Exception(
+                        f"Failed to upload part {part_number}: {response.status_code} - {response.text}"
+                    )
 
-            elif mode == "multi_part":
-                # チャンクごとにアップロードする一時関数を定義
-                def upload_chunk(part_number: int, chunk: bytes):
-                    # 各チャンクのリトライ回数を3回とする
-                    max_retries = 3
-                    for attempt in range(max_retries):
-                        files = {
-                            "file": (file_name, chunk, mime_type_info.mime_type),
-                            "part_number": (None, str(part_number)),
-                        }
-                        self.logger.info(
-                            f"Uploading part {part_number} of {number_of_parts}... (Attempt {attempt + 1})"
-                        )
+                # 再開用に送信済みとして記録
+                if journal:
+                    journal.mark_part_done(part_number)
+
+            if self.tuner:
+                self.tuner.start(part_size)
+
+            # 重複排除用のハッシュは送信のための読み込みと同時に計算する
+            # （再開時は読み飛ばすパートがあるため計算しない）
+            hasher = None
+            if (
+                self.dedup_index
+                and content_hash is None
+                and not (journal and journal.acknowledged_parts)
+            ):
+                hasher = hashlib.sha256()
+
+            # ファイルをパートごとに遅延読み込みしながら並列アップロードする
+            # （メモリ上のパートは upload_window 個までに制限される）
+            # 再開時は送信済みのパートを読み飛ばす
+            self._upload_parts_streaming(
+                self._iter_file_parts(
+                    file_path,
+                    part_size,
+                    skip_parts=set(journal.acknowledged_parts) if journal else None,
+                    hasher=hasher,
+                ),
+                upload_chunk,
+                part_pool,
+            )
 
-                        response = requests.post(
-                            url=upload_url,
-                            headers=upload_headers,
-                            files=files,
-                        )
-                        # 200 OKの時は問題なし
-                        if response.status_code == 200:
-                            return
-                        # 200 OK以外の場合はリトライ回数が許すなら1秒後に再実行
-                        else:
-                            self.logger.warning(
-                                f"Attempt {attempt + 1} failed for part {part_number}: {response.status_code} - {response.text}"
-                            )
-                            if attempt < max_retries - 1:
-                                time.sleep(1)
+            if hasher:
+                content_hash = hasher.hexdigest()
+                if self.dedup_index:
+                    self.dedup_index.remember_hash(file_path, content_hash)
 
-                    raise Exception(
-                        f"Failed to upload part {part_number} after {max_retries} attempts"
-                    )
+            # 全チャンクのアップロードが成功した場合は、完了通知を送信
+            complete_url = (
+                f"https://api.notion.com/v1/file_uploads/{file_upload_id}/complete"
+            )
+            complete_headers = {
+                "accept": "application/json",
+                "Authorization": f"Bearer {self.token}",
+                "Notion-Version": self.version,
+            }
+
+            # 完了通知を送信
+            complete_response = self._request(
+                "POST",
+                complete_url,
+                headers=complete_headers,
+            )
 
-                # 実際にファイルを分割で読み込んで順次並列アップロードする
-                with open(file_path, "rb") as f:
-                    chunks = [
-                        (i + 1, f.read(self.CHUNK_SIZE)) for i in range(number_of_parts)
-                    ]
-
-                # max_workers分割（デフォルト5）で実行する
-                with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-                    futures = [
-                        executor.submit(upload_chunk, part_number, chunk)
-                        for part_number, chunk in chunks
-                    ]
-                    concurrent.futures.wait(futures)
-
-                # 全チャンクのアップロードが成功した場合は、完了通知を送信
-                complete_url = (
-                    f"https://api.notion.com/v1/file_uploads/{file_upload_id}/complete"
+            if complete_response.status_code != 200:
+                raise Exception(
+                    f"Failed to complete file upload with status code {complete_response.status_code}: {complete_response.text}"
                 )
-                complete_headers = {
-                    "accept": "application/json",
-                    "Authorization": f"Bearer {self.token}",
-                    "Notion-Version": self.version,
-                }
 
-                # 完了通知を送信
-                complete_response = requests.post(
-                    complete_url,
-                    headers=complete_headers,
+            if journal:
+                journal.mark_completed()
+
+            # 計測結果から次回のパートサイズと並列数を記録する
+            if self.tuner:
+                tuning = self.tuner.finish()
+                self.logger.info(
+                    f"Next upload tuning: part_size={tuning.part_size}, concurrency={tuning.concurrency}"
                 )
 
-                if complete_response.status_code != 200:
-                    raise Exception(
-                        f"Failed to complete file upload with status code {complete_response.status_code}: {complete_response.text}"
+        return UploadedFile(
+            file_path=file_path,
+            file_name=file_name,
+            mime_type_info=mime_type_info,
+            file_upload_id=file_upload_id,
+            journal=journal,
+            content_hash=content_hash,
+            size=file_size,
+        )
+
+    @staticmethod
+    def _hash_file(file_path: str, block_size: int = 8 * 1024 * 1024) -> str:
+        """ファイル内容のSHA-256を計算します。"""
+        hasher = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            while chunk := f.read(block_size):
+                hasher.update(chunk)
+        return hasher.hexdigest()
+
+    def _reuse_uploaded_block(
+        self, page_id: str, content_hash: str, size: int
+    ) -> DedupEntry | None:
+        """
+        同じ内容のファイルがページに添付済みであれば、そのブロックが使えるか確認して返します。
+        ページのコンテンツ削除などでブロックがゴミ箱に移動している場合は復元します。
+
+        引数:
+            page_id (str): 添付先のNotionページのID。
+            content_hash (str): ファイル内容のSHA-256。
+            size (int): ファイルサイズ。
+
+        戻り値:
+            DedupEntry | None: 再利用できるアップロード済みのファイル。なければNone。
+        """
+        if not self.dedup_index:
+            return None
+
+        entry = self.dedup_index.find(content_hash, size, page_id)
+        if entry is None:
+            return None
+
+        try:
+            block: dict = self.notion.blocks.retrieve(block_id=entry.block_id)  # type: ignore
+            if block.get("archived") or block.get("in_trash"):
+                self.notion.blocks.update(block_id=entry.block_id, archived=False)
+            return entry
+        except Exception as e:
+            # ブロックが完全に削除されている場合はインデックスから消して再アップロードする
+            self.logger.info(f"Block {entry.block_id} cannot be reused: {e}")
+            self.dedup_index.forget(entry)
+            return None
+
+    def _record_uploaded_files(self, page_id: str, uploaded: list[UploadedFile]):
+        """ページに添付したファイルを重複排除インデックスに記録します。"""
+        if not self.dedup_index:
+            return
+
+        for u in uploaded:
+            if u.content_hash and u.block_id:
+                self.dedup_index.record(
+                    DedupEntry(
+                        content_hash=u.content_hash,
+                        size=u.size,
+                        page_id=page_id,
+                        block_id=u.block_id,
+                        file_upload_id=u.file_upload_id,
+                        file_name=u.file_name,
                     )
+                )
 
-            # Step 3: Attach the file to a page or block
+    def _attach_uploaded_files(self, page_id: str, uploaded: list[UploadedFile]):
+        """
+        送信済みのファイルを、1回のブロック追加と1回のファイルプロパティ更新でページに添付します。
 
-            add_url = f"https://api.notion.com/v1/blocks/{page_id}/children"
+        引数:
+            page_id (str): 添付先のNotionページのID。
+            uploaded (list[UploadedFile]): 送信済みのファイル。添付したブロックのIDが block_id に設定されます。
 
-            add_headers = {
-                "Authorization": f"Bearer {self.token}",
-                "Content-Type": "application/json",
-                "Notion-Version": self.version,
-            }
+        例外:
+            Exception: ブロックの追加に失敗した場合に発生します。
+        """
+        self._append_file_blocks(page_id, uploaded)
+
+        # ファイルはブロックとしてページに添付済みで、重複排除インデックスにも記録済み。
+        # ここで例外を送出すると、再実行時はアップロード済みとしてスキップされプロパティは更新されないため、
+        # プロパティの更新に失敗した場合は警告のみとして処理を続行する
+        try:
+            self._add_files_to_property(page_id, uploaded)
+        except Exception as e:
+            self.logger.warning(f"Failed to attach file to property: {e}")
+
+    def _append_file_blocks(self, page_id: str, uploaded: list[UploadedFile]):
+        """
+        送信済みのファイルをブロックとしてページの末尾に追加します（1回のリクエストで100個まで）。
+        追加できたファイルは、その時点でジャーナルを削除し重複排除インデックスに記録します。
+
+        引数:
+            page_id (str): 添付先のNotionページのID。
+            uploaded (list[UploadedFile]): 送信済みのファイル。添付したブロックのIDが block_id に設定されます。
+
+        例外:
+            Exception: ブロックの追加に失敗した場合に発生します。
+        """
+        add_url = f"https://api.notion.com/v1/blocks/{page_id}/children"
+
+        add_headers = {
+            "Authorization": f"Bearer {self.token}",
+            "Content-Type": "application/json",
+            "Notion-Version": self.version,
+        }
+
+        # 1回のリクエストで追加できるブロックは100個まで
+        for i in range(0, len(uploaded), self.MAX_BLOCK_CHILDREN):
+            batch = uploaded[i : i + self.MAX_BLOCK_CHILDREN]
 
             # MIMEタイプによってdataが変わる
-            add_data = {
-                "children": [
-                    {
-                        "type": mime_type_info.file_type,
-                        mime_type_info.file_type: {
-                            "caption": [
-                                {
-                                    "type": "text",
-                                    "text": {"content": file_name, "link": None},
-                                    "annotations": {
-                                        "bold": False,
-                                        "italic": False,
-                                        "strikethrough": False,
-                                        "underline": False,
-                                        "code": False,
-                                        "color": "default",
-                                    },
-                                    "plain_text": file_name,
-                                    "href": "null",
-                                }
-                            ],
-                            "type": "file_upload",
-                            "file_upload": {"id": file_upload_id},
-                        },
-                    }
-                ]
-            }
+            add_data = {"children": [self._build_file_block(u) for u in batch]}
 
             # ページの末尾にファイルを添付する
-            add_response = requests.patch(
+            add_response = self._request(
+                "PATCH",
                 add_url,
                 headers=add_headers,
                 data=json.dumps(add_data),
@@ -459,52 +920,250 @@ class MyNotionHelper:
                     f"Failed to attach file to page with status code {add_response.status_code}: {add_response.text}"
                 )
 
-            # ページのプロパティにファイルプロパティが存在すれば、アップロードしたファイルをそこにも添付する
-            try:
-                # ページの詳細情報を取得してファイルプロパティ名を検索
-                page_info: dict = self.notion.pages.retrieve(page_id=page_id)  # type: ignore
-                file_property_name = None
-                for prop_name, prop in page_info.get("properties", {}).items():
-                    # Notion APIでは Files & Media プロパティの type は "files"
-                    if isinstance(prop, dict) and prop.get("type") == "files":
-                        file_property_name = prop_name
-                        break
+            # 追加したブロックのIDを記録する
+            blocks = json.loads(add_response.text).get("results", [])
+            for u, block in zip(batch, blocks[-len(batch) :]):
+                u.block_id = block.get("id")
 
-                # ファイルプロパティがあれば、そのプロパティにもファイルを添付する
-                if file_property_name:
-                    # 既存のファイルリストを取得（存在しない場合は空のリスト）
-                    existing_files = []
-                    prop = page_info["properties"].get(file_property_name, {})
-                    if isinstance(prop, dict) and "files" in prop:
-                        existing_files = prop["files"]
-
-                    # 今回アップロードしたファイルのエントリを作成
-                    new_file_entry = {
-                        "type": "file_upload",
-                        "name": file_name,
-                        "file_upload": {"id": file_upload_id},
-                    }
+            # ページへの添付が完了したのでジャーナルは不要
+            for u in batch:
+                if u.journal:
+                    u.journal.remove()
 
-                    # 既存のファイルに新しいファイルを追加
-                    updated_file_list = existing_files + [new_file_entry]
+            # 後続の処理が失敗しても、再実行時に同じブロックを追加しないよう記録しておく
+            self._record_uploaded_files(page_id, batch)
+
+    def _add_files_to_property(self, page_id: str, uploaded: list[UploadedFile]):
+        """
+        ページのプロパティにファイルプロパティが存在すれば、アップロードしたファイルをそこにも添付します。
 
-                    # プロパティを更新
-                    update_properties = {
-                        file_property_name: {"files": updated_file_list}
+        引数:
+            page_id (str): 添付先のNotionページのID。
+            uploaded (list[UploadedFile]): ページに添付したファイル。
+
+        例外:
+            Exception: ページの取得またはプロパティの更新に失敗した場合に発生します。
+        """
+        # ページの詳細情報を取得してファイルプロパティ名を検索
+        page_info: dict = self.notion.pages.retrieve(page_id=page_id)  # type: ignore
+        file_property_name = None
+        for prop_name, prop in page_info.get("properties", {}).items():
+            # Notion APIでは Files & Media プロパティの type は "files"
+            if isinstance(prop, dict) and prop.get("type") == "files":
+                file_property_name = prop_name
+                break
+
+        # ファイルプロパティがなければ何もしない
+        if not file_property_name:
+            return
+
+        # 既存のファイルリストを取得（存在しない場合は空のリスト）
+        existing_files = []
+        prop = page_info["properties"].get(file_property_name, {})
+        if isinstance(prop, dict) and "files" in prop:
+            existing_files = prop["files"]
+
+        # 今回アップロードしたファイルのエントリを作成
+        new_file_entries = [
+            {
+                "type": "file_upload",
+                "name": u.file_name,
+                "file_upload": {"id": u.file_upload_id},
+            }
+            for u in uploaded
+        ]
+
+        # 既存のファイルに新しいファイルを追加
+        updated_file_list = existing_files + new_file_entries
+
+        # プロパティを更新
+        update_properties = {file_property_name: {"files": updated_file_list}}
+
+        # Notion クライアントを使ってプロパティを更新
+        self.notion.pages.update(page_id=page_id, properties=update_properties)
+
+    @staticmethod
+    def _build_file_block(uploaded: UploadedFile) -> dict:
+        """送信済みのファイルをページに添付するためのブロックを作成します。"""
+        file_type = uploaded.mime_type_info.file_type
+        return {
+            "type": file_type,
+            file_type: {
+                "caption": [
+                    {
+                        "type": "text",
+                        "text": {"content": uploaded.file_name, "link": None},
+                        "annotations": {
+                            "bold": False,
+                            "italic": False,
+                            "strikethrough": False,
+                            "underline": False,
+                            "code": False,
+                            "color": "default",
+                        },
+                        "plain_text": uploaded.file_name,
+                        "href": "null",
                     }
+                ],
+                "type": "file_upload",
+                "file_upload": {"id": uploaded.file_upload_id},
+            },
+        }
 
-                    # Notion クライアントを使ってプロパティを更新
-                    self.notion.pages.update(
-                        page_id=page_id, properties=update_properties
-                    )
+    def _load_resumable_journal(self, file_path: str) -> UploadJournal | None:
+        """
+        中断されたアップロードのジャーナルを読み込み、Notion側でまだ再開可能かを確認します。
+        再開できない（期限切れなど）場合はジャーナルを削除してNoneを返します。
 
-            except Exception as e:
-                # プロパティへの添付に失敗した場合はログに記録しますが、ページへの添付は成功しているため処理を続行
-                self.logger.warning(f"Failed to attach file to property: {e}")
-                raise
+        引数:
+            file_path (str): アップロード対象のファイルパス。
 
-        except Exception as e:
-            self.logger.error(f"Notionへのアップロードに失敗しました: {e}")
+        戻り値:
+            UploadJournal | None: 再開可能なジャーナル。
+        """
+        journal = UploadJournal.load(file_path)
+        if journal is None:
+            # 壊れた・古いジャーナルが残っていれば削除する
+            stale_path = UploadJournal.journal_path(file_path)
+            if os.path.exists(stale_path):
+                os.remove(stale_path)
+            return None
+
+        response = self._request(
+            "GET",
+            f"https://api.notion.com/v1/file_uploads/{journal.file_upload_id}",
+            headers={
+                "Authorization": f"Bearer {self.token}",
+                "accept": "application/json",
+                "Notion-Version": self.version,
+            },
+        )
+        status = (
+            json.loads(response.text).get("status")
+            if response.status_code == 200
+            else None
+        )
+
+        if status == "pending":
+            return journal
+        if status == "uploaded":
+            # /complete まで終わっている場合はページへの添付だけ行う
+            journal.completed = True
+            return journal
+
+        self.logger.info(
+            f"File upload ID {journal.file_upload_id} cannot be resumed (status: {status}). Starting over."
+        )
+        journal.remove()
+        return None
+
+    @staticmethod
+    def _iter_file_parts(
+        file_path: str,
+        part_size: int,
+        skip_parts: set[int] | None = None,
+        hasher: "hashlib._Hash | None" = None,
+    ) -> Iterator[tuple[int, bytes]]:
+        """
+        ファイルを先頭から part_size ごとに読み込み、(パート番号, データ) を順に返します。
+        読み込みは呼び出し側が次のパートを要求した時点で行われます。
+
+        引数:
+            file_path (str): 読み込むファイルのパス。
+            part_size (int): 1パートあたりのバイト数。
+            skip_parts (set[int] | None): 読み飛ばすパート番号（送信済みのパートなど）。
+            hasher (hashlib._Hash | None): 指定した場合、読み込んだデータを順に渡してハッシュを計算します。
+
+        戻り値:
+            Iterator[tuple[int, bytes]]: 1始まりのパート番号とパートのデータ。
+        """
+        skip_parts = skip_parts or set()
+        with open(file_path, "rb") as f:
+            part_number = 1
+            while True:
+                if part_number in skip_parts:
+                    # 読み込まずにシークだけ進める
+                    f.seek(part_size, os.SEEK_CUR)
+                    if f.tell() >= os.fstat(f.fileno()).st_size:
+                        break
+                    part_number += 1
+                    continue
+
+                chunk = f.read(part_size)
+                if not chunk:
+                    break
+                if hasher:
+                    hasher.update(chunk)
+                yield part_number, chunk
+                part_number += 1
+
+    def _create_part_pool(self) -> _PartUploadPool:
+        """
+        パートの送信に使うプールを作成します。
+        自動調整が有効な場合、ウィンドウ（並列数）はアップロード中に変化します。
+        """
+        if self.tuner:
+            tuner = self.tuner
+            return _PartUploadPool(tuner.max_concurrency, lambda: tuner.concurrency)
+        return _PartUploadPool(self.max_workers, lambda: self.upload_window)
+
+    def _upload_parts_streaming(
+        self,
+        parts: Iterable[tuple[int, bytes]],
+        upload_part: Callable[[int, bytes], None],
+        part_pool: _PartUploadPool | None = None,
+    ):
+        """
+        パートを遅延読み込みしながら並列にアップロードします。
+        送信中（未完了）のパートは最大 upload_window 個（自動調整時はその時点の並列数）までとし、
+        上限に達した場合はいずれかのパートの送信完了を待ってから次のパートを読み込みます。
+
+        引数:
+            parts (Iterable[tuple[int, bytes]]): (パート番号, データ) のイテラブル。
+            upload_part (Callable[[int, bytes], None]): 1パートをアップロードする関数。
+            part_pool (_PartUploadPool | None): 他のファイルと共有するパートの送信プール。
+                共有する場合、上限は全ファイルの送信中のパートの合計に対して適用されます。
+
+        例外:
+            Exception: いずれかのパートのアップロードに失敗した場合、その例外を送出します。
+        """
+        if part_pool is None:
+            with self._create_part_pool() as part_pool:
+                self._upload_parts_streaming(parts, upload_part, part_pool)
+            return
+
+        in_flight: set[concurrent.futures.Future] = set()
+        parts_iter = iter(parts)
+        try:
+            while True:
+                # ウィンドウが埋まっていれば、どれかのパートが終わるまで次を読み込まない
+                part_pool.acquire()
+                try:
+                    # 失敗したパートがあればここで例外を送出
+                    for future in [f for f in in_flight if f.done()]:
+                        in_flight.discard(future)
+                        future.result()
+                    part = next(parts_iter, None)
+                except BaseException:
+                    part_pool.release()
+                    raise
+
+                if part is None:
+                    part_pool.release()
+                    break
+                part_number, chunk = part
+                future = part_pool.executor.submit(upload_part, part_number, chunk)
+                future.add_done_callback(lambda _: part_pool.release())
+                in_flight.add(future)
+
+            # 残りのパートの完了を待つ
+            for future in concurrent.futures.as_completed(in_flight):
+                future.result()
+
+        except Exception:
+            # 未着手のパートは送信しない
+            for future in in_flight:
+                future.cancel()
             raise
 
     def add_music_info_to_db(
@@ -576,7 +1235,13 @@ class MyNotionHelper:
         # End of upload_file method
 
     # 指定したNotionページに動画をアップロードする関数（5GiB超え分割機能有）
-    def upload_video(self, page_id: str, file_path: str):
+    def upload_video(
+        self,
+        page_id: str,
+        file_path: str,
+        pipelined: bool = False,
+        media_info: MediaInfo | None = None,
+    ):
         """
         指定したNotionページに動画をアップロードします。
         5GiBを超える動画はFFMPEGで分割してアップロードします。
@@ -584,6 +1249,11 @@ class MyNotionHelper:
         引数:
             page_id (str): ファイルをアップロードするNotionページのID。
             file_path (str): アップロードするファイルのパス。
+            pipelined (bool): Trueの場合、分割したパートを切り出しが終わった順にすぐアップロードし、
+                送信したパートのファイルは削除します（分割とアップロードを並行して行う）。
+                ページへの添付は最後にまとめて行います。
+            media_info (MediaInfo | None): MyFfmpegHelper.probe で取得済みの情報。
+                キーフレームインデックスがキャッシュ済みであれば、分割時にffprobeを実行しません。
 
         例外:
             Exception: ファイルアップロードに失敗した場合に発生します。
@@ -600,15 +1270,112 @@ class MyNotionHelper:
         # ファイルサイズが5GiBを超えていたらファイルを分割する
         if os.path.getsize(file_path) > 5 * 1024 * 1024 * 1024:
             split_size = (5 * 1024**3) - (1024**2 * 100)  # 5GiBとマージン
+            if pipelined:
+                self._upload_video_pipelined(
+                    page_id, file_path, split_size, media_info=media_info
+                )
+                return
+
             files = MyFfmpegHelper.split_video_lossless_by_keyframes(
-                file_path, split_size_bytes=split_size
+                file_path, split_size_bytes=split_size, media_info=media_info
             )
         else:
             files.append(file_path)
 
-        # files分、ファイルをアップロードする
-        for file in files:
-            self.upload_file(page_id, file)
+        # files分のファイルを並列に送信し、まとめてページに添付する
+        self.upload_files(page_id, files)
+
+    def _upload_video_pipelined(
+        self,
+        page_id: str,
+        file_path: str,
+        split_size: int,
+        parts_ahead: int = 1,
+        media_info: MediaInfo | None = None,
+    ):
+        """
+        動画の分割とアップロードを並行して行います。
+        別スレッドでffmpegのsegmentマルチプレクサが入力を1回だけ読んでパートを切り出し、
+        切り出しが終わったパートから順に送信して、送信したパートのファイルは削除します。
+        ページへの添付は、最後に upload_files と同じく1回のブロック追加と1回のファイルプロパティ更新でまとめて行います。
+        失敗した場合も、送信できたパートはページに添付し、切り出し済みのパートのファイルは
+        切り出しスレッドの終了を待ってから削除します。
+
+        引数:
+            page_id (str): ファイルをアップロードするNotionページのID。
+            file_path (str): 分割してアップロードする動画のパス。
+            split_size (int): 各パートの目標サイズ（バイト）。
+            parts_ahead (int): 送信待ちとして受け取っておくパート数の上限。
+            media_info (MediaInfo | None): MyFfmpegHelper.probe で取得済みの情報。
+
+        例外:
+            Exception: 分割またはアップロードに失敗した場合に発生します。
+        """
+        parts: queue.Queue[str | Exception | None] = queue.Queue(maxsize=parts_ahead)
+        stop = threading.Event()
+        # 切り出したパートのパス（失敗時に残っているものを削除する）
+        cut_files: list[str] = []
+        # 送信したパート（最後にまとめてページに添付する）
+        uploaded: list[UploadedFile] = []
+
+        def put(item: str | Exception | None) -> bool:
+            # アップロード側が止まった場合にブロックし続けないよう、停止を確認しながら待つ
+            while not stop.is_set():
+                try:
+                    parts.put(item, timeout=1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def cut_parts():
+            try:
+                # segmentマルチプレクサは完成したパートを1つずつ返すため、入力を1回読むだけで済む
+                for part in MyFfmpegHelper.iter_split_video_lossless_by_keyframes(
+                    file_path,
+                    split_size_bytes=split_size,
+                    logger=self.logger,
+                    mode="segment",
+                    media_info=media_info,
+                    # 送信に失敗したら、切り出し中のffmpegの終了を待たずに強制終了する
+                    cancel=stop,
+                ):
+                    cut_files.append(part)
+                    if not put(part):
+                        return
+            except Exception as e:
+                put(e)
+                return
+            put(None)
+
+        cutter = threading.Thread(target=cut_parts, daemon=True)
+        cutter.start()
+        try:
+            with self._create_part_pool() as part_pool:
+                while True:
+                    part = parts.get()
+                    if part is None:
+                        break
+                    if isinstance(part, Exception):
+                        raise part
+
+                    # 切り出し済みのパートを送信し、送信できたら削除する
+                    uploaded.append(self._send_file_contents(part, page_id, part_pool))
+                    os.remove(part)
+                    self.logger.info(f"Sent and removed part: {part}")
+        finally:
+            stop.set()
+            cutter.join()
+            # 送信待ち・送信中に失敗したパートを残さない
+            for part in cut_files:
+                if os.path.exists(part):
+                    os.remove(part)
+                    self.logger.info(f"Removed remaining part: {part}")
+
+            # 送信できたパートをまとめてページに添付する（アップロード済みで送信を省略したパートは添付済み）
+            to_attach = [u for u in uploaded if not u.skipped]
+            if to_attach:
+                self._attach_uploaded_files(page_id, to_attach)
 
     # ファイルパスを渡して拡張子からMIMEタイプを返す関数
     def get_mime_type_from_extension(self, file_path: str) -> MimeTypeInfo:
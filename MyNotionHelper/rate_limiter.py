@@ -0,0 +1,241 @@
+import logging
+import random
+import threading
+import time
+from collections.abc import Callable
+from typing import Protocol, TypeVar
+from urllib.parse import urlsplit
+
+import httpx
+
+
+class _Response(Protocol):
+    """requests.Response と httpx.Response の共通部分"""
+
+    status_code: int
+    headers: "httpx.Headers | dict"
+
+    def close(self) -> None: ...
+
+
+ResponseT = TypeVar("ResponseT", bound=_Response)
+
+# リトライ対象のステータスコード（429以外はサーバー側の一時的なエラー）
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# 5xx・通信エラーでもリトライしてよい（何度送っても結果が変わらない）HTTPメソッド
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "DELETE"}
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+    """
+    指数バックオフ（フルジッター）の待機秒数を返します。
+
+    引数:
+        attempt (int): 0始まりの試行回数。
+        base (float): 初回の待機秒数の上限。
+        cap (float): 待機秒数の上限。
+
+    戻り値:
+        float: 0 〜 min(cap, base × 2^attempt) のランダムな秒数。
+    """
+    return random.uniform(0, min(cap, base * (2**attempt)))
+
+
+def is_idempotent_request(method: str, url: str) -> bool:
+    """
+    5xx・通信エラーのときに再送してよいリクエストかを返します。
+
+    GET・DELETEなどに加えて、File Uploadのパート送信（/send）は同じパートを送り直しても
+    上書きされるだけなので対象とします。ページ作成やブロック追加などのPOST・PATCHは、
+    Notion側で処理が完了した後にエラーが返ると再送で重複するため対象外です。
+
+    引数:
+        method (str): HTTPメソッド。
+        url (str): リクエスト先のURL。
+
+    戻り値:
+        bool: 再送してよい場合はTrue。
+    """
+    if method.upper() in IDEMPOTENT_METHODS:
+        return True
+    path = urlsplit(url).path.rstrip("/")
+    return path.startswith("/v1/file_uploads/") and path.endswith("/send")
+
+
+def parse_retry_after(headers, default: float = 1.0) -> float:
+    """
+    Retry-After ヘッダーの秒数を返します。ヘッダーがない、または解釈できない場合は default を返します。
+    """
+    value = headers.get("Retry-After") if headers is not None else None
+    try:
+        return max(0.0, float(value)) if value is not None else default
+    except ValueError:
+        return default
+
+
+class NotionRateLimiter:
+    """
+    Notion APIへのリクエストを平準化するトークンバケット。
+    プロセス内のすべてのリクエスト（requests・notion_clientの両方）で共有して使います。
+
+    429を受けた場合は Retry-After の間すべての呼び出し元を待たせ、送信レートを半分に下げます。
+    成功が続くと少しずつ max_rate まで戻す（AIMD）ため、
+    長時間の送信レートはレート制限のすぐ下で落ち着きます。
+    """
+
+    def __init__(
+        self,
+        max_rate: float = 2.5,
+        burst: int = 3,
+        min_rate: float = 0.5,
+        increase_step: float = 0.05,
+        logger: logging.Logger = logging.getLogger(__name__),
+    ):
+        """
+        引数:
+            max_rate (float): 1秒あたりの最大リクエスト数。Notionの平均レート制限（3回/秒）に
+                達しないよう、少し下の値にしておきます。
+            burst (int): バケットに貯められるトークン数。
+            min_rate (float): 429を受けて下げる場合の下限レート。
+            increase_step (float): 成功1回ごとに戻すレート。
+            logger (logging.Logger): ロガー。
+        """
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.burst = burst
+        self.increase_step = increase_step
+        self.logger = logger
+        self.rate = max_rate
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        # 429で止めている間は補充しない（penalize で補充の起点を停止の終了時刻にしている）
+        if now < self._blocked_until:
+            return
+        elapsed = max(0.0, now - self._updated_at)
+        self._tokens = min(float(self.burst), self._tokens + elapsed * self.rate)
+        self._updated_at = now
+
+    def acquire(self):
+        """トークンを1つ取得します。取得できるまでブロックします。"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._blocked_until:
+                    wait = self._blocked_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                else:
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def penalize(self, retry_after: float):
+        """
+        429を受けたときに呼び出します。
+        retry_after 秒の間すべての呼び出し元を止め、送信レートを半分に下げます。
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._blocked_until = max(self._blocked_until, now + retry_after)
+            self._tokens = 0.0
+            self._updated_at = max(now, self._blocked_until)
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.logger.warning(
+                f"Notion API rate limited. Waiting {retry_after:.1f}s, rate -> {self.rate:.2f} req/s"
+            )
+
+    def on_success(self):
+        """リクエストが成功したときに呼び出し、送信レートを少しずつ戻します。"""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+    def call(
+        self,
+        send: Callable[[], ResponseT],
+        max_retries: int = 5,
+        retry_exceptions: tuple[type[BaseException], ...] = (),
+        idempotent: bool = True,
+    ) -> ResponseT:
+        """
+        レート制限に従ってリクエストを送信し、429・5xx・通信エラーの場合はリトライします。
+        429はNotionが処理せずに返すため常にリトライしますが、
+        5xx・通信エラーは再送してよいリクエスト（idempotent=True）の場合だけリトライします。
+
+        引数:
+            send (Callable[[], ResponseT]): リクエストを1回送信してレスポンスを返す関数。
+            max_retries (int): 最大リトライ回数。
+            retry_exceptions (tuple): リトライ対象とする通信エラーの例外クラス。
+            idempotent (bool): Falseの場合、5xxはそのまま返し、通信エラーはそのまま送出します。
+
+        戻り値:
+            ResponseT: 最後に受け取ったレスポンス。リトライ回数を使い切った場合もそのまま返します。
+
+        例外:
+            retry_exceptions: リトライ回数を使い切っても通信エラーが続いた場合。
+        """
+        for attempt in range(max_retries + 1):
+            self.acquire()
+            try:
+                response = send()
+            except retry_exceptions as e:
+                if not idempotent or attempt >= max_retries:
+                    raise
+                delay = backoff_delay(attempt)
+                self.logger.warning(f"Notion API request failed: {e}. Retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            retryable = response.status_code == 429 or (
+                idempotent and response.status_code in RETRY_STATUS_CODES
+            )
+            if not retryable or attempt >= max_retries:
+                if response.status_code < 400:
+                    self.on_success()
+                return response
+
+            response.close()
+            if response.status_code == 429:
+                # Retry-After の間は全呼び出し元を止める（待機は次の acquire で行う）
+                self.penalize(parse_retry_after(response.headers))
+            else:
+                delay = backoff_delay(attempt)
+                self.logger.warning(
+                    f"Notion API returned {response.status_code}. Retrying in {delay:.1f}s"
+                )
+                time.sleep(delay)
+
+        raise AssertionError("unreachable")
+
+
+class RateLimitedTransport(httpx.HTTPTransport):
+    """
+    notion_client.Client（httpx）のリクエストを NotionRateLimiter 経由で送信するトランスポート。
+    """
+
+    def __init__(self, limiter: NotionRateLimiter, max_retries: int = 5, **kwargs):
+        super().__init__(**kwargs)
+        self.limiter = limiter
+        self.max_retries = max_retries
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        return self.limiter.call(
+            lambda: super(RateLimitedTransport, self).handle_request(request),
+            max_retries=self.max_retries,
+            retry_exceptions=(httpx.TransportError,),
+            idempotent=is_idempotent_request(request.method, str(request.url)),
+        )
+
+
+# プロセス全体で共有するリミッター
+_default_rate_limiter = NotionRateLimiter()
+
+
+def get_default_rate_limiter() -> NotionRateLimiter:
+    """プロセス全体で共有する NotionRateLimiter を返します。"""
+    return _default_rate_limiter
@@ -0,0 +1,135 @@
+import json
+import os
+import threading
+from dataclasses import asdict, dataclass, field
+
+
+@dataclass
+class UploadJournal:
+    """
+    Notionへのマルチパートアップロードの進捗を記録するサイドカージャーナル。
+    プロセスが途中で終了しても、次回の実行時に未送信のパートだけを送れるようにします。
+
+    ジャーナルはアップロード対象ファイルと同じディレクトリに
+    「<ファイル名>.notion_upload.json」として保存されます。
+
+    属性:
+        file_path (str): アップロード対象のファイルパス。
+        file_upload_id (str): Notionのfile_upload ID。
+        part_size (int): 1パートあたりのバイト数。
+        number_of_parts (int): パートの総数。
+        file_size (int): 作成時点のファイルサイズ（ファイルの変更検知用）。
+        file_mtime_ns (int): 作成時点のファイル更新日時（ファイルの変更検知用）。
+        acknowledged_parts (list[int]): 送信が完了したパート番号のリスト。
+        completed (bool): /complete の呼び出しが完了しているかどうか。
+    """
+
+    JOURNAL_SUFFIX = ".notion_upload.json"
+
+    file_path: str
+    file_upload_id: str
+    part_size: int
+    number_of_parts: int
+    file_size: int
+    file_mtime_ns: int
+    acknowledged_parts: list[int] = field(default_factory=list)
+    completed: bool = False
+
+    def __post_init__(self):
+        self._lock = threading.Lock()
+
+    @classmethod
+    def journal_path(cls, file_path: str) -> str:
+        """ファイルパスに対応するジャーナルのパスを返します。"""
+        return f"{file_path}{cls.JOURNAL_SUFFIX}"
+
+    @classmethod
+    def create(
+        cls, file_path: str, file_upload_id: str, part_size: int, number_of_parts: int
+    ) -> "UploadJournal":
+        """
+        新しいジャーナルを作成してディスクに保存します。
+
+        引数:
+            file_path (str): アップロード対象のファイルパス。
+            file_upload_id (str): Notionのfile_upload ID。
+            part_size (int): 1パートあたりのバイト数。
+            number_of_parts (int): パートの総数。
+
+        戻り値:
+            UploadJournal: 作成したジャーナル。
+        """
+        stat = os.stat(file_path)
+        journal = cls(
+            file_path=file_path,
+            file_upload_id=file_upload_id,
+            part_size=part_size,
+            number_of_parts=number_of_parts,
+            file_size=stat.st_size,
+            file_mtime_ns=stat.st_mtime_ns,
+        )
+        journal.save()
+        return journal
+
+    @classmethod
+    def load(cls, file_path: str) -> "UploadJournal | None":
+        """
+        ファイルに対応するジャーナルを読み込みます。
+        ジャーナルが存在しない、壊れている、またはファイルが作成時点から変更されている場合はNoneを返します。
+
+        引数:
+            file_path (str): アップロード対象のファイルパス。
+
+        戻り値:
+            UploadJournal | None: 再開可能なジャーナル。
+        """
+        path = cls.journal_path(file_path)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            journal = cls(**data)
+        except (OSError, TypeError, ValueError):
+            return None
+
+        # ファイルが書き換えられていたら再開できない
+        stat = os.stat(file_path)
+        if (
+            journal.file_size != stat.st_size
+            or journal.file_mtime_ns != stat.st_mtime_ns
+        ):
+            return None
+
+        journal.file_path = file_path
+        return journal
+
+    def save(self):
+        """ジャーナルをディスクにアトミックに書き込みます。"""
+        path = self.journal_path(self.file_path)
+        tmp_path = f"{path}.tmp"
+        with self._lock:
+            data = asdict(self)
+            data["acknowledged_parts"] = sorted(data["acknowledged_parts"])
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+
+    def mark_part_done(self, part_number: int):
+        """パートの送信完了を記録します（複数スレッドから呼び出し可能）。"""
+        with self._lock:
+            if part_number not in self.acknowledged_parts:
+                self.acknowledged_parts.append(part_number)
+        self.save()
+
+    def mark_completed(self):
+        """/complete の呼び出し完了を記録します。"""
+        self.completed = True
+        self.save()
+
+    def remove(self):
+        """ジャーナルを削除します。"""
+        path = self.journal_path(self.file_path)
+        if os.path.exists(path):
+            os.remove(path)
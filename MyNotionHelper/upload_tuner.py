@@ -0,0 +1,205 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from dataclasses import asdict, dataclass
+
+MIB = 1024 * 1024
+
+
+@dataclass
+class UploadTuning:
+    """
+    マルチパートアップロードの設定値。
+
+    属性:
+        part_size (int): 1パートあたりのバイト数。
+        concurrency (int): 同時に送信するパート数。
+        bytes_per_sec (float): この設定で計測されたスループット（バイト/秒）。
+    """
+
+    part_size: int
+    concurrency: int
+    bytes_per_sec: float = 0.0
+
+
+class UploadTuner:
+    """
+    マルチパートアップロードのパートサイズと並列数を計測結果から自動調整するクラス。
+
+    - 並列数: アップロード中に一定数のパートが完了するごとにスループットを計測し、
+      改善していれば同じ方向に、悪化していれば逆方向に1ずつ動かす（山登り法）。
+      パートの送信に失敗した場合は半分に下げる。
+    - パートサイズ: Notionでは number_of_parts を作成時に宣言するため、1回のアップロード中は固定。
+      パートあたりの送信時間が短ければ大きく、長すぎる・失敗する場合は小さくして
+      次回のアップロードに反映する（Notionの許容範囲 5〜20MB に収める）。
+
+    選ばれた設定はホスト名ごとにJSONファイルへ記録され、次回のアップロードの初期値になります。
+    """
+
+    MIN_PART_SIZE: int = 5 * MIB
+    MAX_PART_SIZE: int = 20 * MIB
+    # パートあたりの送信時間の目標範囲（秒）
+    TARGET_PART_SECONDS: tuple[float, float] = (5.0, 30.0)
+
+    def __init__(
+        self,
+        state_path: str = "~/.cache/shortcuts_app/notion_upload_tuning.json",
+        host: str | None = None,
+        default: UploadTuning = UploadTuning(part_size=10 * MIB, concurrency=5),
+        min_concurrency: int = 1,
+        max_concurrency: int = 8,
+        logger: logging.Logger = logging.getLogger(__name__),
+    ):
+        """
+        引数:
+            state_path (str): 調整結果を記録するJSONファイルのパス。
+            host (str | None): 記録のキーにするホスト名。Noneの場合は実行中のホスト名。
+            default (UploadTuning): 記録がない場合の初期値。
+            min_concurrency (int): 並列数の下限。
+            max_concurrency (int): 並列数の上限。
+            logger (logging.Logger): ロガー。
+        """
+        self.state_path = os.path.expanduser(state_path)
+        self.host = host or socket.gethostname()
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.logger = logger
+        self._lock = threading.Lock()
+
+        recorded = self._load().get(self.host)
+        tuning = UploadTuning(**recorded) if recorded else default
+        self.part_size = self._clamp_part_size(tuning.part_size)
+        self.concurrency = self._clamp_concurrency(tuning.concurrency)
+        self._reset_measurements()
+
+    def _reset_measurements(self):
+        self._direction = 1
+        self._round_started_at = time.monotonic()
+        self._round_bytes = 0
+        self._round_parts = 0
+        self._last_round_bps = 0.0
+        self._best = UploadTuning(self.part_size, self.concurrency)
+        self._total_bytes = 0
+        self._total_seconds = 0.0
+        self._part_seconds: list[float] = []
+        self._failures = 0
+
+    def _clamp_part_size(self, part_size: int) -> int:
+        return max(self.MIN_PART_SIZE, min(self.MAX_PART_SIZE, int(part_size)))
+
+    def _clamp_concurrency(self, concurrency: int) -> int:
+        return max(self.min_concurrency, min(self.max_concurrency, int(concurrency)))
+
+    def _load(self) -> dict:
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def start(self, part_size: int | None = None):
+        """
+        アップロードの開始時に呼び出し、計測をリセットします。
+
+        引数:
+            part_size (int | None): 今回実際に使うパートサイズ（再開時などで記録と異なる場合）。
+        """
+        with self._lock:
+            if part_size is not None:
+                self.part_size = part_size
+            self._reset_measurements()
+
+    def record_part(self, nbytes: int, elapsed_sec: float, ok: bool = True):
+        """
+        1パートの送信結果を記録し、必要に応じて並列数を調整します（複数スレッドから呼び出し可能）。
+
+        引数:
+            nbytes (int): 送信したバイト数。
+            elapsed_sec (float): 送信にかかった秒数（リトライを含む）。
+            ok (bool): 送信に成功したかどうか。
+        """
+        with self._lock:
+            if not ok:
+                self._failures += 1
+                self.concurrency = self._clamp_concurrency(self.concurrency // 2)
+                self._direction = -1
+                self._start_round()
+                return
+
+            self._total_bytes += nbytes
+            self._total_seconds += elapsed_sec
+            self._part_seconds.append(elapsed_sec)
+            self._round_bytes += nbytes
+            self._round_parts += 1
+
+            # 並列数分（最低4パート）完了するごとにスループットを評価する
+            if self._round_parts < max(4, self.concurrency):
+                return
+
+            elapsed = time.monotonic() - self._round_started_at
+            bps = self._round_bytes / elapsed if elapsed > 0 else 0.0
+
+            if bps > self._best.bytes_per_sec:
+                self._best = UploadTuning(self.part_size, self.concurrency, bps)
+
+            # 悪化したら向きを反転する
+            if bps < self._last_round_bps * 0.95:
+                self._direction *= -1
+
+            previous = self.concurrency
+            self.concurrency = self._clamp_concurrency(self.concurrency + self._direction)
+            if self.concurrency == previous:
+                self._direction *= -1
+
+            self.logger.info(
+                f"Upload throughput {bps / MIB:.2f} MiB/s at concurrency {previous} -> {self.concurrency}"
+            )
+            self._last_round_bps = bps
+            self._start_round()
+
+    def _start_round(self):
+        self._round_started_at = time.monotonic()
+        self._round_bytes = 0
+        self._round_parts = 0
+
+    def finish(self) -> UploadTuning:
+        """
+        アップロードの終了時に呼び出し、次回のための設定をホストごとに記録します。
+
+        戻り値:
+            UploadTuning: 次回のアップロードで使う設定。
+        """
+        with self._lock:
+            best = self._best
+            part_size = self.part_size
+            low, high = self.TARGET_PART_SECONDS
+            if self._part_seconds:
+                average = sum(self._part_seconds) / len(self._part_seconds)
+                if self._failures or average > high:
+                    part_size = int(part_size / 1.5)
+                elif average < low:
+                    part_size = int(part_size * 1.5)
+
+            tuning = UploadTuning(
+                part_size=self._clamp_part_size(part_size),
+                concurrency=best.concurrency,
+                bytes_per_sec=best.bytes_per_sec,
+            )
+            self.part_size = tuning.part_size
+            self.concurrency = tuning.concurrency
+
+            state = self._load()
+            state[self.host] = asdict(tuning)
+            try:
+                os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+                tmp_path = f"{self.state_path}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(state, f, indent=2)
+                os.replace(tmp_path, self.state_path)
+            except OSError as e:
+                self.logger.warning(f"Failed to save upload tuning: {e}")
+
+            return tuning
@@ -6,7 +6,7 @@ from dataclasses import dataclass
 from dotenv import load_dotenv
 
 from MyLoggerHelper import MyLoggerHelper
-from MyNotionHelper import MyNotionHelper
+from MyNotionHelper import MyNotionHelper, UploadDedupIndex
 
 # ===== Config Begin ==========================================================
 # .envを読み込む
@@ -125,10 +125,12 @@ def main():
             raise Exception("環境変数が設定されていません。")
 
         # Notionクライアントのインスタンスを作成
+        # アップロード済みの同じ内容のファイルは再送しない
         notion = MyNotionHelper(
             token=NOTION_TOKEN,
             version=NOTION_VERSION,
             logger=logger,
+            dedup_index=UploadDedupIndex(),
         )
 
         # データベースからアイテムを取得
@@ -214,7 +216,9 @@ def main():
                     )
                     # notion.upload_file(item["id"], video_info.video_filepath)
                     # 試しに動画を分割してアップロードできる版にしてみる
-                    notion.upload_video(item["id"], video_info.video_filepath)
+                    notion.upload_video(
+                        item["id"], video_info.video_filepath, pipelined=True
+                    )
                     logger.info(
                         f"✅ ファイル「{video_info.video_filepath}」の動画のアップロードが完了しました。"
                     )
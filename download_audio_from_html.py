@@ -1,9 +1,12 @@
 import argparse
+import itertools
 import os
 
 import requests
 
 from AudioInfoExtractor import get_extractor
+from MyFfmpegHelper.cover_cache import CoverImageCache
+from MyFfmpegHelper.id3_tag import empty_id3_tag, estimate_tag_size, looks_like_mp3
 from MyFfmpegHelper.my_ffmpeg_helper import FfmpegMetadata, MyFfmpegHelper
 from MyLoggerHelper.my_logger_helper import MyLoggerHelper
 from MyPathHelper.my_path_helper import MyPathHelper
@@ -11,8 +14,68 @@ from MyPathHelper.my_path_helper import MyPathHelper
 # --- メイン処理 ---
 
 
-def download_audio_from_html(html_path, domain, download_dir, *, logger):
-    """HTMLファイルから音声ファイルをダウンロードし、メタデータを付与する"""
+def download_and_tag_in_place(chunks, final_filepath, metadata, cover_path, *, logger):
+    """
+    音声を最終ファイルと同じディレクトリの一時ファイルに保存し、ID3タグをその場で書き込む。
+    完了した時点で最終ファイルに置き換えるため、失敗しても途中までのファイルは最終ファイル名で残らない。
+    """
+    # 拡張子でタグの書き込み方法が決まるため、拡張子は変えない
+    root, ext = os.path.splitext(final_filepath)
+    temp_filepath = f"{root}.part{ext}"
+    try:
+        with open(temp_filepath, "wb") as f:
+            first_chunk = True
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                # ID3タグがない場合は、先頭にタグ用の領域を確保しておく
+                if first_chunk and not chunk.startswith(b"ID3"):
+                    cover_size = os.path.getsize(cover_path) if cover_path else 0
+                    f.write(empty_id3_tag(estimate_tag_size(metadata, cover_size)))
+                first_chunk = False
+                f.write(chunk)
+        logger.info("ダウンロードが完了しました。")
+
+        MyFfmpegHelper.tag_audio_in_place(
+            temp_filepath,
+            metadata=metadata,
+            cover_path=cover_path,
+            logger=logger,
+        )
+        os.replace(temp_filepath, final_filepath)
+    finally:
+        if os.path.exists(temp_filepath):
+            os.remove(temp_filepath)
+
+
+def download_and_embed_via_file(chunks, final_filepath, metadata, cover_path, *, logger):
+    """音声を一時ファイルに保存してから、ffmpegでメタデータを付与する"""
+    temp_filepath = os.path.join(os.path.dirname(final_filepath), "temp_audio.mp3")
+    logger.info(f"音声ファイルを一時ファイルとしてダウンロードしています: {temp_filepath}")
+    try:
+        with open(temp_filepath, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        logger.info("ダウンロードが完了しました。")
+
+        MyFfmpegHelper.embed_metadata(
+            input_path=temp_filepath,
+            output_path=final_filepath,
+            metadata=metadata,
+            cover_path=cover_path,
+            logger=logger,
+        )
+    finally:
+        if os.path.exists(temp_filepath):
+            os.remove(temp_filepath)
+
+
+def download_audio_from_html(html_path, domain, download_dir, *, logger, stream=True):
+    """
+    HTMLファイルから音声ファイルをダウンロードし、メタデータを付与する
+
+    stream=True の場合は一時ファイルを作らず、ダウンロードしながら最終ファイルだけを書き出す。
+    """
     logger.info(f"HTMLファイルのパス: {html_path}")
     logger.info(f"ドメイン: {domain}")
     logger.info(f"ダウンロード先ディレクトリ: {download_dir}")
@@ -35,58 +98,57 @@ def download_audio_from_html(html_path, domain, download_dir, *, logger):
             logger.error("音声情報の取得に失敗しました。")
             return
 
+        cover_cache = CoverImageCache(logger=logger)
         for audio_info in audio_info_list:
-            # --- ダウンロードとffmpeg処理 ---
             sanitized_program = MyPathHelper.sanitize_filepath(audio_info.program_name)
             sanitized_episode = MyPathHelper.sanitize_filepath(audio_info.episode_title)
-            temp_filename = "temp_audio.mp3"
             if audio_info.broadcast_date:
                 final_filename = (
                     f"{sanitized_program}_{audio_info.broadcast_date}_{sanitized_episode}.mp3"
                 )
             else:
                 final_filename = f"{sanitized_program}_{sanitized_episode}.mp3"
-            temp_filepath = os.path.join(download_dir, temp_filename)
             final_filepath = os.path.join(download_dir, final_filename)
 
-            logger.info(
-                f"音声ファイルを一時ファイルとしてダウンロードしています: {temp_filepath}"
-            )
-            response = requests.get(audio_info.audio_src, stream=True)
-            response.raise_for_status()
-            with open(temp_filepath, "wb") as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            logger.info("ダウンロードが完了しました。")
-
-            # --- ffmpeg処理 ---
             metadata: FfmpegMetadata = {
                 "title": audio_info.episode_title,
                 "artist": audio_info.artist_name,
                 "album": audio_info.program_name,
             }
 
-            temp_cover_path = None
+            # カバー画像は先に取得し、タグに必要な領域を見積もる
+            # （同じ番組の画像はキャッシュ済みのJPEGを使い、ダウンロード・変換しない）
+            cover_path = None
             if audio_info.cover_image_url:
-                temp_cover_path = os.path.join(download_dir, "temp_cover.jpg")
-                logger.info(f"カバー画像をダウンロードしています: {temp_cover_path}")
-                cover_res = requests.get(audio_info.cover_image_url)
-                with open(temp_cover_path, "wb") as f:
-                    f.write(cover_res.content)
-
-            MyFfmpegHelper.embed_metadata(
-                input_path=temp_filepath,
-                output_path=final_filepath,
-                metadata=metadata,
-                cover_path=temp_cover_path,
-                logger=logger,
-            )
-
-            # 一時ファイルを削除
-            if temp_cover_path and os.path.exists(temp_cover_path):
-                os.remove(temp_cover_path)
-            if os.path.exists(temp_filepath):
-                os.remove(temp_filepath)
+                cover_path = cover_cache.get(audio_info.cover_image_url)
+
+            logger.info(f"音声ファイルをダウンロードしています: {audio_info.audio_src}")
+            response = requests.get(audio_info.audio_src, stream=True)
+            response.raise_for_status()
+            chunks = response.iter_content(chunk_size=64 * 1024)
+
+            if not stream:
+                # 一時ファイルに保存してからffmpegでタグを付ける
+                download_and_embed_via_file(
+                    chunks, final_filepath, metadata, cover_path, logger=logger
+                )
+            else:
+                first_chunk = next((chunk for chunk in chunks if chunk), b"")
+                body = itertools.chain([first_chunk], chunks)
+                if looks_like_mp3(first_chunk):
+                    # MP3はそのまま保存し、ヘッダー領域だけを書き換えてタグを付ける
+                    download_and_tag_in_place(
+                        body, final_filepath, metadata, cover_path, logger=logger
+                    )
+                else:
+                    # MP3以外はダウンロードしながらffmpegの標準入力に流し込み、最終ファイルだけを書き出す
+                    MyFfmpegHelper.embed_metadata_from_stream(
+                        body,
+                        output_path=final_filepath,
+                        metadata=metadata,
+                        cover_path=cover_path,
+                        logger=logger,
+                    )
 
             logger.info(f"処理が完了し、最終ファイルを保存しました: {final_filepath}")
 
@@ -102,13 +164,18 @@ if __name__ == "__main__":
     parser.add_argument(
         "--domain",
         required=True,
-        help="HTMLファイルの取得元ドメイン (例: audee.jp)",
+        help="HTMLファイルの取得元のURLまたはドメイン (例: https://audee.jp/voice/xxx, audee.jp)",
     )
     parser.add_argument(
         "--download_dir",
         default=".",
         help="ダウンロード先のディレクトリ (デフォルト: カレントディレクトリ)",
     )
+    parser.add_argument(
+        "--no-stream",
+        action="store_true",
+        help="音声を一時ファイルに保存してからメタデータを付与する（ストリーミングで処理できない場合用）",
+    )
     args = parser.parse_args()
 
     # 入力パスの検証
@@ -125,6 +192,12 @@ if __name__ == "__main__":
     # loggerを作成
     logger = MyLoggerHelper.setup_logger(__name__, download_directory)
 
-    download_audio_from_html(args.html, args.domain, download_directory, logger=logger)
+    download_audio_from_html(
+        args.html,
+        args.domain,
+        download_directory,
+        logger=logger,
+        stream=not args.no_stream,
+    )
 
     exit(0)
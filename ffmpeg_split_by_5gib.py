@@ -4,7 +4,7 @@ import sys
 
 from dotenv import load_dotenv
 
-from MyFfmpegHelper import MyFfmpegHelper
+from MyFfmpegHelper import MyFfmpegHelper, ProgressMonitor
 from MyLoggerHelper import MyLoggerHelper
 
 # ===== 前提条件 ==============================================================
@@ -60,8 +60,10 @@ def main(argv=None) -> int:
 
         logger.info(f"split_size = {split_size}")
 
+        # 進捗とETAを30秒ごとにログに出力し、2分間進まない場合は警告する
+        progress = ProgressMonitor(log_interval=30, stall_timeout=120, logger=logger)
         MyFfmpegHelper.split_video_lossless_by_keyframes(
-            file, split_size_bytes=split_size, logger=logger
+            file, split_size_bytes=split_size, logger=logger, progress=progress
         )
 
         return 0
@@ -1,5 +1,8 @@
+import json
 import logging
 import os
+import subprocess
+import sys
 from unittest.mock import Mock
 
 import pytest
@@ -10,8 +13,10 @@ from AudioInfoExtractor import (
     BitfanInfoExtractor,
     JfnPodsInfoExtractor,
     OmnyInfoExtractor,
+    find_page_url,
     get_extractor,
 )
+from AudioInfoExtractor import json_backend
 
 # print用logger
 logger = logging.getLogger(__name__)
@@ -230,3 +235,229 @@ def test_jfn_pods_info_extractor(mock_logger):
     assert audio_info.cover_image_url == "https://jfn-pods.com/image/example.avif?min=600"
     assert audio_info.audio_src == "https://cf.audee.jp/episode/40889/YF7GUMWdLU/tBQdV5tpTa_001.mp3"
     assert audio_info.broadcast_date == "20260314"
+
+
+AUDEE_HTML = """
+<html>
+  <head>
+    <meta property="og:image" content="https://audee.jp/cover.jpg" />
+    <script type="application/ld+json">[{"audio": [
+      {"name": "第1回 前半", "contentUrl": "https://cf.audee.jp/1.mp3", "uploadDate": "2022-07-09T10:00:00+09:00"},
+      {"name": "第1回 後半", "contentUrl": "https://cf.audee.jp/2.mp3", "uploadDate": "2022-07-09T10:00:00+09:00"}
+    ]}]</script>
+  </head>
+  <body>
+    <div class="wrapper">
+      <h2 class="box-program-ttl ttl-cmn-lev1"><a href="/program">山田太郎のオールナイト</a></h2>
+      <p>本文</p>
+    </div>
+  </body>
+</html>
+"""
+
+BITFAN_HTML = """
+<html>
+  <head><meta property="og:site_name" content="ファンクラブ" /></head>
+  <body>
+    <h1 class="p-clubArticle__name">#10 ゲスト回</h1>
+    <div class="p-clubArticle__thumb"><img src="https://bitfan.net/thumb.jpg" /></div>
+    <div class="p-clubArticle__content">
+      <div class="c-clubWysiwyg"><p>パーソナリティ：山田太郎、鈴木花子（ゲスト）</p></div>
+    </div>
+    <audio controls><source src="https://bitfan.net/audio.mp3?a=1&amp;b=2" /></audio>
+  </body>
+</html>
+"""
+
+
+@pytest.mark.parametrize(
+    "extractor_class, html, skipped_selector",
+    [
+        (AudeeInfoExtractor, AUDEE_HTML, "div.wrapper"),
+        (BitfanInfoExtractor, BITFAN_HTML, "audio"),
+    ],
+)
+def test_parse_targets_give_same_result_as_full_parse(
+    mock_logger, extractor_class, html, skipped_selector
+):
+    """lxmlで必要な要素だけをパースしても、html.parserで全体をパースした結果と一致することをテスト"""
+    full = extractor_class(
+        mock_logger, parser="html.parser", only_targets=False, fast_path=False
+    )
+    targeted = extractor_class(
+        mock_logger, parser="lxml", only_targets=True, fast_path=False
+    )
+
+    expected = full.get_audio_info(html)
+    assert expected
+    assert targeted.get_audio_info(html) == expected
+    # 対象外の要素は生成しない
+    assert targeted._make_soup(html).select_one(skipped_selector) is None
+
+
+def test_audee_fast_path_skips_dom(mock_logger, monkeypatch):
+    """必要な情報が揃う場合は、DOMを作らずに同じ結果を返すことをテスト"""
+    expected = AudeeInfoExtractor(
+        mock_logger, parser="html.parser", only_targets=False, fast_path=False
+    ).get_audio_info(AUDEE_HTML)
+
+    extractor = AudeeInfoExtractor(mock_logger)
+    monkeypatch.setattr(
+        extractor, "_make_soup", Mock(side_effect=AssertionError("DOMを作成しました"))
+    )
+    assert extractor.get_audio_info(AUDEE_HTML) == expected
+
+
+def test_audee_falls_back_to_dom_when_fast_path_is_incomplete(mock_logger):
+    """走査で番組名が取れない場合は、DOMから取得することをテスト"""
+    # 見出しのリンクの中に同じタグが入れ子になっていて、走査では扱えない
+    html = AUDEE_HTML.replace(
+        '<h2 class="box-program-ttl ttl-cmn-lev1"><a href="/program">山田太郎のオールナイト</a></h2>',
+        '<!-- <script type="application/ld+json">{"audio": {"contentUrl": "x"}}</script> -->'
+        '<h2 class="box-program-ttl ttl-cmn-lev1"><span><h2>番組</h2></span>'
+        '<a href="/program">山田太郎のオールナイト</a></h2>',
+    )
+    extractor = AudeeInfoExtractor(mock_logger)
+
+    audio_infos = extractor.get_audio_info(html)
+
+    assert [info.audio_src for info in audio_infos] == [
+        "https://cf.audee.jp/1.mp3",
+        "https://cf.audee.jp/2.mp3",
+    ]
+    assert audio_infos[0].program_name == "山田太郎のオールナイト"
+    assert audio_infos[0].artist_name == "山田太郎"
+
+
+def test_json_extract_path_stops_after_target():
+    """目的の値を読んだ後の部分は読まないことをテスト"""
+    # clipより後ろは壊れているが、読まないためエラーにならない
+    text = ' {"props": {"pageProps": {"program": {"Clips": [1, 2]}, "clip": {"Title": "t"}, "broken": '
+
+    assert json_backend.extract_path(text, ("props", "pageProps", "clip")) == {"Title": "t"}
+    assert json_backend.extract_path('{"props": {"page": 1}}', ("props", "pageProps")) is None
+    assert json_backend.extract_path('{"props": []}', ("props", "pageProps")) is None
+
+
+def test_json_extract_path_strict_mode():
+    """厳密モードでは制御文字を含む文字列をエラーにし、緩和モードでは読めることをテスト"""
+    text = '{"props": {"pageProps": {"desc": "1行目\n2行目", "clip": {"Title": "t"}}}}'
+
+    with pytest.raises(json.JSONDecodeError):
+        json_backend.extract_path(text, ("props", "pageProps", "clip"))
+    assert json_backend.extract_path(
+        text, ("props", "pageProps", "clip"), strict=False
+    ) == {"Title": "t"}
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_json_loads_matches_stdlib(monkeypatch, use_orjson):
+    """どちらのバックエンドでも標準のjsonと同じ結果・エラーになることをテスト"""
+    if use_orjson:
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(json_backend, "orjson", None)
+
+    for text in ['{"a": [1, 2.5, "x"]}', '{"big": 123456789012345678901234567890}', "[NaN]"]:
+        assert repr(json_backend.loads(text)) == repr(json.loads(text))
+    with pytest.raises(json.JSONDecodeError):
+        json_backend.loads("{broken")
+
+
+def test_get_extractor_accepts_urls_and_subdomains(mock_logger):
+    """URL・サブドメインからExtractorを選び、同じインスタンスを使い回すことをテスト"""
+    extractor = get_extractor("https://www.audee.jp/voice/123?x=1", mock_logger)
+
+    assert isinstance(extractor, AudeeInfoExtractor)
+    assert get_extractor("AUDEE.JP:443", mock_logger) is extractor
+    assert get_extractor("audee.jp", mock_logger, fast_path=False) is not extractor
+    # ホスト名の途中に含まれるだけのドメインには一致しない
+    assert get_extractor("audee.jp.example.com", mock_logger) is None
+    assert get_extractor("https://example.com/?u=omny.fm", mock_logger) is None
+
+
+def test_extractor_modules_are_imported_lazily():
+    """Extractorのモジュールは最初に使うときに読み込まれることをテスト"""
+    code = (
+        "import sys, AudioInfoExtractor as a\n"
+        "base = 'AudioInfoExtractor.audio_info_extractor'\n"
+        "loaded = lambda: sorted(m for m in sys.modules if m.endswith('_info_extractor') and m != base)\n"
+        "print(loaded())\n"
+        "a.get_extractor('https://omny.fm/shows/x')\n"
+        "print(loaded())\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=os.path.dirname(os.path.dirname(__file__)),
+    )
+
+    assert result.stdout.splitlines() == [
+        "[]",
+        "['AudioInfoExtractor.omny_info_extractor']",
+    ]
+
+
+def test_find_page_url():
+    """保存されたHTMLから元のURLを取り出せることをテスト（canonicalを優先し、コメントは無視する）"""
+    html = """
+    <head>
+      <!-- <link rel="canonical" href="https://example.com/old"> -->
+      <meta property="og:url" content="https://omny.fm/shows/a/b">
+      <link rel="alternate canonical" href="https://audee.jp/voice/1?a=1&amp;b=2">
+    </head>
+    """
+    assert find_page_url(html) == "https://audee.jp/voice/1?a=1&b=2"
+    assert find_page_url('<meta property="og:url" content="https://omny.fm/x">') == "https://omny.fm/x"
+    assert find_page_url("<html></html>") is None
+
+
+def test_extract_audio_info_batch(tmp_path):
+    """--batch でディレクトリ内のHTMLを並列に処理し、JSON Linesで出力することをテスト"""
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "audee.html").write_text(
+        AUDEE_HTML.replace("<head>", '<head><link rel="canonical" href="https://audee.jp/voice/1">'),
+        encoding="utf-8",
+    )
+    (tmp_path / "sub" / "bitfan.htm").write_text(
+        BITFAN_HTML.replace("<head>", '<head><meta property="og:url" content="https://ij-matome.bitfan.id/x">'),
+        encoding="utf-8",
+    )
+    (tmp_path / "sub" / "unknown.html").write_text(
+        '<link rel="canonical" href="https://example.com/">', encoding="utf-8"
+    )
+    (tmp_path / "notes.txt").write_text("対象外", encoding="utf-8")
+
+    repo_root = os.path.dirname(os.path.dirname(__file__))
+    result = subprocess.run(
+        [
+            sys.executable,
+            os.path.join(repo_root, "tools", "extract_audio_info.py"),
+            "--batch",
+            str(tmp_path),
+            "--workers",
+            "2",
+        ],
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONPATH": repo_root},
+    )
+
+    # 失敗したファイルがあるため終了コードは1
+    assert result.returncode == 1
+    lines = {
+        os.path.basename(line["path"]): line
+        for line in map(json.loads, result.stdout.splitlines())
+    }
+    assert sorted(lines) == ["audee.html", "bitfan.htm", "unknown.html"]
+    assert [info["audio_src"] for info in lines["audee.html"]["audio_info"]] == [
+        "https://cf.audee.jp/1.mp3",
+        "https://cf.audee.jp/2.mp3",
+    ]
+    assert lines["bitfan.htm"]["ok"] is True
+    assert lines["unknown.html"]["ok"] is False
+    assert "未対応のドメイン" in lines["unknown.html"]["error"]
+    assert all(line["elapsed_sec"] >= 0 for line in lines.values())
+    assert "3件を" in result.stderr
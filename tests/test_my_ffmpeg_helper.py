@@ -1,10 +1,31 @@
+import asyncio
+import io
 import os
 import subprocess
+import sys
 import tempfile
+import threading
+import time
+from unittest.mock import MagicMock
 
 import pytest
+import requests
 
+from MyFfmpegHelper.async_ffmpeg_helper import AsyncFfmpegHelper
+from MyFfmpegHelper.cover_cache import CoverImageCache
+from MyFfmpegHelper.id3_tag import (
+    _iter_frames,
+    empty_id3_tag,
+    estimate_tag_size,
+    read_id3v2_header,
+    write_id3_tags,
+)
+from MyFfmpegHelper.keyframe_index import KeyframeIndex
+from MyFfmpegHelper.media_info import MediaInfo, MediaInfoCache
 from MyFfmpegHelper.my_ffmpeg_helper import MyFfmpegHelper
+from MyFfmpegHelper.oversized_transcoder import OversizedTranscoder
+from MyFfmpegHelper.progress import ProgressMonitor
+from MyFfmpegHelper.transcode_profile import DEFAULT_TRANSCODE_PROFILES
 
 # テスト用のダミー動画ファイルのパスを設定してください
 # 実際のCBR動画とVBR動画のパスに置き換えてください
@@ -143,3 +164,838 @@ def test_embed_metadata_with_avif_cover():
         assert "codec_type=audio" in probe.stdout
         assert "codec_type=video" in probe.stdout
         assert "attached_pic=1" in probe.stdout
+
+
+class _FakeProbeProcess:
+    """ffprobeの出力を1行ずつ返すsubprocess.Popenの代わり"""
+
+    def __init__(self, lines, returncode=0):
+        self.stdout = io.StringIO("".join(lines))
+        self.returncode = returncode
+        self.killed = False
+
+    def poll(self):
+        # 出力を読み終えるまでは実行中とみなす
+        return self.returncode if self.stdout.tell() == len(self.stdout.getvalue()) else None
+
+    def kill(self):
+        self.killed = True
+
+    def wait(self):
+        return -9 if self.killed else self.returncode
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def test_build_keyframe_index_single_pass(monkeypatch, tmp_path):
+    """ffprobeを1回だけ実行し、キーフレームだけでインデックスが作られることをテスト"""
+    video = tmp_path / "video.mp4"
+    video.write_bytes(b"\0" * 1000)
+    lines = [
+        "packet|pts_time=0.000000|dts_time=0.000000|flags=K__\n",
+        "packet|pts_time=0.500000|dts_time=0.500000|flags=___\n",
+        "packet|pts_time=2.000000|dts_time=2.000000|flags=K__\n",
+        "packet|pts_time=N/A|dts_time=4.000000|flags=K__\n",
+        "format|duration=6.000000\n",
+    ]
+    calls = []
+
+    def fake_popen(cmd, **kwargs):
+        calls.append(cmd)
+        return _FakeProbeProcess(lines)
+
+    monkeypatch.setattr(subprocess, "Popen", fake_popen)
+
+    index = MyFfmpegHelper.build_keyframe_index(str(video))
+
+    assert len(calls) == 1
+    assert index.times == [0.0, 2.0, 4.0]
+    assert index.duration_sec == 6.0
+    assert index.size_bytes == 1000
+
+
+def test_get_split_keyframe_sec_by_size_uses_index():
+    """インデックスから直前のキーフレームに揃えた分割点が求まることをテスト"""
+    index = KeyframeIndex(
+        duration_sec=10.0, size_bytes=1000, times=[0.0, 2.0, 3.0, 7.0, 9.5]
+    )
+
+    keyframes = MyFfmpegHelper.get_split_keyframe_sec_by_size(
+        "unused.mp4", split_size_bytes=250, index=index
+    )
+
+    # 分割点 2.5, 5.0, 7.5 -> 2.0, 3.0, 7.0
+    assert keyframes == [2.0, 3.0, 7.0]
+    assert index.keyframe_before(1.0) == 0.0
+
+
+def test_split_points_by_bytes_fills_parts_for_vbr():
+    """ビットレートが一定でない動画で、各パートが上限まで詰められることをテスト"""
+    # 先頭は低ビットレート、後半は高ビットレート
+    index = KeyframeIndex(duration_sec=10.0, size_bytes=1000, packet_bytes=1000)
+    for time_sec, offset in [(0.0, 0), (4.0, 100), (6.0, 200), (7.0, 450), (8.0, 700)]:
+        index.add_keyframe(time_sec, offset=offset)
+
+    keyframes = MyFfmpegHelper.get_split_keyframe_sec_by_size(
+        "unused.mp4", split_size_bytes=300, index=index
+    )
+
+    # 0-7秒 (450B) は超えるため 6秒、6-8秒 (500B) は超えるため 7秒、7秒以降は 550B で 8秒
+    assert keyframes == [6.0, 7.0, 8.0]
+    bounds = [0] + [index.offsets[index.times.index(k)] for k in keyframes] + [1000]
+    assert all(b - a <= 300 for a, b in zip(bounds, bounds[1:]))
+
+
+def test_split_points_by_bytes_with_out_of_order_keyframe():
+    """時刻の順と読み込み順が異なるキーフレームがあっても、累積バイト数の順に分割点を選ぶことをテスト"""
+    index = KeyframeIndex(duration_sec=30.0, size_bytes=3000, packet_bytes=3000)
+    for time_sec, offset in [(0.0, 0), (10.0, 1000), (5.0, 2000), (20.0, 2500)]:
+        index.add_keyframe(time_sec, offset=offset)
+    assert index.times == [0.0, 5.0, 10.0, 20.0]
+
+    points = index.split_points_by_bytes(900)
+
+    # 5秒のキーフレームは10秒より後に読み込まれるため、10秒の次の分割点にはならない
+    assert points == [10.0, 20.0]
+
+
+def test_split_video_segment_mode_runs_ffmpeg_once(monkeypatch, tmp_path):
+    """segmentモードで入力を1回だけ読み、完成したパートのパスを順に返すことをテスト"""
+    video = tmp_path / "video.mp4"
+    video.write_bytes(b"\0" * 1000)
+    index = KeyframeIndex(
+        duration_sec=10.0, size_bytes=1000, times=[0.0, 2.0, 3.0, 7.0, 9.5]
+    )
+    monkeypatch.setattr(
+        MyFfmpegHelper, "build_keyframe_index", staticmethod(lambda *a, **k: index)
+    )
+    calls = []
+
+    def fake_popen(cmd, **kwargs):
+        calls.append(cmd)
+        return _FakeProbeProcess([f"video_part{i}.mp4\n" for i in range(1, 5)])
+
+    monkeypatch.setattr(subprocess, "Popen", fake_popen)
+    monkeypatch.setattr(
+        subprocess, "run", lambda *a, **k: pytest.fail("パートごとのffmpegは起動しない")
+    )
+
+    files = MyFfmpegHelper.split_video_lossless_by_keyframes(
+        str(video), split_size_bytes=250
+    )
+
+    assert len(calls) == 1
+    cmd = calls[0]
+    assert cmd[cmd.index("-f") + 1] == "segment"
+    assert cmd[cmd.index("-segment_times") + 1] == "1.999000,2.999000,6.999000"
+    assert cmd[-1] == str(tmp_path / "video_part%d.mp4")
+    assert files == [str(tmp_path / f"video_part{i}.mp4") for i in range(1, 5)]
+
+
+def _write_segment_parts(tmp_path, count):
+    for i in range(1, count + 1):
+        (tmp_path / f"video_part{i}.mp4").write_bytes(b"part")
+
+
+def test_split_video_segment_mode_removes_parts_on_close(monkeypatch, tmp_path):
+    """segmentモードを途中で終了した場合、ffmpegを終了させ、渡していないパートを削除することをテスト"""
+    video = tmp_path / "video.mp4"
+    video.write_bytes(b"\0" * 1000)
+    index = KeyframeIndex(
+        duration_sec=10.0, size_bytes=1000, times=[0.0, 2.0, 3.0, 7.0, 9.5]
+    )
+    monkeypatch.setattr(
+        MyFfmpegHelper, "build_keyframe_index", staticmethod(lambda *a, **k: index)
+    )
+    process = _FakeProbeProcess([f"video_part{i}.mp4\n" for i in range(1, 5)])
+    monkeypatch.setattr(subprocess, "Popen", lambda cmd, **kwargs: process)
+    # パート1が完成した時点で、パート2は書き出し中
+    _write_segment_parts(tmp_path, 2)
+
+    parts = MyFfmpegHelper.iter_split_video_lossless_by_keyframes(
+        str(video), split_size_bytes=250
+    )
+    assert next(parts) == str(tmp_path / "video_part1.mp4")
+    parts.close()
+
+    assert process.killed
+    # 渡したパートは呼び出し側が管理する
+    assert sorted(p.name for p in tmp_path.glob("video_part*.mp4")) == ["video_part1.mp4"]
+
+
+def test_run_cancellable_kills_child_when_cancelled():
+    """中止のイベントが設定されたら、実行中の子プロセスを強制終了することをテスト"""
+    cancel = threading.Event()
+    threading.Timer(0.2, cancel.set).start()
+
+    started = time.monotonic()
+    with pytest.raises(subprocess.CalledProcessError):
+        MyFfmpegHelper._run_cancellable(
+            [sys.executable, "-c", "import time; time.sleep(30)"], cancel
+        )
+    assert time.monotonic() - started < 5
+
+
+def test_split_video_segment_mode_removes_parts_on_error(monkeypatch, tmp_path):
+    """segmentモードでffmpegがエラー終了した場合、渡していないパートを削除することをテスト"""
+    video = tmp_path / "video.mp4"
+    video.write_bytes(b"\0" * 1000)
+    index = KeyframeIndex(
+        duration_sec=10.0, size_bytes=1000, times=[0.0, 2.0, 3.0, 7.0, 9.5]
+    )
+    monkeypatch.setattr(
+        MyFfmpegHelper, "build_keyframe_index", staticmethod(lambda *a, **k: index)
+    )
+    monkeypatch.setattr(
+        subprocess,
+        "Popen",
+        lambda cmd, **kwargs: _FakeProbeProcess(["video_part1.mp4\n"], returncode=1),
+    )
+    _write_segment_parts(tmp_path, 2)
+
+    received = []
+    with pytest.raises(subprocess.CalledProcessError):
+        for part in MyFfmpegHelper.iter_split_video_lossless_by_keyframes(
+            str(video), split_size_bytes=250
+        ):
+            received.append(part)
+
+    assert received == [str(tmp_path / "video_part1.mp4")]
+    assert sorted(p.name for p in tmp_path.glob("video_part*.mp4")) == ["video_part1.mp4"]
+
+    # 非同期版は、失敗した場合に書き出し済みのパートをすべて削除する
+    helper = AsyncFfmpegHelper()
+
+    async def fail(cmd, timeout):
+        _write_segment_parts(tmp_path, 2)
+        raise Exception("ffmpegの実行に失敗しました")
+
+    monkeypatch.setattr(helper, "_run", fail)
+    media_info = _fake_media_info(video, 10.0)
+    media_info.keyframe_index = index
+    with pytest.raises(Exception, match="ffmpegの実行に失敗しました"):
+        asyncio.run(
+            helper.split_video_lossless_by_keyframes(
+                str(video), split_size_bytes=250, media_info=media_info
+            )
+        )
+    assert not any(tmp_path.glob("video_part*.mp4"))
+
+
+def test_get_audio_metadata_uses_probe_cache_and_logs_errors(monkeypatch, tmp_path, capsys):
+    """メタデータの取得はprobeのキャッシュを使い、失敗はログに出して標準出力には出さないことをテスト"""
+    audio = tmp_path / "audio.mp3"
+    audio.write_bytes(b"\0" * 100)
+    cache = MediaInfoCache(cache_dir=str(tmp_path / "cache"))
+    calls = []
+
+    def check_output(cmd, **kwargs):
+        calls.append(cmd)
+        return b'{"format": {"tags": {"title": "t"}}, "streams": [{"codec_type": "audio"}]}'
+
+    monkeypatch.setattr(subprocess, "check_output", check_output)
+    assert MyFfmpegHelper.get_audio_metadata(str(audio), cache=cache) == {"title": "t"}
+    assert MyFfmpegHelper.get_audio_metadata(str(audio), cache=cache) == {"title": "t"}
+    assert len(calls) == 1
+
+    def fail(cmd, **kwargs):
+        raise subprocess.CalledProcessError(1, cmd)
+
+    monkeypatch.setattr(subprocess, "check_output", fail)
+    assert MyFfmpegHelper.get_audio_metadata(str(tmp_path / "broken.mp3")) is None
+    assert capsys.readouterr().out == ""
+
+
+def test_probe_cache_skips_ffprobe_on_rerun(monkeypatch, tmp_path):
+    """キャッシュ済みのファイルは、2回目以降ffprobeを1回も実行しないことをテスト"""
+    video = tmp_path / "video.mp4"
+    video.write_bytes(b"\0" * 1000)
+    cache = MediaInfoCache(cache_dir=str(tmp_path / "cache"))
+    probe_output = (
+        b'{"format": {"duration": "10.0", "tags": {"title": "t"}},'
+        b' "streams": [{"codec_type": "video"}, {"codec_type": "audio"}]}'
+    )
+    index = KeyframeIndex(duration_sec=10.0, size_bytes=1000, times=[0.0, 5.0])
+    monkeypatch.setattr(subprocess, "check_output", lambda *a, **k: probe_output)
+    monkeypatch.setattr(
+        MyFfmpegHelper, "build_keyframe_index", staticmethod(lambda *a, **k: index)
+    )
+
+    info = MyFfmpegHelper.probe(str(video), cache=cache, keyframes=True)
+    assert info.is_video
+    assert info.duration_sec == 10.0
+
+    def fail(*args, **kwargs):
+        pytest.fail("ffprobeは実行しない")
+
+    monkeypatch.setattr(subprocess, "check_output", fail)
+    monkeypatch.setattr(subprocess, "run", fail)
+    monkeypatch.setattr(subprocess, "Popen", fail)
+    monkeypatch.setattr(MyFfmpegHelper, "build_keyframe_index", staticmethod(fail))
+
+    cached = MyFfmpegHelper.probe(str(video), cache=cache)
+    assert MyFfmpegHelper.is_video(str(video), media_info=cached)
+    assert MyFfmpegHelper.get_duration_sec(str(video), media_info=cached) == 10.0
+    assert MyFfmpegHelper.get_audio_metadata(str(video), media_info=cached) == {
+        "title": "t"
+    }
+    assert MyFfmpegHelper.get_split_keyframe_sec_by_size(
+        str(video), split_size_bytes=500, media_info=cached
+    ) == [5.0]
+
+    # ファイルが変更されたらキャッシュは使わない
+    video.write_bytes(b"\0" * 2000)
+    assert cache.load(str(video)) is None
+
+
+def test_get_bitrate_profile_samples_whole_file(monkeypatch):
+    """区間が動画全体に分散し、区間ごとのビットレートが求まることをテスト"""
+    requested = []
+
+    def fake_check_output(cmd, **kwargs):
+        interval = cmd[cmd.index("-read_intervals") + 1]
+        start = float(interval.split("%")[0])
+        requested.append(start)
+        # 後半だけビットレートが2倍
+        size = 2000 if start >= 50 else 1000
+        return ("\n".join([str(size)] * 10) + "\n").encode()
+
+    monkeypatch.setattr(subprocess, "check_output", fake_check_output)
+    monkeypatch.setattr(
+        MyFfmpegHelper, "get_duration_sec", staticmethod(lambda *a, **k: 100.0)
+    )
+
+    profile = MyFfmpegHelper.get_bitrate_profile("video.mp4", windows=4, window_sec=10)
+
+    assert sorted(requested) == [11.25, 33.75, 56.25, 78.75]
+    assert list(profile.bitrates) == [8000.0, 8000.0, 16000.0, 16000.0]
+    assert profile.packet_cv == pytest.approx(1 / 3)
+    assert MyFfmpegHelper.is_vbr("video.mp4", windows=4)
+
+
+def test_find_keyframe_before_stops_reading_past_target(monkeypatch):
+    """基準の秒数を過ぎたキーフレームが見つかった時点でffprobeを終了させることをテスト"""
+    process = _FakeProbeProcess([f"{t}.000000\n" for t in range(0, 100, 2)])
+    commands = []
+
+    def fake_popen(cmd, **kwargs):
+        commands.append(cmd)
+        return process
+
+    monkeypatch.setattr(subprocess, "Popen", fake_popen)
+
+    keyframe = MyFfmpegHelper.find_keyframe_before("video.mp4", 21.0)
+
+    assert keyframe == 20.0
+    assert process.killed
+    assert commands[0][commands[0].index("-read_intervals") + 1] == "11.0%"
+
+
+def test_get_keyframes_raises_on_ffprobe_error(monkeypatch):
+    """ffprobeがエラー終了した場合は例外になることをテスト"""
+    monkeypatch.setattr(
+        subprocess, "Popen", lambda cmd, **kwargs: _FakeProbeProcess([], returncode=1)
+    )
+
+    with pytest.raises(Exception, match="ffprobeの実行に失敗しました"):
+        MyFfmpegHelper.get_keyframes("video.mp4", 30.0)
+
+
+def test_async_helper_probes_in_parallel_with_limit(monkeypatch, tmp_path):
+    """複数ファイルを同時実行数の上限まで並行して解析できることをテスト"""
+    files = []
+    for i in range(4):
+        path = tmp_path / f"video{i}.mp4"
+        path.write_bytes(b"\0")
+        files.append(str(path))
+    probe_json = '{"format": {"duration": "1.0"}, "streams": [{"codec_type": "video"}]}'
+    # ffprobeの代わりに、0.3秒待ってからJSONを出力するPythonを実行する
+    monkeypatch.setattr(
+        MyFfmpegHelper,
+        "build_probe_command",
+        staticmethod(
+            lambda path: [
+                sys.executable,
+                "-c",
+                f"import time; time.sleep(0.3); print({probe_json!r})",
+            ]
+        ),
+    )
+    helper = AsyncFfmpegHelper(max_concurrency=2)
+
+    started = time.monotonic()
+    results = asyncio.run(helper.probe_many(files))
+    elapsed = time.monotonic() - started
+
+    assert all(info.is_video for info in results.values())
+    # 2並列で4ファイル: 直列（1.2秒）より速く、2並列分（0.6秒）以上かかる
+    assert 0.6 <= elapsed < 1.2
+
+
+def test_async_helper_kills_hung_child_on_timeout():
+    """タイムアウトした子プロセスを強制終了することをテスト"""
+    helper = AsyncFfmpegHelper(timeout=0.2)
+
+    async def run():
+        started = time.monotonic()
+        with pytest.raises(asyncio.TimeoutError):
+            await helper._run(
+                [sys.executable, "-c", "import time; time.sleep(30)"], helper.timeout
+            )
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) < 5
+
+
+def test_async_helper_splits_per_part_like_sync(monkeypatch, tmp_path):
+    """非同期版もper_partモードで、同期版と同じ範囲・ファイル名で切り出すことをテスト"""
+    video = tmp_path / "video.mp4"
+    video.write_bytes(b"\0" * 1000)
+    index = KeyframeIndex(
+        duration_sec=10.0, size_bytes=1000, times=[0.0, 2.0, 3.0, 7.0, 9.5]
+    )
+    media_info = _fake_media_info(video, 10.0)
+    media_info.keyframe_index = index
+    helper = AsyncFfmpegHelper()
+    calls = []
+
+    async def fake_run(cmd, timeout):
+        calls.append(cmd)
+        return b""
+
+    monkeypatch.setattr(helper, "_run", fake_run)
+
+    files = asyncio.run(
+        helper.split_video_lossless_by_keyframes(
+            str(video), split_size_bytes=250, mode="per_part", media_info=media_info
+        )
+    )
+
+    expected = MyFfmpegHelper.plan_split_parts(
+        str(tmp_path), "video", [2.0, 3.0, 7.0], 10.0
+    )
+    assert files == [output_file for output_file, _, _ in expected]
+    assert calls == [
+        MyFfmpegHelper.build_cut_command(str(video), start, end, output_file)
+        for output_file, start, end in expected
+    ]
+
+
+def test_async_helper_embed_metadata_converts_cover_with_pillow(monkeypatch, tmp_path):
+    """非同期版も、Pillowで読み込めるカバー画像はffmpegを起動せずに変換することをテスト"""
+    from PIL import Image
+
+    cover = tmp_path / "cover.png"
+    Image.new("RGB", (16, 16), (255, 0, 0)).save(cover, format="PNG")
+    helper = AsyncFfmpegHelper()
+    calls = []
+
+    async def fake_run(cmd, timeout):
+        calls.append(cmd)
+        normalized = MyFfmpegHelper.normalized_cover_path_for(str(cover))
+        with Image.open(normalized) as image:
+            assert image.format == "JPEG"
+        return b""
+
+    monkeypatch.setattr(helper, "_run", fake_run)
+
+    asyncio.run(
+        helper.embed_metadata(
+            "in.mp3", str(tmp_path / "out.mp3"), {"title": "t"}, cover_path=str(cover)
+        )
+    )
+
+    # カバー画像の変換にffmpegは使わず、埋め込みの1回だけ実行する
+    assert len(calls) == 1
+    assert "attached_pic" in calls[0]
+    assert not os.path.exists(MyFfmpegHelper.normalized_cover_path_for(str(cover)))
+
+
+def _read_id3_frames(path):
+    with open(path, "rb") as f:
+        version, _, size = read_id3v2_header(f)
+        tag = f.read(size)
+    return version, size, {frame_id: body for frame_id, body, _ in _iter_frames(tag, version)}
+
+
+def test_write_id3_tags_in_place_when_space_is_reserved(tmp_path):
+    """タグ用の領域を確保したMP3は、ヘッダー領域だけを書き換えることをテスト"""
+    audio = b"\xff\xfb\x90\x00" + b"\x01" * 5000
+    metadata = {"title": "タイトル", "artist": "アーティスト", "album": "アルバム"}
+    cover = b"\xff\xd8\xff\xe0" + b"\x02" * 1000
+    path = tmp_path / "audio.mp3"
+    path.write_bytes(empty_id3_tag(estimate_tag_size(metadata, len(cover))) + audio)
+    size_before = path.stat().st_size
+    inode_before = path.stat().st_ino
+
+    assert write_id3_tags(str(path), metadata, cover)
+
+    assert path.stat().st_size == size_before
+    assert path.stat().st_ino == inode_before
+    version, size, frames = _read_id3_frames(path)
+    assert frames["TIT2"] == b"\x01" + "タイトル".encode("utf-16")
+    assert frames["TALB"] == b"\x01" + "アルバム".encode("utf-16")
+    assert frames["APIC"].endswith(cover)
+    assert frames["APIC"].startswith(b"\x00image/jpeg\x00\x03\x00")
+    assert path.read_bytes()[10 + size :] == audio
+
+
+def test_write_id3_tags_rewrites_once_and_keeps_other_frames(tmp_path):
+    """タグがないMP3は余白付きのタグを付けて書き直し、2回目以降はその場で書き換えることをテスト"""
+    audio = b"\xff\xfb\x90\x00" + b"\x01" * 5000
+    path = tmp_path / "audio.mp3"
+    path.write_bytes(audio)
+
+    assert not write_id3_tags(str(path), {"title": "a", "genre": "Radio"})
+    _, size, frames = _read_id3_frames(path)
+    assert path.read_bytes()[10 + size :] == audio
+
+    # 余白に収まるため、その場で書き換わり、書き換えないフレームは残る
+    assert write_id3_tags(str(path), {"title": "b", "artist": None})
+    _, _, frames = _read_id3_frames(path)
+    assert frames["TIT2"] == b"\x01" + "b".encode("utf-16")
+    assert frames["TCON"] == b"\x01" + "Radio".encode("utf-16")
+    assert "TPE1" not in frames
+
+
+def test_tag_audio_in_place_falls_back_to_ffmpeg(monkeypatch, tmp_path):
+    """MP3以外はffmpegで書き出してから置き換えることをテスト"""
+    path = tmp_path / "audio.m4a"
+    path.write_bytes(b"original")
+
+    def fake_embed_metadata(input_path, output_path, metadata, cover_path, logger):
+        with open(output_path, "wb") as f:
+            f.write(b"tagged")
+
+    monkeypatch.setattr(
+        MyFfmpegHelper, "embed_metadata", staticmethod(fake_embed_metadata)
+    )
+
+    MyFfmpegHelper.tag_audio_in_place(str(path), {"title": "t"})
+
+    assert path.read_bytes() == b"tagged"
+    assert [p.name for p in tmp_path.iterdir()] == ["audio.m4a"]
+
+
+def test_cover_image_cache_downloads_and_converts_once(tmp_path):
+    """同じURL・同じ内容のカバー画像は1回だけダウンロード・変換することをテスト"""
+    from PIL import Image
+
+    source = io.BytesIO()
+    Image.new("RGBA", (800, 400), (255, 0, 0, 128)).save(source, format="PNG")
+
+    class FakeSession:
+        def __init__(self):
+            self.urls = []
+
+        def get(self, url, timeout=None):
+            self.urls.append(url)
+            response = requests.Response()
+            response.status_code = 200
+            response._content = source.getvalue()
+            return response
+
+    session = FakeSession()
+    cache = CoverImageCache(cache_dir=str(tmp_path), max_dimension=200)
+
+    first = cache.get("https://example.com/a.png", session=session)
+    second = cache.get("https://example.com/a.png", session=session)
+    # URLが違っても内容が同じなら変換済みのJPEGを使う
+    third = cache.get("https://example.com/b.png", session=session)
+
+    assert first == second == third
+    assert session.urls == ["https://example.com/a.png", "https://example.com/b.png"]
+    with Image.open(first) as image:
+        assert image.format == "JPEG"
+        assert image.size == (200, 100)
+
+
+def test_embed_metadata_from_stream_writes_only_output(monkeypatch, tmp_path):
+    """受け取った音声データをffmpegの標準入力に流し込み、出力ファイルだけを書き出すことをテスト"""
+    output_path = tmp_path / "final.mp3"
+    # ffmpegの代わりに、標準入力を出力ファイルへコピーするPythonを実行する
+    copy_stdin = "import shutil, sys; shutil.copyfileobj(sys.stdin.buffer, open(sys.argv[1], 'wb'))"
+    monkeypatch.setattr(
+        MyFfmpegHelper,
+        "build_embed_metadata_command",
+        staticmethod(
+            lambda input_path, output_path, metadata, cover: [
+                sys.executable,
+                "-c",
+                copy_stdin,
+                output_path,
+            ]
+        ),
+    )
+
+    chunks = [b"a" * 100_000, b"", b"b" * 100_000]
+    MyFfmpegHelper.embed_metadata_from_stream(chunks, str(output_path), {"title": "t"})
+
+    assert output_path.read_bytes() == b"a" * 100_000 + b"b" * 100_000
+    assert [p.name for p in tmp_path.iterdir()] == ["final.mp3"]
+
+
+def test_embed_metadata_from_stream_removes_output_on_failure(monkeypatch, tmp_path):
+    """ffmpegが失敗した場合は、書きかけの出力ファイルを削除することをテスト"""
+    output_path = tmp_path / "final.mp3"
+    fail = "import sys; open(sys.argv[1], 'wb').write(b'x'); sys.stderr.write('bad input'); sys.exit(1)"
+    monkeypatch.setattr(
+        MyFfmpegHelper,
+        "build_embed_metadata_command",
+        staticmethod(
+            lambda input_path, output_path, metadata, cover: [
+                sys.executable,
+                "-c",
+                fail,
+                output_path,
+            ]
+        ),
+    )
+
+    with pytest.raises(Exception, match="bad input"):
+        MyFfmpegHelper.embed_metadata_from_stream(
+            [b"a" * 1_000_000] * 4, str(output_path), {"title": "t"}
+        )
+
+    assert not output_path.exists()
+
+
+def _fake_ffmpeg(tmp_path, body):
+    # "-progress pipe:2 -nostats" を受け取れるよう、ffmpegの代わりの実行ファイルを作る
+    script = tmp_path / "fake_ffmpeg"
+    script.write_text(f"#!{sys.executable}\nimport sys, time\n{body}\n")
+    script.chmod(0o755)
+    return [str(script)]
+
+
+def test_progress_monitor_reports_progress_and_eta(tmp_path):
+    """-progress の出力から進捗とETAを通知し、標準出力の行を返すことをテスト"""
+    cmd = _fake_ffmpeg(
+        tmp_path,
+        """
+assert sys.argv[1:4] == ["-progress", "pipe:2", "-nostats"]
+sys.stderr.write("Input #0, mov,mp4\\n")
+for i in range(1, 4):
+    sys.stderr.write(f"total_size={i * 1000}\\nout_time_us={i * 10_000_000}\\nspeed={i}.0x\\n")
+    sys.stderr.write("progress=" + ("end" if i == 3 else "continue") + "\\n")
+    sys.stderr.flush()
+    print(f"part{i}.mp4", flush=True)
+    time.sleep(0.05)
+""",
+    )
+    updates = []
+    monitor = ProgressMonitor(
+        on_progress=lambda p: updates.append((p.out_time_sec, p.total_size, p.ratio, p.eta_sec))
+    )
+
+    lines = list(monitor.iter_stdout(cmd, duration_sec=60))
+
+    assert lines == ["part1.mp4", "part2.mp4", "part3.mp4"]
+    assert [(t, size, ratio) for t, size, ratio, _ in updates] == [
+        (10.0, 1000, 10 / 60),
+        (20.0, 2000, 20 / 60),
+        (30.0, 3000, 0.5),
+    ]
+    assert all(eta is not None and eta > 0 for *_, eta in updates)
+    stats = monitor.records[-1]
+    assert stats.returncode == 0
+    assert (stats.out_time_sec, stats.total_size, stats.stalls) == (30.0, 3000, 0)
+    assert stats.bytes_per_sec > 0
+
+
+def test_progress_monitor_detects_stall_and_kills(tmp_path):
+    """進捗が止まったffmpegを検知して強制終了することをテスト"""
+    cmd = _fake_ffmpeg(
+        tmp_path,
+        """
+sys.stderr.write("out_time_us=1000000\\nprogress=continue\\n")
+sys.stderr.flush()
+time.sleep(30)
+""",
+    )
+    stalled = []
+    monitor = ProgressMonitor(
+        stall_timeout=0.3, on_stall=stalled.append, kill_on_stall=True
+    )
+
+    started = time.monotonic()
+    with pytest.raises(subprocess.CalledProcessError):
+        monitor.run(cmd, duration_sec=10)
+
+    assert time.monotonic() - started < 5
+    assert len(stalled) == 1 and stalled[0].out_time_sec == 1.0
+    assert monitor.records[-1].stalls == 1
+
+
+def test_embed_metadata_with_progress_keeps_error_message(monkeypatch, tmp_path):
+    """進捗を監視する場合も、ffmpegのエラー出力を例外に含めることをテスト"""
+    cmd = _fake_ffmpeg(
+        tmp_path, 'sys.stderr.write("progress=end\\nInvalid data found\\n"); sys.exit(1)'
+    )
+    monkeypatch.setattr(
+        MyFfmpegHelper,
+        "build_embed_metadata_command",
+        staticmethod(lambda input_path, output_path, metadata, cover: cmd),
+    )
+
+    with pytest.raises(Exception, match="Invalid data found"):
+        MyFfmpegHelper.embed_metadata(
+            "in.mp3", str(tmp_path / "out.mp3"), {"title": "t"}, progress=ProgressMonitor()
+        )
+
+
+def _fake_media_info(path, duration, video=True):
+    streams = [{"codec_type": "audio"}] + ([{"codec_type": "video"}] if video else [])
+    return MediaInfo(
+        path=str(path),
+        size_bytes=os.path.getsize(path),
+        mtime_ns=0,
+        format={"duration": str(duration)},
+        streams=streams,
+    )
+
+
+def test_predict_transcode_size_extrapolates_sample_encodes(monkeypatch, tmp_path):
+    """試し変換した区間のサイズから、全体を変換した場合のサイズを予測することをテスト"""
+    input_path = tmp_path / "talk.mp4"
+    input_path.write_bytes(b"x")
+    media_info = _fake_media_info(input_path, 3600)
+    commands = []
+
+    def fake_run(cmd, check, capture_output, text):
+        # 1秒あたり1000バイトの出力を書き出す
+        commands.append(cmd)
+        length = float(cmd[cmd.index("-t") + 1])
+        with open(cmd[-1], "wb") as f:
+            f.write(b"\0" * int(length * 1000))
+
+    monkeypatch.setattr(subprocess, "run", fake_run)
+    predicted = MyFfmpegHelper.predict_transcode_size(
+        str(input_path), DEFAULT_TRANSCODE_PROFILES[0], media_info=media_info
+    )
+
+    assert predicted == 3600 * 1000
+    # 区間はファイル全体に分散させる
+    starts = [float(cmd[cmd.index("-ss") + 1]) for cmd in commands]
+    assert len(starts) == 3 and starts[0] < 1200 < starts[1] < 2400 < starts[2]
+
+
+def test_choose_transcode_profile_picks_least_lossy_fit(monkeypatch, tmp_path):
+    """上限に収まる最初のプロファイルを選び、削減量を報告することをテスト"""
+    input_path = tmp_path / "capture.mp4"
+    input_path.write_bytes(b"x" * 1000)
+    # 1時間: 1080p(4.1Mbps)は約1.85GB、720pは約0.96GB
+    media_info = _fake_media_info(input_path, 3600)
+    predicted = {"1080p_h264": 900, "720p_h264": 500, "480p_h264": 100}
+    tried = []
+
+    def fake_predict(input_path, profile, media_info=None):
+        tried.append(profile.name)
+        return predicted[profile.name]
+
+    monkeypatch.setattr(MyFfmpegHelper, "predict_transcode_size", staticmethod(fake_predict))
+    monkeypatch.setattr(MyFfmpegHelper, "get_size_bytes", staticmethod(lambda path: 2 * 1024**3))
+    plan = MyFfmpegHelper.choose_transcode_profile(
+        str(input_path),
+        limit_bytes=600,
+        safety_margin=0,
+        upload_bytes_per_sec=100,
+        media_info=media_info,
+    )
+
+    # 目標ビットレートでの概算が上限を大きく超えるものは試し変換しない
+    assert tried == []
+    assert plan is None
+
+    plan = MyFfmpegHelper.choose_transcode_profile(
+        str(input_path),
+        limit_bytes=2 * 1024**3,
+        safety_margin=0,
+        upload_bytes_per_sec=1024**2,
+        media_info=media_info,
+    )
+    assert plan.profile.name == "1080p_h264"
+    assert plan.bytes_saved == 2 * 1024**3 - 900
+    assert plan.upload_sec_saved == pytest.approx((2 * 1024**3 - 900) / 1024**2)
+
+    # 音声だけのファイルには音声専用のプロファイルを使う
+    tried.clear()
+    predicted.update({"music_aac": 3 * 1024**3, "speech_aac": 1024**3})
+    plan = MyFfmpegHelper.choose_transcode_profile(
+        str(input_path),
+        limit_bytes=2 * 1024**3,
+        safety_margin=0,
+        media_info=_fake_media_info(input_path, 3600, video=False),
+    )
+    assert tried == ["music_aac", "speech_aac"]
+    assert plan.profile.name == "speech_aac" and plan.upload_sec_saved is None
+
+
+def test_choose_transcode_profile_treats_cover_art_mp3_as_audio(monkeypatch, tmp_path):
+    """カバー画像（attached_pic）付きのMP3を動画として扱わず、音声専用のプロファイルを使うことをテスト"""
+    input_path = tmp_path / "talk.mp3"
+    input_path.write_bytes(b"x")
+    # ID3のAPICはffprobeでは attached_pic の映像ストリームとして現れる
+    media_info = MediaInfo(
+        path=str(input_path),
+        size_bytes=1,
+        mtime_ns=0,
+        format={"duration": "36000"},
+        streams=[
+            {"codec_type": "audio", "codec_name": "mp3", "disposition": {"attached_pic": 0}},
+            {"codec_type": "video", "codec_name": "mjpeg", "disposition": {"attached_pic": 1}},
+        ],
+    )
+    assert not media_info.is_video
+    assert not MyFfmpegHelper.is_video(str(input_path), media_info=media_info)
+
+    tried = []
+
+    def fake_predict(input_path, profile, media_info=None):
+        tried.append(profile.name)
+        return 1024**3
+
+    monkeypatch.setattr(MyFfmpegHelper, "predict_transcode_size", staticmethod(fake_predict))
+    monkeypatch.setattr(MyFfmpegHelper, "get_size_bytes", staticmethod(lambda path: 6 * 1024**3))
+    plan = MyFfmpegHelper.choose_transcode_profile(
+        str(input_path), limit_bytes=5 * 1024**3, media_info=media_info
+    )
+
+    assert tried == ["music_aac"]
+    assert plan.profile.is_audio_only
+
+
+def test_oversized_transcoder_removes_files_when_upload_fails(monkeypatch, tmp_path):
+    """再エンコードしたファイルを、アップロードが失敗した場合も削除することをテスト"""
+    input_path = tmp_path / "capture.mp4"
+    input_path.write_bytes(b"x")
+    output_path = tmp_path / "capture_720p_h264.mp4"
+
+    def fake_transcode_to_fit(file, limit_bytes, **kwargs):
+        output_path.write_bytes(b"y")
+        return str(output_path), MagicMock(bytes_saved=1)
+
+    monkeypatch.setattr(MyFfmpegHelper, "transcode_to_fit", staticmethod(fake_transcode_to_fit))
+    monkeypatch.setenv("TRANSCODE_OVERSIZED", "true")
+    monkeypatch.setenv("UPLOAD_BYTES_PER_SEC", "1048576")
+
+    transcoder = OversizedTranscoder.from_env()
+    assert transcoder.upload_bytes_per_sec == 1024**2
+    # 解析に失敗したファイルは再エンコードしない
+    assert transcoder.transcode(str(input_path), None) is None
+
+    with pytest.raises(Exception, match="upload failed"):
+        with transcoder:
+            assert transcoder.transcode(
+                str(input_path), _fake_media_info(input_path, 60)
+            ) == str(output_path)
+            raise Exception("upload failed")
+    assert not output_path.exists()
+
+    monkeypatch.delenv("TRANSCODE_OVERSIZED")
+    assert not OversizedTranscoder.from_env().enabled
+
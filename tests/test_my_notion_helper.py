@@ -1,9 +1,16 @@
+import json
 import os
+import threading
+import time
 from unittest.mock import MagicMock, patch
 
 import pytest
 
 from MyNotionHelper.my_notion_helper import MyNotionHelper
+from MyNotionHelper.dedup_index import UploadDedupIndex
+from MyNotionHelper.rate_limiter import NotionRateLimiter, is_idempotent_request
+from MyNotionHelper.upload_journal import UploadJournal
+from MyNotionHelper.upload_tuner import UploadTuner
 
 
 @pytest.fixture
@@ -15,8 +22,11 @@ def notion_helper():
         mock_instance = MagicMock()
         mock_client_class.return_value = mock_instance
         
-        # MyNotionHelperをダミートークンで初期化
-        helper = MyNotionHelper(token="dummy_token")
+        # MyNotionHelperをダミートークンで初期化（テストではレート制限で待たせない）
+        helper = MyNotionHelper(
+            token="dummy_token",
+            rate_limiter=NotionRateLimiter(max_rate=1000.0, burst=1000),
+        )
         # ヘルパーにモッククライアントを注入
         helper.notion = mock_instance
         return helper
@@ -54,3 +64,485 @@ def test_add_music_info_to_db(notion_helper):
     assert properties["アルバム"]["rich_text"][0]["text"]["content"] == "Test Album"
     assert properties["No"]["rich_text"][0]["text"]["content"] == "1/10"
     assert properties["ファイル"]["files"][0]["name"] == "file.m4a"
+
+
+def test_upload_parts_streaming_limits_parts_in_memory(notion_helper):
+    """_upload_parts_streamingがupload_window個を超えてパートを読み込まないかテスト"""
+    notion_helper.max_workers = 2
+    notion_helper.upload_window = 3
+
+    state = {"read": 0, "done": 0, "max_in_memory": 0}
+    lock = threading.Lock()
+
+    def parts():
+        for i in range(1, 11):
+            with lock:
+                state["read"] += 1
+                state["max_in_memory"] = max(
+                    state["max_in_memory"], state["read"] - state["done"]
+                )
+            yield i, b"x"
+
+    uploaded = []
+
+    def upload_part(part_number, chunk):
+        time.sleep(0.01)
+        with lock:
+            uploaded.append(part_number)
+            state["done"] += 1
+
+    notion_helper._upload_parts_streaming(parts(), upload_part)
+
+    assert sorted(uploaded) == list(range(1, 11))
+    assert state["max_in_memory"] <= 3
+
+
+def test_upload_parts_streaming_shares_window_across_files(notion_helper):
+    """複数のファイルで共有したプールでは、全ファイル合計のパート数がupload_window以下になるかテスト"""
+    notion_helper.max_workers = 2
+    notion_helper.upload_window = 2
+
+    state = {"in_memory": 0, "max_in_memory": 0}
+    lock = threading.Lock()
+
+    def parts():
+        for i in range(1, 6):
+            with lock:
+                state["in_memory"] += 1
+                state["max_in_memory"] = max(state["max_in_memory"], state["in_memory"])
+            yield i, b"x"
+
+    def upload_part(part_number, chunk):
+        time.sleep(0.01)
+        with lock:
+            state["in_memory"] -= 1
+
+    with notion_helper._create_part_pool() as part_pool:
+        threads = [
+            threading.Thread(
+                target=notion_helper._upload_parts_streaming,
+                args=(parts(), upload_part, part_pool),
+            )
+            for _ in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert state["in_memory"] == 0
+    assert state["max_in_memory"] <= 2
+
+
+def test_upload_parts_streaming_raises_on_failed_part(notion_helper):
+    """パートのアップロードに失敗した場合に例外が送出されるかテスト"""
+
+    def upload_part(part_number, chunk):
+        if part_number == 2:
+            raise Exception("part failed")
+
+    parts = ((i, b"x") for i in range(1, 6))
+    with pytest.raises(Exception, match="part failed"):
+        notion_helper._upload_parts_streaming(parts, upload_part)
+
+
+def test_iter_file_parts(tmp_path):
+    """_iter_file_partsがファイルを指定サイズごとに分割して返すかテスト"""
+    file_path = tmp_path / "data.bin"
+    file_path.write_bytes(b"a" * 10 + b"b" * 5)
+
+    parts = list(MyNotionHelper._iter_file_parts(str(file_path), 10))
+
+    assert parts == [(1, b"a" * 10), (2, b"b" * 5)]
+
+
+def test_upload_file_uses_shared_session(notion_helper, tmp_path):
+    """upload_fileの全RESTリクエストが共有セッションを経由するかテスト"""
+    file_path = tmp_path / "image.png"
+    file_path.write_bytes(b"png")
+
+    ok_response = MagicMock(status_code=200, text='{"id": "upload_id"}')
+    notion_helper.session = MagicMock()
+    notion_helper.session.request.return_value = ok_response
+    notion_helper.notion.pages.retrieve.return_value = {"properties": {}}
+
+    with patch("requests.post") as module_post, patch("requests.patch") as module_patch:
+        notion_helper.upload_file("page_id", str(file_path))
+
+    module_post.assert_not_called()
+    module_patch.assert_not_called()
+    methods = [c.args[0] for c in notion_helper.session.request.call_args_list]
+    # file_uploadsの作成と送信、ブロックの追加
+    assert methods == ["POST", "POST", "PATCH"]
+
+
+def test_session_pool_is_sized_to_workers():
+    """セッションのコネクションプールがアップロード並列数に合わせて確保されるかテスト"""
+    with patch("MyNotionHelper.my_notion_helper.Client"):
+        helper = MyNotionHelper(token="dummy_token", max_workers=8)
+
+    adapter = helper.session.get_adapter("https://api.notion.com/v1/file_uploads")
+    assert adapter._pool_maxsize >= 8
+
+
+def test_upload_file_resumes_from_journal(notion_helper, tmp_path):
+    """ジャーナルがある場合に未送信のパートだけを送信して再開するかテスト"""
+    file_path = tmp_path / "video.mp4"
+    # 21MBのスパースファイル（10MB × 2 + 1MB の3パート）
+    with open(file_path, "wb") as f:
+        f.truncate(21 * 1024 * 1024)
+
+    journal = UploadJournal.create(str(file_path), "resume_id", 10 * 1024 * 1024, 3)
+    journal.mark_part_done(1)
+    journal.mark_part_done(2)
+
+    notion_helper.resumable = True
+    notion_helper.session = MagicMock()
+
+    def request(method, url, **kwargs):
+        if method == "GET":
+            return MagicMock(status_code=200, text='{"status": "pending"}')
+        return MagicMock(status_code=200, text="{}")
+
+    notion_helper.session.request.side_effect = request
+    notion_helper.notion.pages.retrieve.return_value = {"properties": {}}
+
+    notion_helper.upload_file("page_id", str(file_path))
+
+    posts = [c for c in notion_helper.session.request.call_args_list if c.args[0] == "POST"]
+    # 新しいfile_uploadは作成せず、パート3の送信と完了通知だけを行う
+    assert [c.args[1] for c in posts] == [
+        "https://api.notion.com/v1/file_uploads/resume_id/send",
+        "https://api.notion.com/v1/file_uploads/resume_id/complete",
+    ]
+    assert posts[0].kwargs["files"]["part_number"] == (None, "3")
+    # ページに添付できたのでジャーナルは削除される
+    assert not os.path.exists(UploadJournal.journal_path(str(file_path)))
+
+
+def test_rate_limiter_retries_after_429(monkeypatch):
+    """429を受けた場合にRetry-Afterに従ってリトライし、送信レートを下げるかテスト"""
+    # 時計を進めるだけの偽のsleep
+    clock = {"now": 0.0}
+    sleeps = []
+
+    def fake_sleep(sec):
+        sleeps.append(sec)
+        clock["now"] += sec
+
+    monkeypatch.setattr(time, "monotonic", lambda: clock["now"])
+    monkeypatch.setattr(time, "sleep", fake_sleep)
+
+    limiter = NotionRateLimiter(max_rate=100.0, burst=100)
+    responses = [
+        MagicMock(status_code=429, headers={"Retry-After": "2"}),
+        MagicMock(status_code=200, headers={}),
+    ]
+
+    response = limiter.call(lambda: responses.pop(0))
+
+    assert response.status_code == 200
+    assert limiter.rate < 100.0
+    # Retry-Afterの秒数だけ次の送信が待たされる
+    assert sleeps and sleeps[0] == pytest.approx(2.0, abs=0.1)
+
+
+def test_rate_limiter_gives_up_after_max_retries(monkeypatch):
+    """5xxが続いた場合はリトライ回数を使い切って最後のレスポンスを返すかテスト"""
+    monkeypatch.setattr(time, "sleep", lambda sec: None)
+
+    limiter = NotionRateLimiter(max_rate=100.0, burst=100)
+    send = MagicMock(return_value=MagicMock(status_code=503, headers={}))
+
+    response = limiter.call(send, max_retries=2)
+
+    assert response.status_code == 503
+    assert send.call_count == 3
+
+
+def test_rate_limiter_does_not_retry_non_idempotent_requests(monkeypatch):
+    """ブロック追加などのPOST・PATCHは5xxや通信エラーでリトライせず、429だけリトライするかテスト"""
+    monkeypatch.setattr(time, "sleep", lambda sec: None)
+    limiter = NotionRateLimiter(max_rate=100.0, burst=100)
+
+    send = MagicMock(return_value=MagicMock(status_code=502, headers={}))
+    assert limiter.call(send, idempotent=False).status_code == 502
+    assert send.call_count == 1
+
+    send = MagicMock(side_effect=TimeoutError("timed out"))
+    with pytest.raises(TimeoutError):
+        limiter.call(send, retry_exceptions=(TimeoutError,), idempotent=False)
+    assert send.call_count == 1
+
+    responses = [
+        MagicMock(status_code=429, headers={"Retry-After": "0"}),
+        MagicMock(status_code=200, headers={}),
+    ]
+    assert limiter.call(lambda: responses.pop(0), idempotent=False).status_code == 200
+
+    assert is_idempotent_request("GET", "https://api.notion.com/v1/pages/abc")
+    assert is_idempotent_request("POST", "https://api.notion.com/v1/file_uploads/abc/send")
+    assert not is_idempotent_request("POST", "https://api.notion.com/v1/file_uploads")
+    assert not is_idempotent_request("PATCH", "https://api.notion.com/v1/blocks/abc/children")
+
+
+def test_rate_limiter_does_not_burst_after_retry_after(monkeypatch):
+    """Retry-Afterの待機中はトークンを補充せず、待機明けに一斉に送信しないかテスト"""
+    clock = {"now": 0.0}
+    monkeypatch.setattr(time, "monotonic", lambda: clock["now"])
+
+    limiter = NotionRateLimiter(max_rate=2.0, burst=3)
+    limiter.penalize(10.0)
+
+    # 待機中に他の呼び出し元が acquire する
+    clock["now"] = 5.0
+    limiter._refill(clock["now"])
+    clock["now"] = 10.0
+    limiter._refill(clock["now"])
+    assert limiter._tokens == 0.0
+
+    # 待機明けからの経過時間の分だけ補充される（レートは半分の1回/秒）
+    clock["now"] = 11.0
+    limiter._refill(clock["now"])
+    assert limiter._tokens == pytest.approx(1.0)
+
+
+def test_upload_tuner_records_settings_per_host(tmp_path):
+    """UploadTunerが計測結果から次回の設定をホストごとに記録するかテスト"""
+    state_path = str(tmp_path / "tuning.json")
+    tuner = UploadTuner(state_path=state_path, host="upload-box")
+    tuner.start()
+
+    # パートの送信が速い（目標範囲より短い）場合はパートサイズを大きくする
+    for _ in range(8):
+        tuner.record_part(tuner.part_size, 1.0)
+    tuning = tuner.finish()
+
+    assert UploadTuner.MIN_PART_SIZE <= tuning.part_size <= UploadTuner.MAX_PART_SIZE
+    assert tuning.part_size > 10 * 1024 * 1024
+
+    # 同じホストでは記録した値から開始し、別のホストには影響しない
+    assert UploadTuner(state_path=state_path, host="upload-box").part_size == tuning.part_size
+    assert UploadTuner(state_path=state_path, host="office").part_size == 10 * 1024 * 1024
+
+
+def test_upload_tuner_backs_off_on_failure(tmp_path):
+    """パートの送信に失敗した場合に並列数とパートサイズを下げるかテスト"""
+    tuner = UploadTuner(state_path=str(tmp_path / "tuning.json"), host="office")
+    tuner.start()
+
+    tuner.record_part(tuner.part_size, 40.0)
+    tuner.record_part(tuner.part_size, 0.0, ok=False)
+
+    assert tuner.concurrency == 2
+    assert tuner.finish().part_size < 10 * 1024 * 1024
+
+
+def test_upload_files_attaches_all_files_at_once(notion_helper, tmp_path):
+    """upload_filesが1回のブロック追加と1回のプロパティ更新でまとめて添付するかテスト"""
+    file_paths = []
+    for name in ["a.jpg", "b.png", "c.mp3"]:
+        path = tmp_path / name
+        path.write_bytes(name.encode())
+        file_paths.append(str(path))
+
+    def request(method, url, **kwargs):
+        if method == "PATCH":
+            return MagicMock(
+                status_code=200,
+                text='{"results": [{"id": "block_a"}, {"id": "block_b"}, {"id": "block_c"}]}',
+            )
+        return MagicMock(status_code=200, text=f'{{"id": "upload_{len(url)}"}}')
+
+    notion_helper.session = MagicMock()
+    notion_helper.session.request.side_effect = request
+    notion_helper.notion.pages.retrieve.return_value = {
+        "properties": {"ファイル": {"type": "files", "files": [{"name": "old.jpg"}]}}
+    }
+
+    uploaded = notion_helper.upload_files("page_id", file_paths)
+
+    patches = [c for c in notion_helper.session.request.call_args_list if c.args[0] == "PATCH"]
+    assert len(patches) == 1
+    children = json.loads(patches[0].kwargs["data"])["children"]
+    assert [child["type"] for child in children] == ["image", "image", "audio"]
+    assert [u.block_id for u in uploaded] == ["block_a", "block_b", "block_c"]
+
+    notion_helper.notion.pages.update.assert_called_once()
+    files = notion_helper.notion.pages.update.call_args.kwargs["properties"]["ファイル"]["files"]
+    assert [f["name"] for f in files] == ["old.jpg", "a.jpg", "b.png", "c.mp3"]
+
+
+def test_upload_files_records_blocks_even_if_property_update_fails(notion_helper, tmp_path):
+    """ブロックの追加後にプロパティの更新が失敗しても、添付済みとして記録され再実行で重複しないかテスト"""
+    notion_helper.dedup_index = UploadDedupIndex(str(tmp_path / "dedup.sqlite3"))
+    file_path = tmp_path / "cover.jpg"
+    file_path.write_bytes(b"cover")
+
+    def request(method, url, **kwargs):
+        if method == "PATCH":
+            return MagicMock(status_code=200, text='{"results": [{"id": "block_1"}]}')
+        return MagicMock(status_code=200, text='{"id": "upload_1"}')
+
+    notion_helper.session = MagicMock()
+    notion_helper.session.request.side_effect = request
+    notion_helper.notion.pages.retrieve.side_effect = Exception("502 Bad Gateway")
+
+    # プロパティの更新に失敗しても、ブロックは添付済みなので例外にしない
+    uploaded = notion_helper.upload_files("page_id", [str(file_path)])
+    assert uploaded[0].block_id == "block_1"
+
+    # 再実行しても同じブロックを追加しない
+    notion_helper.notion.blocks.retrieve.return_value = {"id": "block_1"}
+    assert notion_helper.upload_files("page_id", [str(file_path)])[0].skipped
+    patches = [c for c in notion_helper.session.request.call_args_list if c.args[0] == "PATCH"]
+    assert len(patches) == 1
+
+
+def test_upload_file_skips_already_uploaded_content(notion_helper, tmp_path):
+    """同じ内容のファイルが同じページに添付済みの場合に送信を省略するかテスト"""
+    notion_helper.dedup_index = UploadDedupIndex(str(tmp_path / "dedup.sqlite3"))
+
+    def request(method, url, **kwargs):
+        if method == "PATCH":
+            return MagicMock(status_code=200, text='{"results": [{"id": "block_1"}]}')
+        return MagicMock(status_code=200, text='{"id": "upload_1"}')
+
+    notion_helper.session = MagicMock()
+    notion_helper.session.request.side_effect = request
+    notion_helper.notion.pages.retrieve.return_value = {"properties": {}}
+
+    first = tmp_path / "thumb.jpg"
+    first.write_bytes(b"same content")
+    notion_helper.upload_file("page_id", str(first))
+    assert notion_helper.session.request.call_count == 3
+
+    # 再ダウンロードした同じ内容のファイル（パスが違う）
+    second = tmp_path / "thumb_again.jpg"
+    second.write_bytes(b"same content")
+    # ページのコンテンツ削除でブロックはゴミ箱に移動している
+    notion_helper.notion.blocks.retrieve.return_value = {"id": "block_1", "archived": True}
+
+    uploaded = notion_helper.upload_files("page_id", [str(second)])
+
+    assert notion_helper.session.request.call_count == 3
+    assert uploaded[0].skipped
+    assert uploaded[0].block_id == "block_1"
+    notion_helper.notion.blocks.update.assert_called_once_with(
+        block_id="block_1", archived=False
+    )
+
+    # 別のページには通常どおりアップロードする
+    notion_helper.upload_file("other_page_id", str(second))
+    assert notion_helper.session.request.call_count == 6
+
+
+def test_upload_video_pipelined_uploads_parts_as_they_are_cut(notion_helper, tmp_path):
+    """pipelinedモードで切り出したパートから順に送信・削除し、最後に1回で添付するかテスト"""
+    video_path = tmp_path / "video.mp4"
+    # 5GiBを超えるスパースファイル
+    with open(video_path, "wb") as f:
+        f.truncate(5 * 1024**3 + 1)
+
+    events = []
+
+    def fake_iter_split(input_video, split_size_bytes, logger, mode, media_info, cancel):
+        # 入力を1回だけ読むsegmentモードで分割する
+        assert mode == "segment"
+        for i in range(1, 4):
+            part = tmp_path / f"video_part{i}.mp4"
+            part.write_bytes(b"part")
+            events.append(f"cut {i}")
+            yield str(part)
+
+    def fake_send(file_path, page_id, part_pool):
+        events.append(f"send {os.path.basename(file_path)}")
+        assert os.path.exists(file_path)
+        return MagicMock(file_path=file_path, skipped=False)
+
+    notion_helper._send_file_contents = MagicMock(side_effect=fake_send)
+    notion_helper._attach_uploaded_files = MagicMock()
+    with patch(
+        "MyNotionHelper.my_notion_helper.MyFfmpegHelper.iter_split_video_lossless_by_keyframes",
+        side_effect=fake_iter_split,
+    ):
+        notion_helper.upload_video("page_id", str(video_path), pipelined=True)
+
+    sends = [e for e in events if e.startswith("send")]
+    assert sends == [
+        "send video_part1.mp4",
+        "send video_part2.mp4",
+        "send video_part3.mp4",
+    ]
+    # パート1の送信は最後のパートの切り出しより前に始まる
+    assert events.index("send video_part1.mp4") < events.index("cut 3")
+    # ページへの添付は全パートまとめて1回だけ
+    notion_helper._attach_uploaded_files.assert_called_once()
+    page_id, attached = notion_helper._attach_uploaded_files.call_args.args
+    assert [os.path.basename(u.file_path) for u in attached] == [
+        "video_part1.mp4",
+        "video_part2.mp4",
+        "video_part3.mp4",
+    ]
+    # 送信したパートは削除される
+    assert not any(tmp_path.glob("video_part*.mp4"))
+
+
+def test_upload_video_pipelined_removes_parts_on_failure(notion_helper, tmp_path):
+    """pipelinedモードで送信に失敗した場合も、送信済みのパートを添付し、切り出したパートを削除するかテスト"""
+    video_path = tmp_path / "video.mp4"
+    with open(video_path, "wb") as f:
+        f.truncate(5 * 1024**3 + 1)
+
+    def fake_iter_split(input_video, split_size_bytes, logger, mode, media_info, cancel):
+        for i in range(1, 4):
+            part = tmp_path / f"video_part{i}.mp4"
+            part.write_bytes(b"part")
+            yield str(part)
+
+    def fake_send(file_path, page_id, part_pool):
+        if file_path.endswith("part2.mp4"):
+            raise Exception("upload failed")
+        return MagicMock(file_path=file_path, skipped=False)
+
+    notion_helper._send_file_contents = MagicMock(side_effect=fake_send)
+    notion_helper._attach_uploaded_files = MagicMock()
+    with patch(
+        "MyNotionHelper.my_notion_helper.MyFfmpegHelper.iter_split_video_lossless_by_keyframes",
+        side_effect=fake_iter_split,
+    ):
+        with pytest.raises(Exception, match="upload failed"):
+            notion_helper.upload_video("page_id", str(video_path), pipelined=True)
+
+    page_id, attached = notion_helper._attach_uploaded_files.call_args.args
+    assert [os.path.basename(u.file_path) for u in attached] == ["video_part1.mp4"]
+    assert not any(tmp_path.glob("video_part*.mp4"))
+
+
+def test_upload_video_pipelined_cancels_cut_on_failure(notion_helper, tmp_path):
+    """pipelinedモードで送信に失敗した場合、切り出し中のffmpegの終了を待たずに中止するかテスト"""
+    video_path = tmp_path / "video.mp4"
+    with open(video_path, "wb") as f:
+        f.truncate(5 * 1024**3 + 1)
+
+    def fake_iter_split(input_video, split_size_bytes, logger, mode, media_info, cancel):
+        part = tmp_path / "video_part1.mp4"
+        part.write_bytes(b"part")
+        yield str(part)
+        # 次のパートの切り出し中（中止されるまで終わらないffmpeg）
+        assert cancel.wait(30)
+        raise Exception("ffmpeg was killed")
+
+    notion_helper._send_file_contents = MagicMock(side_effect=Exception("upload failed"))
+    notion_helper._attach_uploaded_files = MagicMock()
+    started = time.monotonic()
+    with patch(
+        "MyNotionHelper.my_notion_helper.MyFfmpegHelper.iter_split_video_lossless_by_keyframes",
+        side_effect=fake_iter_split,
+    ):
+        with pytest.raises(Exception, match="upload failed"):
+            notion_helper.upload_video("page_id", str(video_path), pipelined=True)
+
+    assert time.monotonic() - started < 5
+    notion_helper._attach_uploaded_files.assert_not_called()
+    assert not any(tmp_path.glob("video_part*.mp4"))
@@ -0,0 +1,81 @@
+import argparse
+import logging
+import os
+import time
+
+from AudioInfoExtractor import get_extractor
+
+# 実行方法
+# PYTHONPATH=$(pwd) python tools/benchmark_audio_info_extractor.py ./tests/private_data/test_audee_page.html --domain audee.jp
+
+# 比較するパース方法 (名前, パーサー, 必要な要素だけをパースするか, DOMを作らずに走査するか)
+MODES = [
+    ("html.parser (全体)", "html.parser", False, False),
+    ("lxml (全体)", "lxml", False, False),
+    ("lxml (必要な要素のみ)", "lxml", True, False),
+    ("走査 (DOMなし)", "lxml", True, True),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="HTMLのパース方法ごとに音声情報の抽出時間を計測します。"
+    )
+    parser.add_argument("html_path", help="対象のHTMLファイルのパス")
+    parser.add_argument(
+        "--domain",
+        required=True,
+        help="HTMLファイルの取得元のURLまたはドメイン (例: https://audee.jp/voice/xxx, omny.fm)",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=10, help="計測する回数 (デフォルト: 10)"
+    )
+    args = parser.parse_args()
+
+    if not os.path.exists(args.html_path):
+        print(f"エラー: 指定されたファイルが見つかりません: {args.html_path}")
+        return
+
+    with open(args.html_path, "r", encoding="utf-8") as f:
+        html_content = f.read()
+
+    # 抽出時のログは計測の邪魔になるため出力しない
+    logger = logging.getLogger(__name__)
+    logger.disabled = True
+
+    print(f"HTMLファイル: {args.html_path} ({len(html_content) / 1024**2:.1f} MiB)")
+    print(f"対象ドメイン: {args.domain}")
+
+    baseline = None
+    baseline_sec = None
+    for name, parser_name, only_targets, fast_path in MODES:
+        extractor = get_extractor(
+            args.domain,
+            logger,
+            parser=parser_name,
+            only_targets=only_targets,
+            fast_path=fast_path,
+        )
+        if extractor is None:
+            print(f"\n未対応のドメインです: {args.domain}")
+            return
+
+        elapsed = []
+        result = None
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            result = extractor.get_audio_info(html_content)
+            elapsed.append(time.perf_counter() - started)
+
+        best = min(elapsed)
+        if baseline is None:
+            baseline, baseline_sec = result, best
+        same = "一致" if result == baseline else "不一致"
+        print(
+            f"{name:<24} 最小 {best * 1000:8.1f} ms  平均 {sum(elapsed) / len(elapsed) * 1000:8.1f} ms"
+            f"  x{baseline_sec / best:5.1f}  結果: {same}"
+        )
+
+
+if __name__ == "__main__":
+    main()
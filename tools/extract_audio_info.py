@@ -1,27 +1,163 @@
 import argparse
+import concurrent.futures
+import dataclasses
+import glob
 import json
 import logging
 import logging.config
 import os
+import sys
+import time
 
-from AudioInfoExtractor import get_extractor
+from AudioInfoExtractor import find_page_url, get_extractor
 
 # 実行方法
 # PYTHONPATH=$(pwd) python tools/extract_audio_info.py ./tests/private_data/test_audee_page_2audio.html --domain audee.jp
+# 保存したHTMLをまとめて処理し、JSON Linesで出力する（ドメインはページのURLから判定する）
+# PYTHONPATH=$(pwd) python tools/extract_audio_info.py --batch ./archive_html "./saved/**/*.html" > results.jsonl
+
+HTML_EXTENSIONS = (".html", ".htm")
+
+
+def collect_html_files(inputs: list[str]) -> list[str]:
+    """
+    ディレクトリ・globパターン・ファイルのパスから、対象のHTMLファイルを集める。
+
+    Args:
+        inputs (list[str]): ディレクトリ（再帰的に探す）、globパターン、ファイルのパス。
+
+    Returns:
+        list[str]: HTMLファイルのパス（重複を除き、並べ替えたもの）。
+    """
+    files = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, names in os.walk(item):
+                files.update(
+                    os.path.join(root, name)
+                    for name in names
+                    if name.lower().endswith(HTML_EXTENSIONS)
+                )
+        elif glob.has_magic(item):
+            files.update(path for path in glob.glob(item, recursive=True) if os.path.isfile(path))
+        elif os.path.isfile(item):
+            files.add(item)
+    return sorted(files)
+
+
+def extract_file(html_path: str, domain: str | None = None) -> dict:
+    """
+    1つのHTMLファイルから音声情報を抽出する（プロセスプールのワーカーで実行する）。
+
+    Args:
+        html_path (str): HTMLファイルのパス。
+        domain (str | None): 取得元のURLまたはドメイン。Noneの場合はページのURLから判定する。
+
+    Returns:
+        dict: JSON Linesの1行分の結果。
+    """
+    started = time.perf_counter()
+    result: dict = {"path": html_path, "ok": False}
+    try:
+        with open(html_path, "r", encoding="utf-8") as f:
+            html_content = f.read()
+
+        source = domain or find_page_url(html_content)
+        result["source"] = source
+        if not source:
+            result["error"] = "ページのURLが見つかりません。--domain を指定してください。"
+            return result
+
+        # ワーカーではファイルごとのログを出さない
+        logger = logging.getLogger("extract_audio_info.worker")
+        logger.disabled = True
+        extractor = get_extractor(source, logger)
+        if extractor is None:
+            result["error"] = f"未対応のドメインです: {source}"
+            return result
+
+        audio_info_list = extractor.get_audio_info(html_content)
+        if not audio_info_list:
+            result["error"] = "音声情報の抽出に失敗しました。"
+            return result
+
+        result["ok"] = True
+        result["audio_info"] = [dataclasses.asdict(info) for info in audio_info_list]
+        return result
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        return result
+    finally:
+        result["elapsed_sec"] = round(time.perf_counter() - started, 6)
+
+
+def run_batch(inputs: list[str], domain: str | None, workers: int | None) -> int:
+    """
+    HTMLファイルをプロセスプールで並列に処理し、結果を完了した順に標準出力へJSON Linesで出力する。
+    集計は標準エラー出力に出す。
+
+    Returns:
+        int: 失敗したファイルがなければ0、あれば1。
+    """
+    html_files = collect_html_files(inputs)
+    if not html_files:
+        print("エラー: 対象のHTMLファイルが見つかりません。", file=sys.stderr)
+        return 1
+
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    failed = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(extract_file, path, domain) for path in html_files]
+        for future in concurrent.futures.as_completed(futures):
+            result = future.result()
+            if not result["ok"]:
+                failed += 1
+            print(json.dumps(result, ensure_ascii=False), flush=True)
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"{len(html_files)}件を{elapsed:.2f}秒で処理しました "
+        f"(成功: {len(html_files) - failed}, 失敗: {failed}, "
+        f"{len(html_files) / elapsed:.1f}件/秒, workers: {workers})",
+        file=sys.stderr,
+    )
+    return 1 if failed else 0
 
 
 def main():
     parser = argparse.ArgumentParser(
         description="指定されたHTMLファイルから音声情報を抽出します。"
     )
-    parser.add_argument("html_path", help="対象のHTMLファイルのパス")
+    parser.add_argument(
+        "html_paths",
+        nargs="+",
+        help="対象のHTMLファイルのパス（--batch の場合はディレクトリ・globパターンも指定できる）",
+    )
     parser.add_argument(
         "--domain",
-        required=True,
-        help="HTMLファイルの取得元ドメイン (例: audee.jp, bitfan.net)",
+        help="HTMLファイルの取得元のURLまたはドメイン (例: https://audee.jp/voice/xxx, omny.fm)。"
+        "省略した場合はページのcanonical/og:urlから判定する",
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="複数のファイルを並列に処理し、結果をJSON Linesで出力する",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="--batch で使うプロセス数 (デフォルト: CPUコア数)",
     )
     args = parser.parse_args()
 
+    if not args.batch and len(args.html_paths) > 1:
+        parser.error("複数のファイルを処理する場合は --batch を指定してください")
+
+    if args.batch:
+        return run_batch(args.html_paths, args.domain, args.workers)
+
     # ロギング設定ファイルを読み込む
     with open(
         os.path.join(os.path.dirname(__file__), "..", "logging_config.json"), "r"
@@ -30,11 +166,10 @@ def main():
     logging.config.dictConfig(config)
     logger = logging.getLogger(__name__)
 
-    html_path = args.html_path
+    html_path = args.html_paths[0]
     domain = args.domain
 
     print(f"HTMLファイル: {html_path}")
-    print(f"対象ドメイン: {domain}")
 
     try:
         if not os.path.exists(html_path):
@@ -44,6 +179,13 @@ def main():
         with open(html_path, "r", encoding="utf-8") as f:
             html_content = f.read()
 
+        if not domain:
+            domain = find_page_url(html_content)
+            if not domain:
+                print("エラー: ページのURLが見つかりません。--domain を指定してください。")
+                return
+        print(f"対象ドメイン: {domain}")
+
         extractor = get_extractor(domain, logger)
 
         if extractor:
@@ -67,4 +209,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
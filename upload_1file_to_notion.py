@@ -3,9 +3,14 @@ import sys
 
 from dotenv import load_dotenv
 
-from MyFfmpegHelper import MyFfmpegHelper
+from MyFfmpegHelper import (
+    MediaInfo,
+    MediaInfoCache,
+    MyFfmpegHelper,
+    OversizedTranscoder,
+)
 from MyLoggerHelper import MyLoggerHelper
-from MyNotionHelper import MyNotionHelper
+from MyNotionHelper import MyNotionHelper, UploadDedupIndex
 
 """
 一つのファイルをNotionの指定データベースにアップロードする。
@@ -13,6 +18,7 @@ from MyNotionHelper import MyNotionHelper
 すでに`basename`のページが存在する場合、そのページに追加でアップロードする。
 5GiBを超えるファイルはアップロードしないが、
 ファイルが動画の場合はPart分割してアップロードを行う。
+TRANSCODE_OVERSIZED=true の場合は、5GiBに収まるように再エンコードしてアップロードする。
 """
 
 # ===== Config Begin ==========================================================
@@ -23,12 +29,16 @@ NOTION_TOKEN = os.getenv("NOTION_TOKEN")
 NOTION_DATABASE_ID = os.getenv("NOTION_DATABASE_ID")
 NOTION_VERSION = "2022-06-28"
 LOG_DIR = os.getenv("LOG_DIR", "~/Downloads")
+# 5GiBを超えるファイルの再エンコードの設定（TRANSCODE_OVERSIZED, UPLOAD_BYTES_PER_SEC）は
+# OversizedTranscoder.from_env で読み込む
 
 # ===== Config End ============================================================
 logger = MyLoggerHelper.setup_logger(__name__, LOG_DIR)
 
 
 def main():
+    # 再エンコードで作成したファイルは、アップロードが失敗した場合も削除する
+    transcoder = OversizedTranscoder.from_env(logger=logger)
     try:
         logger.info("===== スクリプトを開始します。")
 
@@ -40,10 +50,12 @@ def main():
         logger.info(f"Arguments: {args}")
 
         # Notionクライアントのインスタンスを作成
+        # アップロード済みの同じ内容のファイルは再送しない
         notion = MyNotionHelper(
             token=NOTION_TOKEN,
             version=NOTION_VERSION,
             logger=logger,
+            dedup_index=UploadDedupIndex(),
         )
 
         # コマンドライン引数をそれぞれファイルパスとして処理する
@@ -76,6 +88,17 @@ def main():
                 f"新規ページを作成しました: page_id={page_id}, title='{basename_without_ext}'"
             )
 
+        # 動画以外の連続するファイルはまとめて送信し、1回で添付する
+        pending: list[str] = []
+
+        def flush_pending():
+            if pending:
+                notion.upload_files(page_id, pending)
+                for uploaded_file in pending:
+                    logger.info(f"Successfully processed file: {uploaded_file}")
+                pending.clear()
+
+        media_cache = MediaInfoCache()
         for file in files:
             # fileの存在確認
             if not os.path.isfile(file):
@@ -84,12 +107,26 @@ def main():
 
             # 動画ファイルかどうかの判定
             flg_video = False
+            media_info: MediaInfo | None = None
 
             # ファイルのサイズをチェックし、5GB以下であればそのままアップロード
             file_size = os.path.getsize(file)
             if file_size > 5 * 1024 * 1024 * 1024:  # 5GB
                 # 動画ファイルかどうかを判別し、動画ファイルであれば動画用のアップロードを行う
-                if MyFfmpegHelper.is_video(file):
+                # （ffprobeの結果はキャッシュし、分割時にも同じ情報を使う）
+                try:
+                    media_info = MyFfmpegHelper.probe(
+                        file, cache=media_cache, logger=logger
+                    )
+                except Exception:
+                    media_info = None
+                transcoded = transcoder.transcode(file, media_info)
+                if transcoded is not None:
+                    pending.append(transcoded)
+                    continue
+                if media_info is not None and MyFfmpegHelper.is_video(
+                    file, media_info=media_info
+                ):
                     flg_video = True
                 else:
                     # 動画ファイル以外の5GiB超えのファイルはアップロードしない
@@ -100,17 +137,23 @@ def main():
 
             # ファイルをページにアップロードする
             if flg_video:
-                notion.upload_video(page_id, file)
+                flush_pending()
+                notion.upload_video(
+                    page_id, file, pipelined=True, media_info=media_info
+                )
+                logger.info(f"Successfully processed file: {file}")
             else:
-                notion.upload_file(page_id, file)
+                pending.append(file)
 
-            logger.info(f"Successfully processed file: {file}")
+        flush_pending()
 
-            # エラーなく添付できたらファイルを削除する
+        # エラーなく添付できたらファイルを削除する
 
     except Exception as e:
         logger.error(e)
         sys.exit(1)
+    finally:
+        transcoder.cleanup()
 
     # end of main function
 
@@ -1,9 +1,16 @@
+import asyncio
 import os
 import sys
 
 from dotenv import load_dotenv
 
-from MyFfmpegHelper import MyFfmpegHelper
+from MyFfmpegHelper import (
+    AsyncFfmpegHelper,
+    MediaInfo,
+    MediaInfoCache,
+    MyFfmpegHelper,
+    OversizedTranscoder,
+)
 from MyLoggerHelper import MyLoggerHelper
 from MyNotionHelper import MyNotionHelper
 
@@ -15,12 +22,16 @@ NOTION_TOKEN = os.getenv("NOTION_TOKEN")
 NOTION_DATABASE_ID = os.getenv("NOTION_DATABASE_ID")
 NOTION_VERSION = "2022-06-28"
 LOG_DIR = os.getenv("LOG_DIR", "~/Downloads")
+# 5GiBを超えるファイルの再エンコードの設定（TRANSCODE_OVERSIZED, UPLOAD_BYTES_PER_SEC）は
+# OversizedTranscoder.from_env で読み込む
 
 # ===== Config End ============================================================
 logger = MyLoggerHelper.setup_logger(__name__, LOG_DIR)
 
 
 def main():
+    # 再エンコードで作成したファイルは、アップロードが失敗した場合も削除する
+    transcoder = OversizedTranscoder.from_env(logger=logger)
     try:
         logger.info("===== スクリプトを開始します。")
 
@@ -47,6 +58,19 @@ def main():
             database_id=NOTION_DATABASE_ID,
         )
 
+        # アップロード対象を (ファイルパス, 動画として分割アップロードするか, ffprobeの結果) のリストにまとめる
+        targets: list[tuple[str, bool, MediaInfo | None]] = []
+        media_cache = MediaInfoCache()
+
+        # 5GBを超えるファイルは動画かどうかの判定が必要なため、まとめて並行してffprobeで解析する
+        large_files = [
+            file
+            for file in files
+            if os.path.isfile(file) and os.path.getsize(file) > 5 * 1024 * 1024 * 1024
+        ]
+        probed = asyncio.run(
+            AsyncFfmpegHelper(logger=logger).probe_many(large_files, cache=media_cache)
+        )
         for file in files:
             # fileの存在確認
             if not os.path.isfile(file):
@@ -55,12 +79,22 @@ def main():
 
             # 動画ファイルかどうかの判定
             flg_video = False
+            media_info: MediaInfo | None = None
 
             # ファイルのサイズをチェックし、5GB以下であればそのままアップロード
             file_size = os.path.getsize(file)
             if file_size > 5 * 1024 * 1024 * 1024:  # 5GB
                 # 動画ファイルかどうかを判別し、動画ファイルであれば動画用のアップロードを行う
-                if MyFfmpegHelper.is_video(file):
+                # （ffprobeの結果はキャッシュし、分割時にも同じ情報を使う）
+                result = probed.get(file)
+                media_info = result if isinstance(result, MediaInfo) else None
+                transcoded = transcoder.transcode(file, media_info)
+                if transcoded is not None:
+                    targets.append((transcoded, False, None))
+                    continue
+                if media_info is not None and MyFfmpegHelper.is_video(
+                    file, media_info=media_info
+                ):
                     flg_video = True
                 else:
                     # 動画ファイル以外の5GiB超えのファイルはアップロードしない
@@ -69,22 +103,44 @@ def main():
                     )
                     continue
 
-            # ページタイトルをファイル名に変更
-            notion.change_page_title(page_id, os.path.basename(file))
+            targets.append((file, flg_video, media_info))
+
+        if not targets:
+            return
+
+        # ページタイトルをファイル名に変更
+        notion.change_page_title(page_id, os.path.basename(targets[-1][0]))
+
+        # 動画以外の連続するファイルはまとめて送信し、1回で添付する
+        pending: list[str] = []
+
+        def flush_pending():
+            if pending:
+                notion.upload_files(page_id, pending)
+                for uploaded_file in pending:
+                    logger.info(f"Successfully processed file: {uploaded_file}")
+                pending.clear()
 
+        for file, flg_video, media_info in targets:
             # ファイルをページにアップロードする
             if flg_video:
-                notion.upload_video(page_id, file)
+                flush_pending()
+                notion.upload_video(
+                    page_id, file, pipelined=True, media_info=media_info
+                )
+                logger.info(f"Successfully processed file: {file}")
             else:
-                notion.upload_file(page_id, file)
+                pending.append(file)
 
-            logger.info(f"Successfully processed file: {file}")
+        flush_pending()
 
-            # エラーなく添付できたらファイルを削除する
+        # エラーなく添付できたらファイルを削除する
 
     except Exception as e:
         logger.error(e)
         sys.exit(1)
+    finally:
+        transcoder.cleanup()
 
     # end of main function
 